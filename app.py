@@ -10,71 +10,71 @@ import json
 from typing import List, Dict
 from datetime import datetime
 
-from src.agent.mechanic_agent import create_agent
+from src.agent.session_manager import SessionManager
 from src.monitoring.langfuse_config import setup_langfuse
 from src.utils.helpers import get_logger
 from src.utils.language_detector import LanguageDetector
+from src.utils.config import SESSION_CONCURRENCY
 
 # Initialize Langfuse monitoring
 langfuse_config = setup_langfuse()
 
 logger = get_logger(__name__)
 
-# Global agent instance
-agent = None
+# One shared agent (LLM, knowledge base, tools); one conversation per browser session
+sessions = SessionManager()
 
 
-def initialize_agent():
-    """Initialize the agent with auto-free model selection."""
-    global agent
-    
-    if agent is None:
-        logger.info("Initializing agent with Auto-Free Model Manager...")
-        agent = create_agent(verbose=False)
-        logger.info("✅ Agent ready!")
-    
-    return agent
-
-
-
-
-def chat_with_agent(message: str, history: List[Dict]) -> tuple:
-    """Process message and return response with metadata."""
+async def chat_with_agent(message: str, history: List[Dict], request: gr.Request):
+    """Stream tool steps and the answer into the UI as the agent produces them."""
     if not message.strip():
-        return history, "", "---", "{}", "ℹ️ Listo"
-    
-    current_agent = initialize_agent()
+        yield history, "", "---", "{}", "ℹ️ Listo"
+        return
     
     # Detect language
     detected_lang = LanguageDetector.detect_language(message)
     lang_name = LanguageDetector.get_language_name(detected_lang)
     
-    # Add user message
+    # Add user message and a placeholder for the streamed answer
     history.append({"role": "user", "content": message})
+    history.append({"role": "assistant", "content": "⏳ Analizando..."})
+    yield history, "", "### 💭 Analizando consulta...", "{}", f"⏳ Procesando | 🌐 {lang_name}"
     
-    # Get agent response
-    result = current_agent.chat(message)
-    response = result.get("response", "Error processing request")
-    steps = result.get("steps", [])
-    
-    # Add assistant response
-    history.append({"role": "assistant", "content": response})
-    
-    # Format steps for display
-    steps_md = format_steps_timeline(steps)
+    steps: List[Dict] = []
+    sources: List[Dict] = []
+    answer = ""
     
-    # Add sources to steps display if available
-    sources = result.get("sources", [])
-    if sources:
-        steps_md += format_sources(sources)
+    # Get agent events (in this browser session's conversation)
+    async for event in sessions.astream_chat(request.session_hash, message):
+        if event["type"] == "tool_start":
+            steps.append({"tool": event["tool"], "tool_input": event["tool_input"], "observation": "⏳ ejecutando..."})
+        elif event["type"] == "tool_end" and steps:
+            steps[-1]["observation"] = event["observation"]
+        elif event["type"] == "token":
+            answer += event["text"]
+            history[-1]["content"] = answer
+        elif event["type"] == "done":
+            result = event["result"]
+            history[-1]["content"] = result.get("response", "Error processing request")
+            steps = result.get("steps") or steps
+            sources = result.get("sources", [])
         
-    steps_json = json.dumps(steps, indent=2) if steps else "{}"
-    
-    # Get current model name and detected language
-    model_name = current_agent.current_model_name if hasattr(current_agent, 'current_model_name') else "Unknown"
-    status_msg = f"🤖 {model_name} | 🌐 {lang_name}"
-    
-    return history, "", steps_md, steps_json, status_msg
+        # Format steps for display (sources once the answer is complete)
+        steps_md = format_steps_timeline(steps)
+        if sources:
+            steps_md += format_sources(sources)
+        steps_json = json.dumps(steps, indent=2) if steps else "{}"
+        
+        # Get current model name and detected language
+        model_name = getattr(sessions.agent, "current_model_name", "Unknown")
+        status_msg = f"🤖 {model_name} | 🌐 {lang_name}"
+        
+        yield history, "", steps_md, steps_json, status_msg
+
+
+def close_session(request: gr.Request):
+    """Drop the session's conversation when its browser tab is closed."""
+    sessions.close(request.session_hash)
 
 
 def format_steps_timeline(steps: List[Dict]) -> str:
@@ -135,11 +135,39 @@ def format_sources(sources: List[Dict]) -> str:
     return md
 
 
-def reset_chat():
-    """Reset conversation."""
-    global agent
-    if agent:
-        agent.reset_conversation()
+def get_kb_status() -> str:
+    """Format knowledge base build progress (polled by a timer in the UI)."""
+    if sessions.agent is None:
+        return "📚 Base de conocimientos: se cargará con la primera consulta"
+    
+    status = sessions.agent.get_knowledge_base_status()
+    if status["ready"]:
+        return "📚 Base de conocimientos: ✅ lista"
+    if status["stage"] == "failed":
+        return f"📚 Base de conocimientos: ❌ error ({status.get('error')}) - respondiendo solo con herramientas"
+    
+    stage_names = {
+        "pending": "en espera",
+        "loading": "cargando documentos",
+        "splitting": "dividiendo en fragmentos",
+        "embedding": "generando embeddings",
+        "validating": "validando índice"
+    }
+    msg = f"📚 Base de conocimientos: ⏳ {stage_names.get(status['stage'], status['stage'])}"
+    if status["chunks_total"]:
+        msg += (
+            f" | {status['documents_loaded']} documentos"
+            f" | {status['chunks_embedded']}/{status['chunks_total']} fragmentos"
+            f" | {status['points_upserted']} puntos indexados"
+        )
+    if status.get("eta_seconds") is not None:
+        msg += f" | ETA ~{status['eta_seconds']:.0f}s"
+    return msg + " (respondiendo solo con herramientas)"
+
+
+def reset_chat(request: gr.Request):
+    """Reset this session's conversation."""
+    sessions.reset(request.session_hash)
     return [], "", "### 💭 Listo para nueva consulta", "{}", "ℹ️ Listo"
 
 
@@ -233,6 +261,7 @@ with gr.Blocks(title="🔧 Asistente de Diagnóstico Automotriz") as demo:
             # """)
             
             model_status = gr.Markdown("")
+            kb_status = gr.Markdown(get_kb_status())
             
             gr.Markdown("---")
             gr.Markdown("## 🔍 Proceso del Agente")
@@ -333,6 +362,12 @@ with gr.Blocks(title="🔧 Asistente de Diagnóstico Automotriz") as demo:
         outputs=[chatbot, msg_input, steps_display, steps_json, model_status]
     )
     
+    # Poll knowledge base build progress
+    kb_timer = gr.Timer(2.0)
+    kb_timer.tick(fn=get_kb_status, outputs=kb_status)
+    
+    demo.unload(close_session)
+    
 
 
 if __name__ == "__main__":
@@ -340,11 +375,12 @@ if __name__ == "__main__":
     logger.info("🌐 Lanzando interfaz Gradio...")
     logger.info("⏳ Agente se inicializará en primer mensaje (puede tardar ~1 min en primera carga)...")
     
-    # Don't pre-initialize - let it load on first use for faster startup
-    # initialize_agent()
+    # Don't pre-initialize - the shared agent loads on first use for faster startup
     
     logger.info("✅ Interfaz lista")
     
+    # Sessions are independent and the chat handler is async, so many users' requests run concurrently
+    demo.queue(default_concurrency_limit=SESSION_CONCURRENCY)
     demo.launch(
         server_name="0.0.0.0",
         server_port=7860,
@@ -0,0 +1,258 @@
+"""
+Deterministic fast path for "<vehicle> with code <DTC>" messages.
+
+Most messages name one trouble code and one vehicle. For those the ReAct
+agent makes an LLM round trip per tool, always in the same order:
+search_diagnostic_code, query_known_issues, find_replacement_parts and
+calculate_repair_cost. The planner recognises the pattern with rules,
+runs that tool chain directly (reusing the prefetched lookups) and leaves
+a single LLM call to write the answer. Only messages that ask nothing beyond
+"what about this code on this vehicle" qualify: follow-ups ("ya cambié el
+catalizador y sigue"), how-to and manual questions, or any other extra
+content lower the confidence, and those messages, like codes missing from
+the database, go through the full agent.
+"""
+
+import json
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from src.agent.intent_router import REPAIR_GUIDE_SEARCH, MANUAL_SEARCH, normalize
+from src.agent.prefetch import Prefetch
+from src.agent.prompts import FAST_PATH_PROMPT, SYSTEM_PROMPT
+from src.rag.entity_extractor import get_entity_extractor, part_base_name
+from src.tools_impl.diagnostic_codes import search_diagnostic_code
+from src.tools_impl.known_issues import query_known_issues
+from src.tools_impl.parts_finder import find_replacement_parts
+from src.tools_impl.cost_calculator import calculate_repair_cost
+from src.utils.helpers import get_logger, load_json_file
+from src.utils.config import FAST_PATH_ENABLED, FAST_PATH_MIN_CONFIDENCE, FAST_PATH_MAX_CHARS, PARTS_CATALOG_PATH
+
+logger = get_logger(__name__)
+
+# Confidence contributed by each signal (one code and one vehicle are required)
+CODE_AND_VEHICLE_WEIGHT = 0.8
+YEAR_WEIGHT = 0.2
+# Confidence removed when the message asks something the canned chain does not answer
+FOLLOW_UP_PENALTY = 0.4
+OTHER_INTENT_PENALTY = 0.4
+EXTRA_CONTENT_PENALTY = 0.4
+
+# Router score from which a how-to or manual question counts as asked
+OTHER_INTENT_MIN_SCORE = 0.8
+# Content words (besides code, vehicle and the filler below) a plain code question may have
+MAX_EXTRA_WORDS = 2
+
+# Words of a plain "<vehicle> with code <DTC>" message (accent-folded, ES/EN)
+_PATTERN_WORDS = frozenset("""
+    tengo tiene mi mis un una el la los las lo de del con en y o que significa significado
+    codigo code codes dtc obd obd2 obdii error falla fallo sale salio salto marca aparece me nos
+    my a an the i we have has got with on in of for and what whats does do mean means meaning is it
+    hola hi hello buenas luz testigo check engine motor light car coche auto carro vehiculo vehicle
+    ano year modelo model ayuda help please por favor could be puede ser cual es problema problem
+    escaner scanner lector reader
+""".split())
+# Follow-ups and requests the code/issues/parts/cost chain does not answer
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(?:ya|sigue|sigo|todavia|aun|otra vez|de nuevo|despues|pero|no|cambie|reemplace|"
+    r"borr\w*|resete\w*|apag\w*|still|already|again|after|but|not|didn'?t|replaced|changed|"
+    r"clear\w*|reset\w*|erase|turn off)\b"
+)
+
+
+@dataclass
+class FastPathPlan:
+    """A message the fast path can answer: one trouble code on one vehicle."""
+
+    code: str
+    make: str
+    model: str
+    year: Optional[int]
+    confidence: float
+    signals: List[str] = field(default_factory=list)
+
+    @property
+    def vehicle(self) -> str:
+        return " ".join(str(part) for part in (self.make, self.model, self.year) if part)
+
+
+class FastPathPlanner:
+    """Detect code + vehicle messages and run their tool chain without the ReAct loop."""
+
+    def __init__(
+        self,
+        enabled: bool = FAST_PATH_ENABLED,
+        min_confidence: float = FAST_PATH_MIN_CONFIDENCE,
+        max_chars: int = FAST_PATH_MAX_CHARS
+    ):
+        """
+        Initialize the planner.
+
+        Args:
+            enabled: Whether the fast path is used at all
+            min_confidence: Minimum plan confidence (0-1) to skip the agent
+            max_chars: Longer messages usually ask for more than the chain answers
+        """
+        self.enabled = enabled
+        self.min_confidence = min_confidence
+        self.max_chars = max_chars
+        self._part_names: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+        self._stats = {"answered": 0, "fallbacks": 0, "llm_calls_saved": 0, "latency_ms": 0.0}
+
+    def plan(self, message: str, route) -> Optional[FastPathPlan]:
+        """
+        Decide whether a message can take the fast path.
+
+        Args:
+            message: User message
+            route: RouteDecision of the message
+
+        Returns:
+            The plan, or None if the full agent should answer
+        """
+        if not self.enabled or len(message) > self.max_chars:
+            return None
+
+        extractor = get_entity_extractor()
+        entities = extractor.extract(message)
+        vehicles = extractor.vehicles(message)
+        if len(entities["dtc_codes"]) != 1 or len(vehicles) != 1:
+            return None
+
+        (make, model), = vehicles
+        year = entities["years"][0] if len(entities["years"]) == 1 else None
+        confidence = CODE_AND_VEHICLE_WEIGHT
+        signals = ["code", "vehicle"]
+        if year is not None:
+            confidence += YEAR_WEIGHT
+            signals.append("year")
+
+        text = normalize(message)
+        if FOLLOW_UP_PATTERN.search(text):
+            confidence -= FOLLOW_UP_PENALTY
+            signals.append("-follow_up")
+        if max(route.scores.get(REPAIR_GUIDE_SEARCH, 0.0), route.scores.get(MANUAL_SEARCH, 0.0)) >= OTHER_INTENT_MIN_SCORE:
+            confidence -= OTHER_INTENT_PENALTY
+            signals.append("-other_intent")
+        known = _PATTERN_WORDS | set(normalize(f"{make} {model}").split())
+        # Codes, years and other numbers are not extra content
+        extra = [word for word in re.findall(r"\w+", text) if word not in known and not any(c.isdigit() for c in word)]
+        if len(extra) > MAX_EXTRA_WORDS:
+            confidence -= EXTRA_CONTENT_PENALTY
+            signals.append("-extra_content")
+
+        plan = FastPathPlan(entities["dtc_codes"][0], make, model, year, round(confidence, 2), signals)
+        if plan.confidence < self.min_confidence:
+            logger.info(f"Fast path skipped: confidence {plan.confidence} < {self.min_confidence} ({', '.join(signals)})")
+            return None
+        return plan
+
+    def _part_name(self, part_id: str) -> Optional[str]:
+        """Catalog base name of a part id ('CAT-001' -> 'Catalytic Converter')."""
+        with self._lock:
+            if self._part_names is None:
+                try:
+                    parts = load_json_file(PARTS_CATALOG_PATH)["parts"]
+                except Exception as e:
+                    logger.warning(f"Parts catalog unavailable for the fast path: {e}")
+                    parts = []
+                self._part_names = {part["id"]: part_base_name(part["name"]) for part in parts}
+        return self._part_names.get(part_id)
+
+    def run_chain(self, plan: FastPathPlan, prefetch: Optional[Prefetch] = None) -> Optional[List[Dict]]:
+        """
+        Run the tool chain of a plan.
+
+        Args:
+            plan: Plan from plan()
+            prefetch: The turn's prefetched lookups, if any
+
+        Returns:
+            Steps ({"tool", "tool_input", "observation"}, observations as the
+            tools return them), or None if the code is unknown
+        """
+        code = (prefetch.code_result(plan.code) if prefetch else None) or search_diagnostic_code(plan.code)
+        if not code.get("found") or "common_causes" not in code:
+            logger.info(f"Fast path skipped: {plan.code} not in the code database")
+            return None
+        steps = [{"tool": "search_diagnostic_code", "tool_input": plan.code, "observation": code}]
+
+        issues = (prefetch.issues_result(plan.make, plan.model, plan.year) if prefetch else None) \
+            or query_known_issues(plan.make, plan.model, plan.year)
+        steps.append({"tool": "query_known_issues", "tool_input": plan.vehicle, "observation": issues})
+
+        # Parts for the most likely cause that the catalog covers for this vehicle
+        vehicle = {"brand": plan.make, "model": plan.model, "year": str(plan.year or "")}
+        extractor = get_entity_extractor()
+        parts = None
+        for cause in code["common_causes"]:
+            for name in dict.fromkeys(filter(None, map(self._part_name, extractor.extract(cause)["part_ids"]))):
+                found = find_replacement_parts(vehicle, name)
+                if found.get("parts_found"):
+                    parts = found
+                    steps.append({"tool": "find_replacement_parts", "tool_input": f"{name} for {plan.vehicle}", "observation": found})
+                    break
+            if parts:
+                break
+
+        if parts:
+            part_id = parts["parts"][0]["id"]  # Cheapest
+            labor_hours = (code["repair_time_hours_min"] + code["repair_time_hours_max"]) / 2
+            cost = calculate_repair_cost([part_id], labor_hours)
+            steps.append({"tool": "calculate_repair_cost", "tool_input": f"parts: {part_id} labor: {labor_hours}", "observation": cost})
+
+        for step in steps:
+            step["observation"] = json.dumps(step["observation"], indent=2)
+        return steps
+
+    @staticmethod
+    def answer_prompt(inputs: Dict[str, str], chat_history: str, steps: List[Dict], language: str) -> str:
+        """
+        Prompt for the single LLM call that writes the answer.
+
+        Args:
+            inputs: Turn inputs (input, kb_context)
+            chat_history: Conversation memory
+            steps: Steps from run_chain()
+            language: Language of the answer
+
+        Returns:
+            Prompt text
+        """
+        observations = "\n\n".join(f"{s['tool']}({s['tool_input']}):\n{s['observation']}" for s in steps)
+        return FAST_PATH_PROMPT.format(
+            system_prompt=SYSTEM_PROMPT,
+            chat_history=chat_history,
+            kb_context=inputs.get("kb_context", ""),
+            input=inputs["input"],
+            observations=observations,
+            language=language
+        )
+
+    def record(self, plan: FastPathPlan, steps: Optional[List[Dict]], latency_ms: float):
+        """Count a fast path answer (steps given) or a fallback to the agent (steps None)."""
+        with self._lock:
+            if steps is None:
+                self._stats["fallbacks"] += 1
+                return
+            self._stats["answered"] += 1
+            self._stats["llm_calls_saved"] += len(steps)
+            self._stats["latency_ms"] += latency_ms
+        logger.info(
+            f"🚀 Fast path: {plan.code} on {plan.vehicle} answered in {latency_ms:.0f}ms "
+            f"with 1 LLM call ({len(steps)} saved)"
+        )
+
+    def stats(self) -> Dict:
+        """Answers, fallbacks, LLM calls saved and mean latency so far."""
+        with self._lock:
+            answered = self._stats["answered"]
+            return {
+                "answered": answered,
+                "fallbacks": self._stats["fallbacks"],
+                "llm_calls_saved": self._stats["llm_calls_saved"],
+                "avg_latency_ms": round(self._stats["latency_ms"] / answered, 1) if answered else 0.0
+            }
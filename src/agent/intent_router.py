@@ -0,0 +1,326 @@
+"""
+Fast local query-intent router that picks the retrieval strategy per message.
+
+Two signals are combined:
+- An Aho-Corasick automaton over weighted multilingual keywords (EN/ES/PT/FR),
+  matched in a single pass over the accent-folded message.
+- Cosine similarity between the message's hashed character-trigram vector and
+  per-intent centroids built from example utterances. This catches paraphrases
+  and misspellings the keyword lists miss, at a fraction of the cost of a
+  neural embedding.
+
+Retrieval is only skipped on positive evidence (a greeting, thanks or a
+price question with no diagnostic keyword). Messages no retrieval intent
+scores confidently for get an unrestricted search rather than none.
+
+Routing a message takes tens of microseconds, so it runs on every turn.
+"""
+
+import re
+import time
+import unicodedata
+import zlib
+from collections import deque
+from dataclasses import dataclass, field
+from math import sqrt
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.helpers import get_logger
+from src.utils.config import INTENT_ROUTER_MIN_SCORE
+
+logger = get_logger(__name__)
+
+NO_RETRIEVAL = "none"
+CODE_LOOKUP = "code_lookup"
+SYMPTOM_SEARCH = "symptom_search"
+REPAIR_GUIDE_SEARCH = "repair_guide_search"
+MANUAL_SEARCH = "manual_search"
+GENERAL_SEARCH = "general_search"  # Unrestricted search when no intent is confident
+
+INTENTS = (NO_RETRIEVAL, CODE_LOOKUP, SYMPTOM_SEARCH, REPAIR_GUIDE_SEARCH, MANUAL_SEARCH)
+RETRIEVAL_INTENTS = tuple(intent for intent in INTENTS if intent != NO_RETRIEVAL)
+
+# Knowledge base document types searched for each intent
+INTENT_DOC_TYPES = {
+    CODE_LOOKUP: ["diagnostic_code"],
+    SYMPTOM_SEARCH: ["symptom_diagnosis"],
+    REPAIR_GUIDE_SEARCH: ["repair_procedure"],
+    MANUAL_SEARCH: ["manual"],
+}
+
+DTC_PATTERN = re.compile(r"\b[pbcu][0-3][0-9a-f]{3}\b")
+
+# Keyword -> weight per intent, accent-folded and lowercase. A trailing "*"
+# matches any word starting with the keyword ("chirri*" -> "chirriante").
+INTENT_KEYWORDS: Dict[str, Dict[str, float]] = {
+    CODE_LOOKUP: {
+        "code": 1.0, "codigo": 1.0, "obd": 1.0, "obd2": 1.0, "obdii": 1.0, "dtc": 1.0,
+        "check engine": 1.0, "luz de motor": 1.0, "luz del motor": 1.0, "testigo del motor": 1.0,
+        "scanner": 0.6, "escaner": 0.6, "escaneo": 0.6, "fault code": 1.0, "error code": 1.0,
+        "codigo de error": 1.0, "code defaut": 1.0, "voyant moteur": 1.0, "luz de injecao": 1.0,
+    },
+    SYMPTOM_SEARCH: {
+        "noise": 1.0, "ruido": 1.0, "sound": 0.8, "sonido": 0.8, "barulho": 1.0, "bruit": 1.0,
+        "squeal*": 1.0, "chirri*": 1.0, "rechin*": 1.0, "grind*": 1.0, "knock*": 1.0, "golpe*": 0.8,
+        "vibra*": 1.0, "tiembla": 1.0, "shak*": 0.8, "leak*": 1.0, "fuga": 1.0, "gotea": 1.0,
+        "vazamento": 1.0, "fuite": 1.0, "smoke": 1.0, "humo": 1.0, "fumaca": 1.0, "smell": 1.0,
+        "olor": 1.0, "huele": 1.0, "overheat*": 1.0, "sobrecalient*": 1.0, "se calienta": 1.0, "shudder*": 1.0, "stall*": 1.0,
+        "se apaga": 1.0, "se cala": 1.0, "no arranca": 1.0, "won't start": 1.0, "wont start": 1.0,
+        "cuesta arrancar": 1.0, "hard to start": 1.0, "idle": 0.8, "ralenti": 0.8, "tirones": 1.0,
+        "jerk*": 0.8, "pulls to": 0.8, "se va hacia": 0.8, "loss of power": 1.0, "perdida de potencia": 1.0,
+        "symptom*": 1.0, "sintoma*": 1.0, "symptome*": 1.0, "problem": 0.6, "problema": 0.6,
+        "probleme": 0.6, "falla": 0.6, "fallo": 0.6, "issue": 0.5, "averia": 0.6,
+    },
+    REPAIR_GUIDE_SEARCH: {
+        "how to": 1.0, "how do i": 1.0, "como cambio": 1.0, "como cambiar": 1.0, "como se cambia": 1.0,
+        "como reemplazar": 1.0, "como reparar": 1.0, "replace": 1.0, "replacement": 1.0,
+        "reemplaz*": 1.0, "cambiar": 0.7, "sustituir": 1.0, "install*": 0.8, "instalar": 0.8,
+        "procedure": 1.0, "procedimiento": 1.0, "step by step": 1.0, "paso a paso": 1.0, "steps": 0.8,
+        "pasos": 0.8, "guide": 0.8, "guia": 0.8, "tutorial": 0.8, "remove": 0.6, "desmontar": 0.8,
+        "bleed": 0.8, "purgar": 0.8, "trocar": 0.8, "remplacer": 1.0, "repair": 0.5, "reparar": 0.5,
+    },
+    MANUAL_SEARCH: {
+        "manual": 1.2, "pdf": 1.2, "manuel": 1.0, "specification*": 1.0, "especificacion*": 1.0,
+        "spec": 0.8, "specs": 0.8, "torque spec": 1.0, "par de apriete": 1.0, "diagram*": 1.0,
+        "diagrama*": 1.0, "wiring": 1.0, "esquema electrico": 1.0, "capacity": 0.8, "capacidad": 0.8,
+        "fuse": 0.8, "fusible": 0.8, "service interval": 1.0, "intervalo": 0.6, "tsb": 1.0,
+        "boletin tecnico": 1.0, "fabricante": 0.6, "manufacturer": 0.6, "explain": 0.9, "explica*": 0.9,
+        "what is": 0.9, "que es": 0.9, "how does": 0.9, "como funciona": 0.9,
+    },
+    NO_RETRIEVAL: {
+        "hola": 0.6, "hello": 0.6, "hi": 0.4, "buenos dias": 0.6, "buenas": 0.4, "gracias": 0.8,
+        "thanks": 0.8, "thank you": 0.8, "ok": 0.4, "vale": 0.4, "perfecto": 0.4, "adios": 0.8,
+        "bye": 0.8, "cuanto cuesta": 1.2, "precio": 1.0, "price": 1.0, "presupuesto": 1.0,
+        "estimate": 1.0, "estimacion": 1.0, "how much": 1.0, "quote": 1.0, "cotizacion": 1.0, "who are you": 0.8, "quien eres": 0.8,
+    },
+}
+
+# Example utterances; their trigram centroids catch paraphrases the keywords miss
+INTENT_EXAMPLES: Dict[str, List[str]] = {
+    CODE_LOOKUP: [
+        "what does code P0420 mean", "que significa el codigo P0171", "me salio el codigo P0300 en el escaner",
+        "the check engine light is on with a code", "tengo la luz de check engine encendida",
+        "obd2 scanner shows a fault", "el diagnostico obd marca un error",
+    ],
+    SYMPTOM_SEARCH: [
+        "squealing noise when braking", "ruido chirriante al frenar", "the engine overheats in traffic",
+        "el motor se sobrecalienta", "white smoke from the exhaust", "sale humo blanco del escape",
+        "the car vibrates at highway speed", "el coche vibra en autopista", "rough idle and stalling",
+        "el motor tiembla en ralenti y se apaga", "there is an oil leak under the car", "hay una fuga de aceite",
+    ],
+    REPAIR_GUIDE_SEARCH: [
+        "how do I replace the brake pads", "como cambio las pastillas de freno", "steps to change the oil",
+        "pasos para cambiar el aceite", "spark plug replacement procedure", "procedimiento para cambiar las bujias",
+        "how to replace a catalytic converter", "como reemplazar el catalizador",
+    ],
+    MANUAL_SEARCH: [
+        "what does the service manual say", "que dice el manual de taller", "torque specification for the wheel nuts",
+        "especificacion de par de apriete", "wiring diagram for the alternator", "diagrama electrico del alternador",
+        "oil capacity according to the manufacturer", "capacidad de aceite segun el fabricante",
+    ],
+    NO_RETRIEVAL: [
+        "hello", "hola buenos dias", "thanks for the help", "muchas gracias", "how much will it cost",
+        "cuanto cuesta la reparacion", "give me an estimate", "hazme un presupuesto", "who are you", "ok perfect",
+    ],
+}
+
+CENTROID_WEIGHT = 1.5
+DTC_BONUS = 2.0
+# No-retrieval keyword score that skips retrieval on its own ("gracias", "cuanto cuesta");
+# weaker ones ("ok", "hola") only do so in messages of at most SHORT_MESSAGE_WORDS words
+NO_RETRIEVAL_MIN_KEYWORD_SCORE = 1.0
+SHORT_MESSAGE_WORDS = 3
+_HASH_DIM = 2048
+
+
+def normalize(text: str) -> str:
+    """Lowercase and strip accents ("Código" -> "codigo")."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: finds every keyword of every intent in one pass."""
+
+    def __init__(self, patterns: Dict[str, Tuple[str, float]]):
+        """
+        Args:
+            patterns: Keyword (optionally ending in "*") -> (intent, weight)
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, bool, str, float]]] = [[]]
+
+        for keyword, (intent, weight) in patterns.items():
+            prefix = keyword.endswith("*")
+            word = keyword.rstrip("*")
+            node = 0
+            for ch in word:
+                if ch not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][ch] = len(self._goto) - 1
+                node = self._goto[node][ch]
+            self._out[node].append((word, prefix, intent, weight))
+
+        # Breadth-first failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                if node:
+                    fallback = self._fail[node]
+                    while fallback and ch not in self._goto[fallback]:
+                        fallback = self._fail[fallback]
+                    self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text: str) -> List[Tuple[str, str, float]]:
+        """
+        Find keyword matches on word boundaries.
+
+        Args:
+            text: Normalized text
+
+        Returns:
+            List of (keyword, intent, weight), each keyword once
+        """
+        matches = {}
+        node = 0
+        for end, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for word, prefix, intent, weight in self._out[node]:
+                start = end - len(word) + 1
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                if not prefix and end + 1 < len(text) and text[end + 1].isalnum():
+                    continue
+                matches[(word, intent)] = weight
+        return [(word, intent, weight) for (word, intent), weight in matches.items()]
+
+
+def _trigram_vector(text: str) -> Dict[int, float]:
+    """Sparse, L2-normalized hashed character-trigram vector of a normalized text."""
+    counts: Dict[int, float] = {}
+    for word in re.findall(r"\w+", text):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            bucket = zlib.crc32(padded[i:i + 3].encode("utf-8")) % _HASH_DIM
+            counts[bucket] = counts.get(bucket, 0.0) + 1.0
+    norm = sqrt(sum(v * v for v in counts.values()))
+    return {k: v / norm for k, v in counts.items()} if norm else {}
+
+
+@dataclass
+class RouteDecision:
+    """Routing result for one message."""
+
+    intent: str
+    confidence: float
+    doc_types: Optional[List[str]] = None
+    scores: Dict[str, float] = field(default_factory=dict)
+    keywords: List[str] = field(default_factory=list)
+    elapsed_us: float = 0.0
+
+    @property
+    def needs_retrieval(self) -> bool:
+        return self.intent != NO_RETRIEVAL
+
+
+class IntentRouter:
+    """Route each message to no retrieval, code lookup, symptom, repair-guide or manual search."""
+
+    def __init__(
+        self,
+        keywords: Optional[Dict[str, Dict[str, float]]] = None,
+        examples: Optional[Dict[str, List[str]]] = None,
+        min_score: float = INTENT_ROUTER_MIN_SCORE
+    ):
+        """
+        Initialize the router.
+
+        Args:
+            keywords: Intent -> keyword weights (defaults to INTENT_KEYWORDS)
+            examples: Intent -> example utterances (defaults to INTENT_EXAMPLES)
+            min_score: Minimum score to restrict retrieval to an intent's document types;
+                below it the whole knowledge base is searched
+        """
+        keywords = INTENT_KEYWORDS if keywords is None else keywords
+        examples = INTENT_EXAMPLES if examples is None else examples
+        self.min_score = min_score
+
+        self._automaton = AhoCorasick({
+            normalize(word): (intent, weight)
+            for intent, words in keywords.items()
+            for word, weight in words.items()
+        })
+
+        self._centroids: Dict[str, Dict[int, float]] = {}
+        for intent, utterances in examples.items():
+            centroid: Dict[int, float] = {}
+            for utterance in utterances:
+                for bucket, value in _trigram_vector(normalize(utterance)).items():
+                    centroid[bucket] = centroid.get(bucket, 0.0) + value
+            norm = sqrt(sum(v * v for v in centroid.values()))
+            self._centroids[intent] = {k: v / norm for k, v in centroid.items()} if norm else {}
+
+    @staticmethod
+    def _no_retrieval_evidence(text: str, keyword_scores: Dict[str, float]) -> bool:
+        """Whether a message is only a greeting, thanks or price question (no diagnostic keyword)."""
+        if any(keyword_scores[intent] for intent in RETRIEVAL_INTENTS):
+            return False
+        evidence = keyword_scores[NO_RETRIEVAL]
+        return evidence >= NO_RETRIEVAL_MIN_KEYWORD_SCORE or (
+            evidence > 0 and len(re.findall(r"\w+", text)) <= SHORT_MESSAGE_WORDS
+        )
+
+    def route(self, message: str) -> RouteDecision:
+        """
+        Classify a message.
+
+        Args:
+            message: User message
+
+        Returns:
+            RouteDecision with the chosen intent, its score and the doc types to search
+        """
+        start = time.perf_counter()
+        text = normalize(message)
+
+        scores = {intent: 0.0 for intent in INTENTS}
+        keyword_scores = {intent: 0.0 for intent in INTENTS}
+        matched = []
+        for word, intent, weight in self._automaton.find(text):
+            scores[intent] += weight
+            keyword_scores[intent] += weight
+            matched.append(word)
+
+        vector = _trigram_vector(text)
+        for intent, centroid in self._centroids.items():
+            similarity = sum(value * centroid.get(bucket, 0.0) for bucket, value in vector.items())
+            scores[intent] += CENTROID_WEIGHT * similarity
+
+        if DTC_PATTERN.search(text):
+            scores[CODE_LOOKUP] += DTC_BONUS
+            matched.append("<dtc>")
+
+        intent = max(RETRIEVAL_INTENTS, key=lambda name: scores[name])
+        confidence = scores[intent]
+        if confidence < self.min_score:
+            if self._no_retrieval_evidence(text, keyword_scores):
+                intent, confidence = NO_RETRIEVAL, scores[NO_RETRIEVAL]
+            else:
+                intent = GENERAL_SEARCH  # Confidence stays that of the best (unconfident) intent
+
+        return RouteDecision(
+            intent=intent,
+            confidence=round(confidence, 3),
+            doc_types=INTENT_DOC_TYPES.get(intent),
+            scores={name: round(score, 3) for name, score in scores.items()},
+            keywords=matched,
+            elapsed_us=round((time.perf_counter() - start) * 1e6, 1)
+        )
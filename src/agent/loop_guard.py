@@ -0,0 +1,275 @@
+"""
+Loop detection for the agent executor.
+
+Free models sometimes call the same tool with the same input over and
+over, each time paying an LLM round trip, until max_iterations or
+max_execution_time stops the run with no answer. The guard fingerprints
+every step as (tool, normalized input, observation). A repeated call is
+answered from the earlier observation plus a corrective hint instead of
+running the tool again, and once the repeats reach LOOP_GUARD_MAX_REPEATS
+the loop ends and the agent is made to write its final answer: text
+agents through LangChain's "generate" stop, function-calling agents
+through one final LLM call over the observations gathered so far. The
+iteration budget left unspent (an upper bound on the iterations the loop
+would have taken) is reported with the turn's result.
+
+The guard covers every way the executor runs: invoke/ainvoke go through
+_call/_acall, while stream/astream (and so astream_events) drive
+AgentExecutorIterator, which skips those; both paths share
+_should_continue, _consume_next_step and _return/_areturn.
+"""
+
+import asyncio
+import functools
+import json
+import re
+import threading
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+
+from langchain.agents import Agent, AgentExecutor
+from langchain.agents.agent_iterator import AgentExecutorIterator
+from langchain_core.agents import AgentAction, AgentFinish, AgentStep
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.runnables import RunnableConfig, ensure_config
+
+from src.agent.prompts import LOOP_HINT, LOOP_FINAL_PROMPT, SYSTEM_PROMPT
+from src.utils.helpers import get_logger
+from src.utils.config import LOOP_GUARD_ENABLED, LOOP_GUARD_MAX_REPEATS
+
+logger = get_logger(__name__)
+
+# Guard of the run in progress (tool calls on the shared pool see it through a context copy)
+_guard: ContextVar[Optional["LoopGuard"]] = ContextVar("loop_guard", default=None)
+
+
+def normalize_tool_input(tool_input: Any) -> str:
+    """Tool input in a canonical form, so trivially different spellings of a call match."""
+    if isinstance(tool_input, dict):
+        tool_input = json.dumps(tool_input, sort_keys=True, default=str)
+    text = re.sub(r"\s+", " ", str(tool_input)).strip().strip("'\"`").strip()
+    return text.rstrip(".").lower()
+
+
+class LoopGuard:
+    """Repeated tool calls of one agent run."""
+
+    def __init__(self, max_repeats: int, inputs: Dict[str, Any]):
+        """
+        Initialize the guard.
+
+        Args:
+            max_repeats: Repeated calls tolerated before the final answer is forced
+            inputs: Inputs of the run (needed to generate the forced answer)
+        """
+        self.max_repeats = max_repeats
+        self.inputs = inputs
+        self.repeats = 0
+        self.cached_calls = 0
+        self.max_iterations_avoided = 0
+        self.stopped = False
+        self._observations: Dict[Tuple[str, str], str] = {}
+        self._fingerprints: Set[Tuple[str, str, int]] = set()
+        self._lock = threading.Lock()
+
+    def cached(self, action: AgentAction) -> Optional[str]:
+        """Earlier observation of a repeated call, with a corrective hint (None for a new call)."""
+        key = (action.tool, normalize_tool_input(action.tool_input))
+        with self._lock:
+            observation = self._observations.get(key)
+            if observation is None:
+                return None
+            self.repeats += 1
+            self.cached_calls += 1
+        logger.info(f"🔁 Repeated call {action.tool}({key[1]}) answered from cache ({self.repeats} repeats)")
+        return observation + LOOP_HINT.format(tool=action.tool)
+
+    def record(self, steps: List[Tuple[AgentAction, Any]]):
+        """
+        Fingerprint the steps of an iteration.
+
+        Repeated tool calls are counted by cached(); here identical parsing
+        error steps (the same unparseable output again) count as repeats.
+        """
+        with self._lock:
+            for action, observation in steps:
+                key = (action.tool, normalize_tool_input(action.tool_input))
+                fingerprint = key + (hash(str(observation)),)
+                if action.tool == "_Exception":
+                    self.repeats += fingerprint in self._fingerprints
+                else:
+                    self._observations.setdefault(key, str(observation))
+                self._fingerprints.add(fingerprint)
+
+    @property
+    def should_stop(self) -> bool:
+        return self.repeats >= self.max_repeats
+
+    def stop(self, max_iterations_avoided: int):
+        """
+        End the run early.
+
+        Args:
+            max_iterations_avoided: Iterations left in the budget, i.e. the most
+                the loop could have gone on for (it may have ended sooner)
+        """
+        self.stopped = True
+        self.max_iterations_avoided = max_iterations_avoided
+        logger.warning(
+            f"🔁 Agent loop: {self.repeats} repeated tool calls, forcing the final answer "
+            f"(up to {max_iterations_avoided} iterations avoided)"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Repeats, calls answered from cache, the iteration budget left unspent and whether the run was stopped."""
+        return {
+            "repeats": self.repeats,
+            "cached_calls": self.cached_calls,
+            "max_iterations_avoided": self.max_iterations_avoided,
+            "stopped": self.stopped
+        }
+
+
+class GuardedAgentExecutor(AgentExecutor):
+    """AgentExecutor that keeps the agent from repeating tool calls."""
+
+    loop_guard: bool = LOOP_GUARD_ENABLED
+    max_repeats: int = LOOP_GUARD_MAX_REPEATS
+    # Writes the forced answer of agents without a "generate" stop (function calling)
+    answer_llm: Optional[BaseLanguageModel] = None
+    answer_instruction: str = ""
+
+    def _new_guard(self, inputs: Dict[str, Any]) -> Optional[LoopGuard]:
+        return LoopGuard(self.max_repeats, inputs) if self.loop_guard else None
+
+    def _call(self, inputs: Dict[str, str], run_manager=None) -> Dict[str, Any]:
+        token = _guard.set(self._new_guard(inputs))
+        try:
+            return super()._call(inputs, run_manager)
+        finally:
+            _guard.reset(token)
+
+    async def _acall(self, inputs: Dict[str, str], run_manager=None) -> Dict[str, Any]:
+        token = _guard.set(self._new_guard(inputs))
+        try:
+            return await super()._acall(inputs, run_manager)
+        finally:
+            _guard.reset(token)
+
+    def _iterator(self, input: Any, config: Optional[RunnableConfig], **kwargs) -> AgentExecutorIterator:
+        """Step iterator of stream()/astream(), built as AgentExecutor does."""
+        config = ensure_config(config)
+        return AgentExecutorIterator(
+            self,
+            input,
+            config.get("callbacks"),
+            tags=config.get("tags"),
+            metadata=config.get("metadata"),
+            run_name=config.get("run_name"),
+            run_id=config.get("run_id"),
+            yield_actions=True,
+            **kwargs,
+        )
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> Iterator[Dict[str, Any]]:
+        iterator = self._iterator(input, config, **kwargs)
+        token = _guard.set(self._new_guard(iterator.inputs))  # Inputs with memory loaded, as in _call
+        try:
+            yield from iterator
+        finally:
+            _guard.reset(token)
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        iterator = self._iterator(input, config, **kwargs)
+        token = _guard.set(self._new_guard(iterator.inputs))
+        try:
+            async for step in iterator:
+                yield step
+        finally:
+            _guard.reset(token)
+
+    def _should_continue(self, iterations: int, time_elapsed: float) -> bool:
+        guard = _guard.get()
+        if guard is not None and not guard.stopped and guard.should_stop:
+            guard.stop(max(self.max_iterations - iterations, 0) if self.max_iterations else 0)
+        if guard is not None and guard.stopped:
+            return False
+        return super()._should_continue(iterations, time_elapsed)
+
+    def _consume_next_step(self, values):
+        # Every run path (invoke, ainvoke, stream, astream) hands each completed step through here
+        result = super()._consume_next_step(values)
+        guard = _guard.get()
+        if guard is not None and not isinstance(result, AgentFinish):
+            guard.record(result)
+        return result
+
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None) -> AgentStep:
+        guard = _guard.get()
+        observation = guard.cached(agent_action) if guard is not None else None
+        if observation is None:
+            return super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        if run_manager:
+            run_manager.on_agent_action(agent_action, color="green")
+        return AgentStep(action=agent_action, observation=observation)
+
+    async def _aperform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None) -> AgentStep:
+        guard = _guard.get()
+        observation = guard.cached(agent_action) if guard is not None else None
+        if observation is None:
+            return await super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        if run_manager:
+            await run_manager.on_agent_action(agent_action, color="green")
+        return AgentStep(action=agent_action, observation=observation)
+
+    def _forced_answer(self, output: AgentFinish, intermediate_steps: list, guard: LoopGuard) -> AgentFinish:
+        """Final answer of a run the guard stopped, written by the LLM from the steps so far."""
+        try:
+            if isinstance(self._action_agent, Agent):
+                return self._action_agent.return_stopped_response("generate", intermediate_steps, **guard.inputs)
+            if self.answer_llm is None:
+                return output  # Runnable agents only support the "force" stop message
+            answer = self.answer_llm.invoke(self._answer_prompt(intermediate_steps, guard.inputs))
+            text = str(getattr(answer, "content", answer)).strip()
+            return AgentFinish({"output": text}, text) if text else output
+        except Exception as e:
+            logger.warning(f"Could not generate the final answer after a loop: {e}")
+            return output
+
+    def _answer_prompt(self, intermediate_steps: list, inputs: Dict[str, Any]) -> str:
+        """Prompt of the forced answer: each distinct tool call once, without the repeat hints."""
+        seen, observations = set(), []
+        for action, observation in intermediate_steps:
+            key = (action.tool, normalize_tool_input(action.tool_input))
+            if action.tool == "_Exception" or key in seen:
+                continue
+            seen.add(key)
+            observations.append(f"{action.tool}({action.tool_input}):\n{observation}")
+        return LOOP_FINAL_PROMPT.format(
+            system_prompt=SYSTEM_PROMPT,
+            chat_history=inputs.get("chat_history", ""),
+            kb_context=inputs.get("kb_context", ""),
+            input=inputs["input"],
+            observations="\n\n".join(observations),
+            instruction=self.answer_instruction
+        )
+
+    def _return(self, output: AgentFinish, intermediate_steps: list, run_manager=None) -> Dict[str, Any]:
+        guard = _guard.get()
+        if guard is not None and guard.stopped:
+            output = self._forced_answer(output, intermediate_steps, guard)
+        final_output = super()._return(output, intermediate_steps, run_manager)
+        if guard is not None:
+            final_output["loop_guard"] = guard.stats()
+        return final_output
+
+    async def _areturn(self, output: AgentFinish, intermediate_steps: list, run_manager=None) -> Dict[str, Any]:
+        guard = _guard.get()
+        if guard is not None and guard.stopped:
+            output = await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(self._forced_answer, output, intermediate_steps, guard)
+            )
+        final_output = await super()._areturn(output, intermediate_steps, run_manager)
+        if guard is not None:
+            final_output["loop_guard"] = guard.stats()
+        return final_output
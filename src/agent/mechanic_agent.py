@@ -2,11 +2,16 @@
 Main Mechanic Diagnostic Agent using LangChain ReAct pattern.
 """
 
-from typing import List, Dict, Any, Optional
-from langchain.agents import AgentExecutor, create_react_agent
+import asyncio
+import functools
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, AsyncIterator, Optional
+from langchain.agents import AgentExecutor
 from langchain_openai import ChatOpenAI
-from langchain.memory import ConversationBufferMemory
-from langchain.prompts import PromptTemplate
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 try:
     from langchain.schema import AgentAction, AgentFinish
@@ -16,17 +21,103 @@ except ImportError:
     except ImportError:
         from langchain_core.schema import AgentAction, AgentFinish
 
-from src.agent.tools import get_all_tools
-from src.agent.prompts import SYSTEM_PROMPT, GREETING
-from src.rag.knowledge_base import initialize_knowledge_base
+from src.agent.tools import get_all_tools, get_structured_tools
+from src.agent.prompts import (
+    SYSTEM_PROMPT, GREETING, AGENT_SUFFIX, TURN_INPUT_VARIABLES, PARALLEL_FORMAT_INSTRUCTIONS,
+    TOOL_AGENT_SYSTEM, TOOL_AGENT_HUMAN
+)
+from src.agent.memory import BudgetedSummaryMemory
+from src.agent.intent_router import IntentRouter
+from src.agent.fast_path import FastPathPlanner, FastPathPlan
+from src.agent.prefetch import Prefetch, KB_CONTEXT_HEADER
+from src.agent.parallel_tools import ParallelZeroShotAgent, ParallelAgentExecutor, tool_call_stats
+from src.agent.output_parser import TolerantOutputParser
+from src.agent.loop_guard import GuardedAgentExecutor
+from src.agent.streaming import FinalAnswerFilter, agent_events, root_output, OBSERVATION_PREVIEW, FINAL_ANSWER_MARKER
+from src.rag.knowledge_base import start_knowledge_base_loader
 from src.rag.retriever import KnowledgeRetriever
+from src.rag.reranker import CrossEncoderReranker
 from src.utils.helpers import get_logger
 from src.utils.language_detector import LanguageDetector, LanguageInstructions
-from src.utils.config import OPENROUTER_API_KEY, TOP_K_RESULTS
+from src.utils.config import (
+    OPENROUTER_API_KEY, TOP_K_RESULTS, RERANK_ENABLED, KB_PREFETCH_WAIT_MS, PARALLEL_TOOLS_ENABLED, AGENT_MODE,
+    OUTPUT_REPAIR_ENABLED
+)
 from src.utils.model_manager import ModelManager
 
 logger = get_logger(__name__)
 
+# Longest pause between checks when an async turn waits for a synchronous turn or reset
+SESSION_LOCK_POLL_S = 0.05
+
+# HARDCODED SPANISH CONFIGURATION PER USER REQUEST
+# We ignore detection and force Spanish for everything.
+FORCED_LANGUAGE = "Spanish"
+LANGUAGE_INSTRUCTION = (
+    "IMPORTANTE: DEBES responder SIEMPRE en ESPAÑOL. "
+    "TRADUCE tu respuesta final y explicaciones."
+)
+# The ReAct agent also needs the protocol keywords kept in English
+STRONG_INSTRUCTION = (
+    LANGUAGE_INSTRUCTION + "\n"
+    "CRITICO: NO TRADUZCAS LOS COMANDOS DEL PROTOCOLO.\n"
+    "MANTÉN 'Thought:', 'Action:', 'Action Input:', y 'Final Answer:' EXACTAMENTE EN INGLÉS.\n"
+    "Ejemplo correcto:\n"
+    "Thought: He encontrado el problema.\n"
+    "Final Answer: El problema es..."
+)
+
+# Attempts per message (each failed attempt may switch to another model)
+MAX_CHAT_RETRIES = 3
+MAX_RETRIES_RESPONSE = {
+    "response": "I encountered an error and could not process your request after multiple attempts.",
+    "steps": [],
+    "success": False,
+    "error": "Max retries exceeded"
+}
+
+
+@dataclass
+class AgentSession:
+    """
+    Per-conversation state: memory, step trace and an executor bound to that memory.
+    
+    Everything heavy (LLM client, knowledge base, tools, router) stays on the
+    shared MechanicAgent, so a session costs only its chat history.
+    """
+    
+    session_id: str
+    memory: BudgetedSummaryMemory
+    last_steps: List[Dict] = field(default_factory=list)
+    executor: Optional[AgentExecutor] = None
+    model_name: Optional[str] = None  # Model the executor was built for
+    agent_mode: str = "react"  # "react" or "tools" (native function calling), per executor
+    # One guard for every entry point (chat, achat, astream_chat, reset): a turn and
+    # a reset of the same session never interleave, whichever path they take
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    # Queues the async turns in arrival order on the event loop, without a thread per waiter
+    alock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    
+    @asynccontextmanager
+    async def alocked(self):
+        """
+        Hold `lock` from a coroutine.
+        
+        Async turns wait on `alock`; only the one at its head then polls
+        `lock`, which a synchronous chat() or reset may still be holding.
+        """
+        async with self.alock:
+            delay = 0.005
+            while not self.lock.acquire(blocking=False):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, SESSION_LOCK_POLL_S)
+            try:
+                yield
+            finally:
+                self.lock.release()
+
 
 class MechanicAgent:
     """
@@ -61,34 +152,32 @@ class MechanicAgent:
         # Initialize LLM via OpenRouter
         self.llm = self._create_llm()
         
-        # Initialize knowledge base and retriever
-        logger.info("Loading knowledge base...")
-        self.knowledge_base = initialize_knowledge_base(rebuild=False)
-        self.retriever = KnowledgeRetriever(
-            self.knowledge_base,
-            k=TOP_K_RESULTS
-        )
+        # Load (or build) the knowledge base in the background; until it is
+        # ready the agent answers with its tools only
+        logger.info("Loading knowledge base in the background...")
+        self.kb_loader = start_knowledge_base_loader(rebuild=False)
+        self.knowledge_base = None
+        self.retriever = None
         
-        # Get tools
-        self.tools = get_all_tools()
+        # Picks the retrieval strategy (or none) for each message
+        self.intent_router = IntentRouter()
         
-        # Initialize conversation memory
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True,
-            output_key="output"
-        )
+        # Answers "<vehicle> with code <DTC>" messages without the ReAct loop
+        self.fast_path = FastPathPlanner()
         
-        # Create agent
-        self.agent_executor = self._create_agent(verbose=verbose)
+        # Get tools (free-text inputs for ReAct, typed schemas for function calling)
+        self.tools = get_all_tools()
+        self.structured_tools = get_structured_tools()
+        self.agent_mode = AGENT_MODE
         
-        # Track agent steps for UI display
-        self.last_steps: List[Dict] = []
+        # Conversations get their own memory and executor (see new_session());
+        # the default session serves single-user callers such as the CLI
+        self.verbose = verbose
+        self._model_lock = threading.Lock()
+        self.default_session = self.new_session("default")
         
         logger.info("✅ Mechanic Agent initialized successfully")
     
-        logger.info("✅ Mechanic Agent initialized successfully")
-    
     def _create_llm(self) -> ChatOpenAI:
         """Create LLM instance with current model."""
         if not OPENROUTER_API_KEY:
@@ -102,47 +191,88 @@ class MechanicAgent:
             max_tokens=1024
         )
 
-    def _create_agent(self, verbose: bool = True) -> AgentExecutor:
-        """Create the ReAct agent with tools."""
-        
-        # Create ReAct prompt template with clearer format
-        template = f"""{SYSTEM_PROMPT}
-
-You have access to the following tools:
-
-{{tools}}
-
-**CRITICAL: RESPOND USING THIS EXACT FORMAT - NO OTHER TEXT ALLOWED:**
-
-Thought: <what I need to do next>
-Action: <tool name from list: {{tool_names}}>
-Action Input: <simple input string for the tool>
-Observation: <will be provided by system>
-
-**When ready to answer:**
-Thought: <I now have enough information>
-Final Answer: <your complete response>
-
-**STOP IMMEDIATELY AFTER Final Answer - DO NOT ADD ANY TEXT**
-
-**CRITICAL RULES:**
-1. Use tool names EXACTLY as listed: {{tool_names}}
-2. Action and Action Input MUST be on separate lines
-3. Action Input must be plain text (no quotes, no formatting)
-4. After writing "Final Answer:", STOP - do not add ANY text or thoughts
-5. Never write "Thought:" after "Final Answer:"
-6. If you write Final Answer, your turn is OVER
-
-Previous conversation:
-{{chat_history}}
-
-{{input}}
-Thought:{{agent_scratchpad}}"""
+    @property
+    def memory(self) -> BudgetedSummaryMemory:
+        """Memory of the default session."""
+        return self.default_session.memory
+    
+    @property
+    def last_steps(self) -> List[Dict]:
+        """Step trace of the default session."""
+        return self.default_session.last_steps
+    
+    @property
+    def agent_executor(self) -> AgentExecutor:
+        """Executor of the default session."""
+        return self._executor_for(self.default_session)
+    
+    def new_session(self, session_id: str) -> AgentSession:
+        """
+        Create the per-conversation state for a new session.
         
-        prompt = PromptTemplate(
-            template=template,
-            input_variables=["input", "tools", "tool_names", "agent_scratchpad", "chat_history"]
+        Args:
+            session_id: Session identifier (e.g. the Gradio session hash)
+            
+        Returns:
+            AgentSession with an empty memory; its executor is built on first use
+        """
+        # Token-budgeted: recent turns verbatim, older ones folded into a summary
+        memory = BudgetedSummaryMemory(
+            llm=self.llm,
+            memory_key="chat_history",
+            input_key="input",
+            output_key="output"
         )
+        return AgentSession(session_id=session_id, memory=memory)
+    
+    def _executor_for(self, session: AgentSession) -> AgentExecutor:
+        """Executor bound to the session's memory, rebuilt after a model switch."""
+        if session.executor is None or session.model_name != self.current_model_name:
+            session.model_name = self.current_model_name
+            session.memory.llm = self.llm  # Summaries use the current model too
+            session.agent_mode = "tools" if self._uses_tool_calling() else "react"
+            session.executor = self._create_agent(
+                verbose=self.verbose, memory=session.memory, agent_mode=session.agent_mode
+            )
+        return session.executor
+    
+    def _uses_tool_calling(self) -> bool:
+        """Whether the current model gets the native function-calling agent."""
+        if self.agent_mode == "auto":
+            return self.model_manager.supports_tools(self.current_model_name)
+        return self.agent_mode == "tools"
+    
+    def _switch_model(self, failed_model: str) -> bool:
+        """
+        Mark a model as failed and move every session to the next one.
+        
+        Args:
+            failed_model: Model the failing request used
+            
+        Returns:
+            True if the caller should retry (with a different model)
+        """
+        with self._model_lock:
+            if failed_model != self.current_model_name:
+                # Another session already switched away from it
+                return True
+            self.model_manager.mark_current_failed()
+            new_model = self.model_manager.get_current_model_id()
+            if not new_model or new_model == self.current_model_name:
+                return False
+            self.current_model_name = new_model
+            logger.info(f"Switching to new model: {self.current_model_name}")
+            self.llm = self._create_llm()
+            return True
+    
+    def _create_agent(
+        self,
+        verbose: bool = True,
+        memory: Optional[BudgetedSummaryMemory] = None,
+        agent_mode: str = "react"
+    ) -> AgentExecutor:
+        """Create the agent with tools (ReAct, or function calling for agent_mode "tools"), bound to a conversation memory."""
+        memory = memory if memory is not None else self.memory
         
         # Custom parsing error message (Spanish to help the agent recover)
         parsing_error_message = (
@@ -164,186 +294,629 @@ Thought:{{agent_scratchpad}}"""
         except:
             callbacks = []
 
-        # Use initialize_agent (more robust in this environment)
-        from langchain.agents import initialize_agent, AgentType
+        if agent_mode == "tools":
+            return self._create_tool_calling_agent(verbose, memory, callbacks)
+        
+        # Zero-shot ReAct agent; in parallel mode it may request several
+        # independent tool calls per step, which the executor runs concurrently
+        from langchain.agents import ZeroShotAgent, AgentType
+        from langchain.agents.mrkl.prompt import FORMAT_INSTRUCTIONS
         
-        agent = initialize_agent(
+        if PARALLEL_TOOLS_ENABLED:
+            agent_cls, executor_cls, format_instructions = ParallelZeroShotAgent, ParallelAgentExecutor, PARALLEL_FORMAT_INSTRUCTIONS
+        else:
+            agent_cls, executor_cls, format_instructions = ZeroShotAgent, GuardedAgentExecutor, FORMAT_INSTRUCTIONS
+        # Near-miss output is repaired locally; only ambiguous output costs a re-prompt
+        output_parser = TolerantOutputParser(
+            tool_names=[tool.name for tool in self.tools],
+            multi_action=PARALLEL_TOOLS_ENABLED
+        ) if OUTPUT_REPAIR_ENABLED else None
+        
+        react_agent = agent_cls.from_llm_and_tools(
+            self.llm,
+            self.tools,
+            prefix=SYSTEM_PROMPT,
+            suffix=AGENT_SUFFIX,
+            format_instructions=format_instructions,
+            input_variables=TURN_INPUT_VARIABLES + ["chat_history", "agent_scratchpad"],
+            output_parser=output_parser
+        )
+        agent = executor_cls.from_agent_and_tools(
+            agent=react_agent,
             tools=self.tools,
-            llm=self.llm,
-            agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+            tags=[AgentType.ZERO_SHOT_REACT_DESCRIPTION.value],
             verbose=verbose,
             max_iterations=20,  # Increased from 10 to 20 to prevent early termination on complex tasks
             max_execution_time=120, # 2 minutes max time
-            memory=self.memory,
+            memory=memory,
             handle_parsing_errors=parsing_error_message,
             return_intermediate_steps=True,
             callbacks=callbacks,
-            early_stopping_method="force",
-            agent_kwargs={
-                "prefix": SYSTEM_PROMPT
-            }
+            early_stopping_method="force"
         )
         
-        # Create executor with callbacks
-        agent_executor = AgentExecutor(
-            agent=agent,
-            tools=self.tools,
-            memory=self.memory,
+        return agent
+    
+    def _create_tool_calling_agent(self, verbose: bool, memory: BudgetedSummaryMemory, callbacks: List) -> AgentExecutor:
+        """
+        Create an agent that calls tools through the API's function calling.
+        
+        The model fills each tool's JSON schema and the reply carries the
+        tool calls, so there is no Thought/Action text to parse and no round
+        trip is lost to a malformed step.
+        """
+        from langchain.agents import create_tool_calling_agent
+        
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", TOOL_AGENT_SYSTEM),
+            ("human", TOOL_AGENT_HUMAN),
+            MessagesPlaceholder("agent_scratchpad")
+        ]).partial(language_instruction=LANGUAGE_INSTRUCTION)
+        
+        executor_cls = ParallelAgentExecutor if PARALLEL_TOOLS_ENABLED else GuardedAgentExecutor
+        return executor_cls(
+            agent=create_tool_calling_agent(self.llm, self.structured_tools, prompt),
+            tools=self.structured_tools,
+            memory=memory,
             verbose=verbose,
-            max_iterations=10,  # Increased to allow more tool usage
-            handle_parsing_errors=parsing_error_message,  # Custom error message
+            max_iterations=20,
+            max_execution_time=120,
+            handle_parsing_errors="Invalid tool call arguments. Call the tool again with valid JSON matching its schema.",
             return_intermediate_steps=True,
-            callbacks=callbacks,  # Add Langfuse tracing
-            early_stopping_method="force"  # Force stop at max iterations
+            callbacks=callbacks,
+            early_stopping_method="force",
+            # A stopped loop still ends with an answer written over the tool results
+            answer_llm=self.llm,
+            answer_instruction=LANGUAGE_INSTRUCTION
         )
+    
+    def _get_retriever(self) -> Optional[KnowledgeRetriever]:
+        """Get the retriever once the background knowledge base load has finished."""
+        if self.retriever is None and self.kb_loader.ready:
+            self.knowledge_base = self.kb_loader.knowledge_base
+            self.retriever = KnowledgeRetriever(
+                self.knowledge_base,
+                k=TOP_K_RESULTS,
+                reranker=CrossEncoderReranker() if RERANK_ENABLED else None
+            )
+            logger.info("✅ Knowledge base ready, RAG context enabled")
+        return self.retriever
+    
+    def get_knowledge_base_status(self) -> Dict:
+        """
+        Get knowledge base build/load progress for the UI.
         
-        return agent
+        Returns:
+            Dictionary with ready flag, stage, counts and ETA
+        """
+        return self.kb_loader.status()
     
-    def consult_knowledge_base(self, query: str) -> tuple[str, List[Dict]]:
+    def consult_knowledge_base(self, query: str, doc_types: Optional[List[str]] = None) -> tuple[str, List[Dict]]:
         """
         Consult the RAG knowledge base for relevant information.
         
         Args:
             query: Search query
+            doc_types: Restrict the search to these document types (from the intent router)
             
         Returns:
             Tuple of (Formatted context, List of sources)
         """
+        retriever = self._get_retriever()
+        if retriever is None:
+            logger.info("Knowledge base still loading, answering with tools only")
+            return "", []
+        
         logger.info(f"Consulting knowledge base: {query}")
-        context, sources = self.retriever.retrieve_with_sources(query)
+        context, sources = retriever.retrieve_with_sources(query, doc_types)
         return context, sources
     
-    def chat(self, message: str) -> Dict[str, Any]:
+    async def aconsult_knowledge_base(self, query: str, doc_types: Optional[List[str]] = None) -> tuple[str, List[Dict]]:
+        """
+        Async version of consult_knowledge_base().
+        
+        Args:
+            query: Search query
+            doc_types: Restrict the search to these document types (from the intent router)
+            
+        Returns:
+            Tuple of (Formatted context, List of sources)
+        """
+        retriever = self._get_retriever()
+        if retriever is None:
+            logger.info("Knowledge base still loading, answering with tools only")
+            return "", []
+        
+        logger.info(f"Consulting knowledge base (async): {query}")
+        return await retriever.aretrieve_with_sources(query, doc_types)
+    
+    def chat(self, message: str, session: Optional[AgentSession] = None) -> Dict[str, Any]:
         """
         Send a message to the agent and get a response.
         Detects the language of the user input and responds in the same language.
         
         Args:
             message: Message from the mechanic
+            session: Conversation to answer in (defaults to the default session)
             
         Returns:
             Dictionary with response and metadata
         """
-        logger.info(f"Processing message: {message[:100]}...")
-        
-        # HARDCODED SPANISH CONFIGURATION PER USER REQUEST
-        # We ignore detection and force Spanish for everything.
-        language_name = "Spanish"
-        strong_instruction = (
-            "IMPORTANTE: DEBES responder SIEMPRE en ESPAÑOL. "
-            "TRADUCE tu respuesta final y explicaciones.\n"
-            "CRITICO: NO TRADUZCAS LOS COMANDOS DEL PROTOCOLO.\n"
-            "MANTÉN 'Thought:', 'Action:', 'Action Input:', y 'Final Answer:' EXACTAMENTE EN INGLÉS.\n"
-            "Ejemplo correcto:\n"
-            "Thought: He encontrado el problema.\n"
-            "Final Answer: El problema es..."
+        session = session or self.default_session
+        # Messages of one session are answered in order; sessions run concurrently
+        with session.lock:
+            session.last_used = time.monotonic()
+            return self._chat(message, session)
+    
+    def _start_turn(self, message: str, session: AgentSession) -> Any:
+        """Log the message and route it; returns the RouteDecision."""
+        logger.info(f"[{session.session_id}] Processing message: {message[:100]}...")
+        logger.info(f"Forcing language: {FORCED_LANGUAGE}")
+        
+        route = self.intent_router.route(message)
+        logger.info(f"🧭 Intent: {route.intent} (score {route.confidence}, {route.elapsed_us}µs)")
+        return route
+    
+    @staticmethod
+    def _build_inputs(message: str, kb_context: str) -> Dict[str, str]:
+        """
+        Executor inputs for one turn.
+        
+        Only "input" (the raw message) is saved to memory; the knowledge base
+        context and the language instruction are prompt variables of this
+        turn alone, so they are not replayed on later turns.
+        """
+        return {
+            "input": message,
+            "kb_context": f"{KB_CONTEXT_HEADER}\n{kb_context}\n\n" if kb_context else "",
+            "instructions": STRONG_INSTRUCTION
+        }
+    
+    @staticmethod
+    def _turn_result(result: Dict, session: AgentSession, prefetch: Prefetch, route) -> Dict[str, Any]:
+        """Record the step trace and build the response dictionary."""
+        # Extract response and intermediate steps
+        response = result.get("output", "I'm sorry, I couldn't process that request.")
+        intermediate_steps = result.get("intermediate_steps", [])
+        
+        stats = tool_call_stats(intermediate_steps)
+        loop = result.get("loop_guard", {})
+        logger.info(
+            f"📊 [{session.session_id}] {session.agent_mode} agent: {stats['tool_turns'] + 1} LLM calls, "
+            f"{stats['tool_calls']} tool calls, {stats['parse_errors']} parse errors, "
+            f"{loop.get('repeats', 0)} repeated calls"
         )
         
-        logger.info(f"Forcing language: {language_name}")
-        
-        # Augment input with knowledge base context if relevant
-        # (Check if message contains keywords that should trigger KB search)
-        kb_context = ""
-        sources = []
-        # Keywords list kept broad to catch english terms too just in case
-        keywords = ["code", "P0", "symptom", "noise", "leak", "problem", "issue", "manual", "guide", "pdf",
-                   "código", "síntoma", "ruido", "fuga", "problema", "asunto", "manual",  # Spanish
-                   "código", "sintoma", "barulho", "vazamento", "problema", "manual",  # Portuguese
-                   "code", "symptôme", "bruit", "fuite", "problème", "manuel"]  # French
-
-        if any(keyword in message.lower() for keyword in keywords):
-            logger.info("Augmenting with knowledge base context...")
-            kb_context, sources = self.consult_knowledge_base(message)
+        # Format intermediate steps for UI
+        session.last_steps = []
+        for step in intermediate_steps:
+            if isinstance(step, tuple) and len(step) == 2:
+                action, observation = step
+                if isinstance(action, AgentAction):
+                    session.last_steps.append({
+                        "tool": action.tool,
+                        "tool_input": action.tool_input,
+                        "observation": str(observation)[:200]  # Truncate for display
+                    })
         
-        if kb_context:
-            full_input = f"{message}\n\nInformación relevante de la base de conocimientos:\n{kb_context}\n\n[SISTEMA: {strong_instruction}]"
-        else:
-            full_input = f"{message}\n\n[SISTEMA: {strong_instruction}]"
+        return {
+            "response": response,
+            "steps": session.last_steps,
+            "sources": prefetch.sources,
+            "intent": route.intent,
+            "memory_tokens": session.memory.last_token_count,
+            "fast_path": False,
+            "agent_mode": session.agent_mode,
+            "llm_calls": stats["tool_turns"] + 1,
+            "tool_calls": stats["tool_calls"],
+            "parse_errors": stats["parse_errors"],
+            "repeated_calls": loop.get("repeats", 0),
+            "max_iterations_avoided": loop.get("max_iterations_avoided", 0),
+            "success": True
+        }
+    
+    def _fast_path_result(
+        self,
+        plan: FastPathPlan,
+        steps: List[Dict],
+        answer: str,
+        session: AgentSession,
+        prefetch: Prefetch,
+        route,
+        started: float
+    ) -> Dict[str, Any]:
+        """Record a fast path answer and build the response dictionary."""
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.fast_path.record(plan, steps, latency_ms)
+        session.last_steps = [
+            {"tool": s["tool"], "tool_input": s["tool_input"], "observation": s["observation"][:OBSERVATION_PREVIEW]}
+            for s in steps
+        ]
+        return {
+            "response": answer,
+            "steps": session.last_steps,
+            "sources": prefetch.sources,
+            "intent": route.intent,
+            "memory_tokens": session.memory.last_token_count,
+            "fast_path": True,
+            "llm_calls": 1,
+            "parse_errors": 0,
+            "llm_calls_saved": len(steps),  # The agent needs one call per tool plus the answer
+            "latency_ms": round(latency_ms, 1),
+            "success": True
+        }
+    
+    def _fast_path_prompt(self, inputs: Dict[str, str], late_context: str, session: AgentSession, steps: List[Dict]) -> str:
+        """
+        Answer prompt of a fast path turn, with knowledge base context that arrived after the inputs were built.
+        
+        The context is added to `inputs` itself, so the agent still gets it
+        if the fast path falls back after handing it out.
+        """
+        if late_context:
+            inputs.update(self._build_inputs(inputs["input"], late_context))
+        history = session.memory.load_memory_variables({})["chat_history"]
+        return self.fast_path.answer_prompt(inputs, history, steps, FORCED_LANGUAGE)
+    
+    def _fast_path(self, plan: FastPathPlan, inputs: Dict[str, str], session: AgentSession, prefetch: Prefetch, route) -> Optional[Dict[str, Any]]:
+        """
+        Answer a planned message with its tool chain and a single LLM call.
+        
+        Returns:
+            The response dictionary, or None to fall back to the agent
+        """
+        started = time.perf_counter()
+        steps = self.fast_path.run_chain(plan, prefetch)
+        if steps is None:
+            self.fast_path.record(plan, None, 0)
+            return None
+        
+        # Waiting for retrieval here still costs far less than the agent's extra LLM round trips
+        prompt = self._fast_path_prompt(inputs, prefetch.take_kb_context(), session, steps)
+        try:
+            answer = str(self.llm.invoke(prompt).content).strip()
+        except Exception as e:
+            logger.warning(f"Fast path answer failed, using the agent: {e}")
+            self.fast_path.record(plan, None, 0)
+            return None
+        
+        session.memory.save_context({"input": inputs["input"]}, {"output": answer})
+        return self._fast_path_result(plan, steps, answer, session, prefetch, route, started)
+    
+    async def _afast_path(self, plan: FastPathPlan, inputs: Dict[str, str], session: AgentSession, prefetch: Prefetch, route) -> Optional[Dict[str, Any]]:
+        """Async version of _fast_path()."""
+        started = time.perf_counter()
+        steps = await asyncio.to_thread(self.fast_path.run_chain, plan, prefetch)
+        if steps is None:
+            self.fast_path.record(plan, None, 0)
+            return None
+        
+        prompt = self._fast_path_prompt(inputs, await prefetch.atake_kb_context(), session, steps)
+        try:
+            answer = str((await self.llm.ainvoke(prompt)).content).strip()
+        except Exception as e:
+            logger.warning(f"Fast path answer failed, using the agent: {e}")
+            self.fast_path.record(plan, None, 0)
+            return None
+        
+        await session.memory.asave_context({"input": inputs["input"]}, {"output": answer})
+        return self._fast_path_result(plan, steps, answer, session, prefetch, route, started)
+    
+    async def _astream_fast_path(
+        self,
+        plan: FastPathPlan,
+        inputs: Dict[str, str],
+        session: AgentSession,
+        prefetch: Prefetch,
+        route
+    ) -> AsyncIterator[Dict]:
+        """
+        Streaming version of _afast_path().
+        
+        Yields nothing (so the caller falls back to the agent) unless the
+        chain ran and the answer started; otherwise ends with a "done" event.
+        """
+        started = time.perf_counter()
+        steps = await asyncio.to_thread(self.fast_path.run_chain, plan, prefetch)
+        if steps is None:
+            self.fast_path.record(plan, None, 0)
+            return
+        
+        prompt = self._fast_path_prompt(inputs, await prefetch.atake_kb_context(), session, steps)
+        stream = self.llm.astream(prompt)
+        try:
+            first = await stream.__anext__()
+        except Exception as e:
+            logger.warning(f"Fast path answer failed, using the agent: {e}")
+            self.fast_path.record(plan, None, 0)
+            return
+        
+        for step in steps:
+            yield {"type": "tool_start", "tool": step["tool"], "tool_input": step["tool_input"]}
+            yield {"type": "tool_end", "tool": step["tool"], "observation": step["observation"][:OBSERVATION_PREVIEW]}
+        
+        texts = []
+        try:
+            chunk = first
+            while True:
+                text = str(chunk.content)
+                if text:
+                    texts.append(text)
+                    yield {"type": "token", "text": text}
+                chunk = await stream.__anext__()
+        except StopAsyncIteration:
+            pass
+        except Exception as e:
+            logger.error(f"Error in streamed fast path answer: {e}")
+            yield {"type": "done", "result": {
+                "response": f"I encountered an error: {e}. Please try again.",
+                "steps": [],
+                "success": False,
+                "error": str(e)
+            }}
+            return
+        
+        answer = "".join(texts).strip()
+        await session.memory.asave_context({"input": inputs["input"]}, {"output": answer})
+        yield {"type": "done", "result": self._fast_path_result(plan, steps, answer, session, prefetch, route, started)}
+    
+    def _recover(self, error: Exception, session: AgentSession, attempt: int, max_retries: int) -> Optional[Dict[str, Any]]:
+        """
+        Handle a failed attempt.
+        
+        Returns:
+            None to retry, or the error response once retries are exhausted
+        """
+        error_msg = str(error)
+        logger.error(f"Error in agent chat (Attempt {attempt+1}/{max_retries}): {error_msg}")
+        
+        # Check for rate limit or API errors
+        # Broaden check to include generic provider errors
+        error_lower = error_msg.lower()
+        retry_keywords = ["429", "rate limit", "insufficient_quota", "provider", "error", "fail", "timeout", "connection"]
+        
+        if any(keyword in error_lower for keyword in retry_keywords):
+            logger.warning(f"API Error with model {session.model_name}: {error_msg}")
+            logger.warning("Switching model...")
+            
+            # Shared LLM is replaced; every session's executor is rebuilt on next use
+            if self._switch_model(session.model_name):
+                return None
+        
+        # If it's the last attempt or not a recoverable error
+        if attempt == max_retries - 1:
+            return {
+                "response": f"I encountered an error and ran out of retries: {error_msg}. Please try again later.",
+                "steps": [],
+                "success": False,
+                "error": error_msg
+            }
+        return None
+    
+    def _chat(self, message: str, session: AgentSession) -> Dict[str, Any]:
+        """Answer a message within a session (caller holds session.lock)."""
+        route = self._start_turn(message, session)
+        
+        # Start retrieval (if the router asks for it) and the code / known-issue
+        # pre-lookups right away, overlapping with building the prompt
+        retrieve = None
+        if route.needs_retrieval:
+            retrieve = functools.partial(self.consult_knowledge_base, message, route.doc_types)
+        
+        prefetch = Prefetch.start(message, retrieve)
+        inputs = self._build_inputs(message, "")
+        
+        # Code + vehicle messages: tool chain and one LLM call instead of the ReAct loop
+        # (the chain runs first, so retrieval finishes meanwhile instead of being waited for)
+        plan = self.fast_path.plan(message, route)
+        if plan is not None:
+            result = self._fast_path(plan, inputs, session, prefetch, route)
+            if result is not None:
+                return result
+        
+        # The agent's first LLM call waits (within the budget) for the context to go into
+        # the prompt; if retrieval overruns it, it is attached to the first tool observation.
+        # Routes without retrieval have no context to wait for.
+        if not inputs["kb_context"]:
+            inputs = self._build_inputs(message, prefetch.take_kb_context(timeout=KB_PREFETCH_WAIT_MS / 1000))
         
         # Retry loop for model failover
-        max_retries = 3
-        for attempt in range(max_retries):
+        for attempt in range(MAX_CHAT_RETRIES):
             try:
-                # Run agent
-                result = self.agent_executor.invoke({"input": full_input})
-                
-                # Extract response and intermediate steps
-                response = result.get("output", "I'm sorry, I couldn't process that request.")
-                intermediate_steps = result.get("intermediate_steps", [])
-                
-                # Format intermediate steps for UI
-                self.last_steps = []
-                for step in intermediate_steps:
-                    if isinstance(step, tuple) and len(step) == 2:
-                        action, observation = step
-                        if isinstance(action, AgentAction):
-                            self.last_steps.append({
-                                "tool": action.tool,
-                                "tool_input": action.tool_input,
-                                "observation": str(observation)[:200]  # Truncate for display
-                            })
-                
-                return {
-                    "response": response,
-                    "steps": self.last_steps,
-                    "sources": sources,
-                    "success": True
-                }
+                # Run agent (its tools read the prefetched lookups)
+                executor = self._executor_for(session)
+                token = prefetch.activate()
+                try:
+                    result = executor.invoke(inputs)
+                finally:
+                    Prefetch.deactivate(token)
+                return self._turn_result(result, session, prefetch, route)
+            except Exception as e:
+                error_response = self._recover(e, session, attempt, MAX_CHAT_RETRIES)
+                if error_response is not None:
+                    return error_response
+        
+        # Fallback if loop finishes without return
+        return dict(MAX_RETRIES_RESPONSE)
+    
+    async def achat(self, message: str, session: Optional[AgentSession] = None) -> Dict[str, Any]:
+        """
+        Async version of chat().
+        
+        The ReAct loop runs with ainvoke, async tools and async retrieval, so
+        a conversation waiting on the LLM holds no thread and one event loop
+        can serve many sessions concurrently.
+        
+        Args:
+            message: Message from the mechanic
+            session: Conversation to answer in (defaults to the default session)
             
+        Returns:
+            Dictionary with response and metadata
+        """
+        session = session or self.default_session
+        async with session.alocked():
+            session.last_used = time.monotonic()
+            return await self._achat(message, session)
+    
+    async def _achat(self, message: str, session: AgentSession) -> Dict[str, Any]:
+        """Async version of _chat() (caller holds session.lock)."""
+        route = self._start_turn(message, session)
+        
+        aretrieve = None
+        if route.needs_retrieval:
+            aretrieve = functools.partial(self.aconsult_knowledge_base, message, route.doc_types)
+        
+        prefetch = await Prefetch.astart(message, aretrieve)
+        inputs = self._build_inputs(message, "")
+        
+        plan = self.fast_path.plan(message, route)
+        if plan is not None:
+            result = await self._afast_path(plan, inputs, session, prefetch, route)
+            if result is not None:
+                return result
+        
+        if not inputs["kb_context"]:
+            inputs = self._build_inputs(message, await prefetch.atake_kb_context(timeout=KB_PREFETCH_WAIT_MS / 1000))
+        
+        for attempt in range(MAX_CHAT_RETRIES):
+            try:
+                executor = self._executor_for(session)
+                # Tasks copy the current context, so the async tools see this turn's prefetch
+                token = prefetch.activate()
+                try:
+                    result = await executor.ainvoke(inputs)
+                finally:
+                    Prefetch.deactivate(token)
+                return self._turn_result(result, session, prefetch, route)
             except Exception as e:
-                error_msg = str(e)
-                logger.error(f"Error in agent chat (Attempt {attempt+1}/{max_retries}): {error_msg}")
-                
-                # Check for rate limit or API errors
-                # Broaden check to include generic provider errors
-                error_lower = error_msg.lower()
-                retry_keywords = ["429", "rate limit", "insufficient_quota", "provider", "error", "fail", "timeout", "connection"]
-                
-                if any(keyword in error_lower for keyword in retry_keywords):
-                    logger.warning(f"API Error with model {self.current_model_name}: {error_msg}")
-                    logger.warning("Switching model...")
-                    self.model_manager.mark_current_failed()
-                    
-                    new_model = self.model_manager.get_current_model_id()
-                    if new_model and new_model != self.current_model_name:
-                        self.current_model_name = new_model
-                        logger.info(f"Switching to new model: {self.current_model_name}")
-                        
-                        # Recreate LLM and Agent
-                        self.llm = self._create_llm()
-                        self.agent_executor = self._create_agent(verbose=True)
-                        continue
+                error_response = self._recover(e, session, attempt, MAX_CHAT_RETRIES)
+                if error_response is not None:
+                    return error_response
+        
+        return dict(MAX_RETRIES_RESPONSE)
+    
+    async def astream_chat(self, message: str, session: Optional[AgentSession] = None) -> AsyncIterator[Dict]:
+        """
+        Streaming version of achat().
+        
+        Yields UI events as they happen (see src.agent.streaming): the route,
+        tool starts and ends, final answer tokens, and a last "done" event
+        whose "result" is the dictionary achat() would return.
+        
+        Args:
+            message: Message from the mechanic
+            session: Conversation to answer in (defaults to the default session)
+            
+        Yields:
+            Event dictionaries
+        """
+        session = session or self.default_session
+        async with session.alocked():
+            session.last_used = time.monotonic()
+            route = self._start_turn(message, session)
+            
+            aretrieve = None
+            if route.needs_retrieval:
+                aretrieve = functools.partial(self.aconsult_knowledge_base, message, route.doc_types)
+            
+            prefetch = await Prefetch.astart(message, aretrieve)
+            inputs = self._build_inputs(message, "")
+            yield {"type": "route", "intent": route.intent}
+            
+            plan = self.fast_path.plan(message, route)
+            if plan is not None:
+                answered = False
+                async for item in self._astream_fast_path(plan, inputs, session, prefetch, route):
+                    answered = True
+                    yield item
+                if answered:
+                    return
+            
+            if not inputs["kb_context"]:
+                inputs = self._build_inputs(message, await prefetch.atake_kb_context(timeout=KB_PREFETCH_WAIT_MS / 1000))
+            
+            for attempt in range(MAX_CHAT_RETRIES):
+                queue: asyncio.Queue = asyncio.Queue()
+                executor = self._executor_for(session)
+                # Function-calling replies have no "Final Answer:" marker, all their text is the answer
+                marker = None if session.agent_mode == "tools" else FINAL_ANSWER_MARKER
+                task = asyncio.create_task(self._stream_turn(executor, inputs, prefetch, queue, marker))
+                streamed = False
+                try:
+                    while (item := await queue.get()) is not None:
+                        streamed = True
+                        yield item
+                    result = await task
+                except Exception as e:
+                    if streamed:
+                        # Part of the answer is already on screen, a retry would repeat it
+                        logger.error(f"Error in streamed agent chat: {e}")
+                        yield {"type": "done", "result": {
+                            "response": f"I encountered an error: {e}. Please try again.",
+                            "steps": [],
+                            "success": False,
+                            "error": str(e)
+                        }}
+                        return
+                    error_response = self._recover(e, session, attempt, MAX_CHAT_RETRIES)
+                    if error_response is not None:
+                        yield {"type": "done", "result": error_response}
+                        return
+                    continue
+                finally:
+                    # The consumer stopped listening (e.g. the browser disconnected)
+                    if not task.done():
+                        task.cancel()
                 
-                # If it's the last attempt or not a recoverable error
-                if attempt == max_retries - 1:
-                    return {
-                        "response": f"I encountered an error and ran out of retries: {str(e)}. Please try again later.",
-                        "steps": [],
-                        "success": False,
-                        "error": str(e)
-                    }
+                yield {"type": "done", "result": self._turn_result(result, session, prefetch, route)}
+                return
+            
+            yield {"type": "done", "result": dict(MAX_RETRIES_RESPONSE)}
+    
+    @staticmethod
+    async def _stream_turn(
+        executor: AgentExecutor,
+        inputs: Dict[str, str],
+        prefetch: Prefetch,
+        queue: asyncio.Queue,
+        marker: Optional[str] = FINAL_ANSWER_MARKER
+    ) -> Dict:
+        """
+        Run the executor with astream_events, queueing UI events; returns the executor output.
         
-        # Fallback if loop finishes without return
-        return {
-            "response": "I encountered an error and could not process your request after multiple attempts.",
-            "steps": [],
-            "success": False,
-            "error": "Max retries exceeded"
-        }
+        astream_events drives the executor's step iterator rather than _acall;
+        GuardedAgentExecutor guards that path as well, so the output (steps,
+        loop guard stats, forced answer) matches what ainvoke returns.
+        """
+        # This task runs in its own copy of the context, so activating is scoped to it
+        prefetch.activate()
+        answer_filter = FinalAnswerFilter(marker)
+        output: Dict = {}
+        try:
+            async for event in executor.astream_events(inputs, version="v2"):
+                for item in agent_events(event, answer_filter):
+                    queue.put_nowait(item)
+                output = root_output(event) or output
+        finally:
+            queue.put_nowait(None)
+        return output
     
-    def reset_conversation(self):
-        """Reset the conversation memory."""
-        self.memory.clear()
-        self.last_steps = []
-        logger.info("Conversation reset")
+    def reset_conversation(self, session: Optional[AgentSession] = None):
+        """Reset the conversation memory (of the default session if none is given)."""
+        session = session or self.default_session
+        with session.lock:
+            session.memory.clear()
+            session.last_steps = []
+        logger.info(f"[{session.session_id}] Conversation reset")
     
     def get_greeting(self) -> str:
         """Get the initial greeting message."""
         return GREETING
     
-    def get_last_steps(self) -> List[Dict]:
-        """Get the last agent reasoning steps."""
-        return self.last_steps
+    def get_last_steps(self, session: Optional[AgentSession] = None) -> List[Dict]:
+        """Get the last agent reasoning steps (of the default session if none is given)."""
+        return (session or self.default_session).last_steps
 
 
 def create_agent(model_name: str = None, verbose: bool = True) -> MechanicAgent:
@@ -0,0 +1,231 @@
+"""
+Conversation memory with a token budget and a rolling summary.
+
+ConversationBufferMemory re-sends every turn, so prompts grow linearly with
+the conversation. BudgetedSummaryMemory keeps the most recent turns
+verbatim and, once they exceed MEMORY_TOKEN_BUDGET, folds the oldest ones
+into a summary that is updated incrementally (by the LLM when available,
+otherwise extractively). The LLM summary runs on a background thread, so
+saving a turn never adds a round trip to the response: until it finishes,
+the folded turns stay in the history verbatim, or as an extractive summary
+when that would exceed the budget. Either summary is capped at a third of
+the budget. The agent passes knowledge base context and the system
+instruction as separate prompt variables; only the "input" variable (the
+mechanic's own message) is stored.
+"""
+
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, get_buffer_string
+from pydantic import PrivateAttr
+
+from src.agent.prompts import HUMAN_PREFIX, AI_PREFIX
+from src.utils.helpers import get_logger
+from src.utils.config import MEMORY_TOKEN_BUDGET, MEMORY_MIN_RECENT_TURNS, MEMORY_SUMMARY_MODE
+
+logger = get_logger(__name__)
+
+SUMMARY_PROMPT = """Progressively summarize this conversation between a mechanic and a diagnostic assistant.
+Keep vehicles, trouble codes, symptoms, diagnoses, parts and costs. Answer with the updated summary only.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+Updated summary:"""
+
+# Characters of each message kept by the extractive summary
+_EXTRACT_CHARS = 160
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_summary_executor() -> ThreadPoolExecutor:
+    """Shared thread pool for background LLM summaries (created on first use)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+        return _executor
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count (~4 characters per token; no tokenizer download needed)."""
+    return (len(text) + 3) // 4
+
+
+class BudgetedSummaryMemory(BaseChatMemory):
+    """Recent turns verbatim plus a rolling summary, within a token budget."""
+
+    llm: Optional[BaseLanguageModel] = None
+    max_token_limit: int = MEMORY_TOKEN_BUDGET
+    min_recent_turns: int = MEMORY_MIN_RECENT_TURNS
+    summary_mode: str = MEMORY_SUMMARY_MODE  # "llm" or "extractive"
+    memory_key: str = "chat_history"
+    human_prefix: str = HUMAN_PREFIX
+    ai_prefix: str = AI_PREFIX
+    summary: str = ""
+    summarized_turns: int = 0
+    last_token_count: int = 0
+    pending: List[BaseMessage] = []  # Folded turns the background LLM summary has not absorbed yet
+
+    _fold_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _fold_future: Optional[Future] = PrivateAttr(default=None)
+    _folding: bool = PrivateAttr(default=False)
+    _generation: int = PrivateAttr(default=0)  # Bumped by clear(), so a late summary is dropped
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    @property
+    def buffer(self) -> List[BaseMessage]:
+        return self.chat_memory.messages
+
+    def history_messages(self, messages: Optional[List[BaseMessage]] = None) -> List[BaseMessage]:
+        """Summary (as a system message), turns still being summarized, then the recent turns."""
+        with self._fold_lock:
+            pending, summary = list(self.pending), self.summary
+        recent = list(self.buffer if messages is None else messages)
+        history = self._with_summary(pending + recent, summary)
+        if pending and estimate_tokens(self._history_string(history)) > self.max_token_limit:
+            # The LLM summary is lagging behind: until it catches up, summarize the pending turns extractively
+            history = self._with_summary(recent, self._extractive_summary(pending, summary))
+        return history
+
+    def _with_summary(self, messages: List[BaseMessage], summary: Optional[str] = None) -> List[BaseMessage]:
+        summary = self.summary if summary is None else summary
+        if summary:
+            return [SystemMessage(content=f"Summary of earlier conversation: {summary}")] + messages
+        return messages
+
+    def token_count(self) -> int:
+        """Tokens the history adds to the prompt."""
+        return estimate_tokens(self._history_string(self.history_messages()))
+
+    def _history_string(self, messages: List[BaseMessage]) -> str:
+        return get_buffer_string(messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the history and record its token count."""
+        messages = self.history_messages()
+        self.last_token_count = self.token_count()
+        logger.info(
+            f"🧠 Memory: {self.last_token_count} tokens "
+            f"({len(self.buffer) // 2} recent turns, {self.summarized_turns} summarized)"
+        )
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {self.memory_key: self._history_string(messages)}
+
+    def _turn(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> List[BaseMessage]:
+        input_str, output_str = self._get_input_output(inputs, outputs)
+        return [HumanMessage(content=input_str), AIMessage(content=output_str)]
+
+    def _overflow(self) -> List[BaseMessage]:
+        """Remove and return the oldest turns beyond the budget (keeping min_recent_turns)."""
+        messages = self.buffer
+        keep = 2 * self.min_recent_turns
+        cut = 0
+        while (
+            len(messages) - cut > keep
+            and estimate_tokens(self._history_string(self._with_summary(messages[cut:]))) > self.max_token_limit
+        ):
+            cut += 2
+        if not cut:
+            return []
+        folded = messages[:cut]
+        self.chat_memory.clear()
+        self.chat_memory.add_messages(messages[cut:])
+        self.summarized_turns += cut // 2
+        return folded
+
+    def _extractive_summary(self, folded: List[BaseMessage], summary: Optional[str] = None) -> str:
+        """Append the start of each folded message to the summary (capped, see _capped())."""
+        summary = self.summary if summary is None else summary
+        lines = [line for line in summary.split("\n") if line]
+        for message in folded:
+            prefix = self.human_prefix if isinstance(message, HumanMessage) else self.ai_prefix
+            text = re.sub(r"\s+", " ", str(message.content)).strip()
+            lines.append(f"- {prefix}: {text[:_EXTRACT_CHARS]}")
+        return self._capped("\n".join(lines))
+
+    def _capped(self, summary: str) -> str:
+        """Drop the oldest lines of a summary past a third of the budget (and cut a last line still over it)."""
+        limit = self.max_token_limit // 3
+        lines = [line for line in summary.split("\n") if line]
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > limit:
+            lines.pop(0)
+        summary = "\n".join(lines)
+        return summary if estimate_tokens(summary) <= limit else summary[:4 * limit].rstrip()
+
+    def _summary_prompt(self, folded: List[BaseMessage], summary: str) -> str:
+        return SUMMARY_PROMPT.format(summary=summary or "(none)", new_lines=self._history_string(folded))
+
+    @staticmethod
+    def _text(response) -> str:
+        return str(getattr(response, "content", response)).strip()
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        """Store the turn and fold the oldest turns into the summary if over budget."""
+        self.chat_memory.add_messages(self._turn(inputs, outputs))
+        self._fold(self._overflow())
+
+    async def asave_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        """Async version of save_context() (the LLM summary never runs on the event loop)."""
+        self.save_context(inputs, outputs)
+
+    def _fold(self, folded: List[BaseMessage]):
+        """Summarize folded turns: extractively right away, or by the LLM in the background."""
+        if not folded:
+            return
+        if self.llm is None or self.summary_mode != "llm":
+            self.summary = self._extractive_summary(folded)
+            return
+        with self._fold_lock:
+            self.pending.extend(folded)
+            if not self._folding:
+                self._folding = True
+                self._fold_future = get_summary_executor().submit(self._summarize_pending)
+
+    def _summarize_pending(self):
+        """Fold the pending turns into the summary with the LLM until none are left."""
+        while True:
+            with self._fold_lock:
+                if not self.pending:
+                    self._folding = False
+                    return
+                batch, summary, generation = list(self.pending), self.summary, self._generation
+            try:
+                summary = self._capped(self._text(self.llm.invoke(self._summary_prompt(batch, summary))))
+            except Exception as e:
+                logger.warning(f"LLM summary failed, summarizing extractively: {e}")
+                summary = self._extractive_summary(batch, summary)
+            with self._fold_lock:
+                if generation == self._generation:  # Otherwise the memory was cleared meanwhile
+                    self.summary = summary
+                    del self.pending[:len(batch)]
+
+    def wait_for_summary(self, timeout: Optional[float] = None) -> None:
+        """Block until the background summary (if any) has absorbed the pending turns."""
+        future = self._fold_future
+        if future is not None:
+            future.result(timeout=timeout)
+
+    def clear(self) -> None:
+        """Clear the turns and the summary."""
+        super().clear()
+        with self._fold_lock:
+            self._generation += 1
+            self.pending = []
+        self.summary = ""
+        self.summarized_turns = 0
+        self.last_token_count = 0
@@ -0,0 +1,158 @@
+"""
+Local repair of slightly malformed ReAct output.
+
+Free models often get the Thought/Action protocol almost right: keywords
+translated to Spanish or wrapped in Markdown, quoted or misspelled tool
+names, the input written inline ("search_diagnostic_code(P0420)") instead
+of on an "Action Input:" line, or text after the final answer. Sending
+those back to the model with an error costs a full LLM round trip. TolerantOutputParser normalizes them
+first and only escalates (raises) when the intended action is ambiguous.
+"""
+
+import difflib
+import re
+from typing import List, Optional, Tuple, Union
+
+from langchain.agents.mrkl.output_parser import MRKLOutputParser
+from langchain_core.agents import AgentAction, AgentFinish
+
+from src.agent.parallel_tools import MultiActionOutputParser
+from src.utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+# Minimum similarity for a misspelled tool name to be mapped to a real one
+TOOL_NAME_CUTOFF = 0.8
+
+# Line-start keyword variants (Markdown, case, ES/PT/FR translations) -> protocol keyword.
+# "Action Input" comes before "Action" so the longer keyword wins.
+_KEYWORDS = [
+    ("Action Input", r"action[ _]?input|entrada(?: de(?: la)?| da)? acci[oó]n|entrada(?: da)? a[cç][aã]o|"
+                     r"input(?: de(?: la)?)? acci[oó]n|entr[ée]e(?: de l'action)?"),
+    ("Action", r"action|acci[oó]n|a[cç][aã]o"),
+    ("Thought", r"thought|pensamiento|razonamiento|pensamento|pens[ée]e"),
+    ("Observation", r"observation|observaci[oó]n|observa[cç][aã]o"),
+    ("Final Answer", r"final[ _]?answer|respuesta final|resposta final|r[ée]ponse finale"),
+]
+_KEYWORD_PATTERNS = [
+    (keyword, re.compile(rf"^[ \t>#*_-]*(?:{variants})[ \t*_]*:[ \t*_]*", re.IGNORECASE | re.MULTILINE))
+    for keyword, variants in _KEYWORDS
+]
+_FINAL_ANSWER_PATTERN = dict(_KEYWORD_PATTERNS)["Final Answer"]
+_PROTOCOL_LINE = re.compile(r"^(?:Thought|Action Input|Action|Observation|Final Answer|Question):", re.MULTILINE)
+_INLINE_CALL = re.compile(r"^([\w .-]+?)\s*\((.*)\)\s*$", re.DOTALL)
+
+
+def match_tool_name(name: str, tool_names: List[str]) -> Optional[str]:
+    """
+    Map a tool name as written by the model to a real tool.
+
+    Args:
+        name: Name from the "Action:" line
+        tool_names: Names of the agent's tools
+
+    Returns:
+        The tool name, or None if no tool is close enough
+    """
+    cleaned = re.sub(r"[\s-]+", "_", name.strip().strip("`'\"*[]").strip().lower())
+    if cleaned in tool_names:
+        return cleaned
+    matches = difflib.get_close_matches(cleaned, tool_names, n=1, cutoff=TOOL_NAME_CUTOFF)
+    return matches[0] if matches else None
+
+
+def _normalize_keywords(text: str, fixes: List[str]) -> str:
+    for keyword, pattern in _KEYWORD_PATTERNS:
+        def canonical(match, keyword=keyword):
+            if match.group(0).rstrip() != f"{keyword}:":
+                fixes.append(f"keyword '{match.group(0).strip()}'")
+            return f"{keyword}: "
+        text = pattern.sub(canonical, text)
+    return text
+
+
+def _repair_actions(text: str, tool_names: List[str], fixes: List[str]) -> str:
+    """Fix tool names and missing Action Input lines."""
+    lines = text.split("\n")
+    repaired = []
+    for i, line in enumerate(lines):
+        if not line.startswith("Action: "):
+            repaired.append(line)
+            continue
+
+        value = line[len("Action: "):].strip()
+        inline = _INLINE_CALL.match(value.strip("`"))
+        name, inline_input = (inline.group(1), inline.group(2)) if inline else (value, None)
+
+        tool = match_tool_name(name, tool_names)
+        if tool is None:
+            repaired.append(line)  # Unknown tool: the executor tells the model
+            continue
+        if tool != name:
+            fixes.append(f"tool name '{name}' -> {tool}")
+        repaired.append(f"Action: {tool}")
+
+        following = next((l for l in lines[i + 1:] if l.strip()), None)
+        if following is not None and following.startswith("Action Input:"):
+            continue
+        if inline_input is not None:
+            fixes.append("inline tool input")
+            repaired.append(f"Action Input: {inline_input.strip()}")
+        elif following is not None and not _PROTOCOL_LINE.match(following):
+            # The next line is the input without its keyword
+            fixes.append("missing 'Action Input:'")
+            index = lines.index(following, i + 1)
+            lines[index] = f"Action Input: {following.strip()}"
+    return "\n".join(repaired)
+
+
+def repair_react_output(text: str, tool_names: List[str]) -> Tuple[str, List[str]]:
+    """
+    Normalize common deviations from the ReAct protocol.
+
+    Only the text before the final answer is rewritten, so the answer itself
+    (which may well contain "Acción:" lines) is left alone.
+
+    Args:
+        text: LLM generation
+        tool_names: Names of the agent's tools
+
+    Returns:
+        Tuple of (repaired text, descriptions of the fixes applied)
+    """
+    fixes: List[str] = []
+    final = _FINAL_ANSWER_PATTERN.search(text)
+    head, answer = (text[:final.start()], text[final.end():]) if final else (text, None)
+
+    head = _repair_actions(_normalize_keywords(head, fixes), tool_names, fixes)
+    if answer is None:
+        return head, fixes
+
+    if final.group(0).strip() != "Final Answer:":
+        fixes.append(f"keyword '{final.group(0).strip()}'")
+    if "Action:" not in head:
+        # Protocol lines the model kept writing after its answer
+        extra = _PROTOCOL_LINE.search(answer)
+        if extra:
+            fixes.append("text after the final answer")
+            answer = answer[:extra.start()].rstrip()
+    return f"{head}Final Answer: {answer.lstrip()}", fixes
+
+
+class TolerantOutputParser(MultiActionOutputParser):
+    """ReAct output parser that repairs common deviations locally before escalating to the LLM."""
+
+    tool_names: List[str] = []
+    multi_action: bool = True  # Accept several actions per step (parallel tool calls)
+
+    def parse(self, text: str) -> Union[AgentAction, List[AgentAction], AgentFinish]:
+        repaired, fixes = repair_react_output(text, self.tool_names)
+        # Raises (and the executor re-prompts the model) if the output is still unparseable
+        result = super().parse(repaired) if self.multi_action else MRKLOutputParser.parse(self, repaired)
+        if fixes:
+            logger.info(f"🩹 Repaired agent output locally: {'; '.join(fixes)}")
+        return result
+
+    @property
+    def _type(self) -> str:
+        return "tolerant_mrkl"
@@ -0,0 +1,169 @@
+"""
+Parallel tool calls in the ReAct loop.
+
+When the lookups a diagnosis needs do not depend on each other (code
+information, known issues, parts), the model may list several
+Action / Action Input pairs in one step. MultiActionOutputParser returns
+them together, ParallelAgentExecutor runs them concurrently on a bounded
+thread pool (the async executor already gathers them; async tools run on
+the same pool), and all observations go back to the model in the next
+prompt. Each independent lookup then costs no extra LLM turn.
+"""
+
+import contextvars
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from langchain.agents import ZeroShotAgent
+from langchain.agents.agent import AgentOutputParser
+from langchain.agents.mrkl.output_parser import MRKLOutputParser, FINAL_ANSWER_ACTION
+from langchain_core.agents import AgentAction, AgentFinish, AgentStep
+
+from src.agent.loop_guard import GuardedAgentExecutor
+from src.utils.helpers import get_logger
+from src.utils.config import TOOL_WORKERS
+
+logger = get_logger(__name__)
+
+# One "Action: ... / Action Input: ..." pair, up to the next pair or protocol line
+ACTION_BLOCK_PATTERN = re.compile(
+    r"Action\s*\d*\s*:[ \t]*(.+?)[ \t]*\n\s*Action\s*\d*\s*Input\s*\d*\s*:[ \t]*(.*?)"
+    r"(?=\n\s*(?:Action\s*\d*\s*:|Observation|Thought|Final Answer)|\Z)",
+    re.DOTALL
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Tool calls of the step being planned, collected instead of run (see ParallelAgentExecutor)
+_deferred: ContextVar[Optional[List[AgentAction]]] = ContextVar("deferred_tool_calls", default=None)
+_PENDING = object()
+
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    """Shared, bounded thread pool that runs tool calls (created on first use)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tools")
+        return _executor
+
+
+def parse_actions(text: str) -> List[Tuple[str, str]]:
+    """(tool, tool input) of every Action / Action Input pair in a ReAct generation."""
+    return [
+        (tool.strip(), tool_input.strip().strip('"'))
+        for tool, tool_input in ACTION_BLOCK_PATTERN.findall(text)
+    ]
+
+
+class MultiActionOutputParser(MRKLOutputParser):
+    """MRKL parser that returns every action of a step that requests several."""
+
+    def parse(self, text: str) -> Union[AgentAction, List[AgentAction], AgentFinish]:
+        actions = parse_actions(text)
+        if len(actions) < 2 or FINAL_ANSWER_ACTION in text:
+            return super().parse(text)
+        # The first action carries the whole generation for the scratchpad
+        return [AgentAction(tool, tool_input, text if i == 0 else "") for i, (tool, tool_input) in enumerate(actions)]
+
+    @property
+    def _type(self) -> str:
+        return "multi_action_mrkl"
+
+
+class ParallelZeroShotAgent(ZeroShotAgent):
+    """ZeroShotAgent that accepts several actions per step and labels their observations."""
+
+    @classmethod
+    def _get_default_output_parser(cls, **kwargs) -> AgentOutputParser:
+        return MultiActionOutputParser()
+
+    def _construct_scratchpad(self, intermediate_steps: List[Tuple[AgentAction, str]]) -> str:
+        thoughts = ""
+        for i, (action, observation) in enumerate(intermediate_steps):
+            thoughts += action.log
+            last_of_step = i + 1 == len(intermediate_steps) or bool(intermediate_steps[i + 1][0].log)
+            in_batch = not action.log or not last_of_step
+            label = f"[{action.tool}] " if in_batch else ""
+            thoughts += f"\n{self.observation_prefix}{label}{observation}"
+            if last_of_step:
+                thoughts += f"\n{self.llm_prefix}"
+        return thoughts
+
+
+class ParallelAgentExecutor(GuardedAgentExecutor):
+    """AgentExecutor that runs the tool calls of one step concurrently."""
+
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None) -> AgentStep:
+        deferred = _deferred.get()
+        if deferred is None:
+            return super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        deferred.append(agent_action)
+        return _PENDING
+
+    def _iter_next_step(
+        self,
+        name_to_tool_map,
+        color_mapping,
+        inputs,
+        intermediate_steps,
+        run_manager=None
+    ) -> Iterator[Union[AgentFinish, AgentAction, AgentStep]]:
+        # Plan the step with tool calls deferred, then run them together
+        token = _deferred.set([])
+        try:
+            items = list(super()._iter_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager))
+            actions = _deferred.get()
+        finally:
+            _deferred.reset(token)
+
+        steps = iter(self._run_actions(actions, name_to_tool_map, color_mapping, run_manager))
+        for item in items:
+            yield next(steps) if item is _PENDING else item
+
+    def _run_actions(self, actions: List[AgentAction], name_to_tool_map, color_mapping, run_manager) -> List[AgentStep]:
+        """Run a step's tool calls, concurrently when there are several."""
+        perform = super()._perform_agent_action
+        if len(actions) < 2:
+            return [perform(name_to_tool_map, color_mapping, action, run_manager) for action in actions]
+
+        start = time.perf_counter()
+        # Each call gets a copy of the context, so tools see the turn's prefetch
+        futures = [
+            get_tool_executor().submit(
+                contextvars.copy_context().run, perform, name_to_tool_map, color_mapping, action, run_manager
+            )
+            for action in actions
+        ]
+        steps = [future.result() for future in futures]
+        logger.info(
+            f"🔀 Ran {len(actions)} tools in parallel in {(time.perf_counter() - start) * 1000:.0f}ms: "
+            f"{', '.join(action.tool for action in actions)}"
+        )
+        return steps
+
+
+def tool_call_stats(intermediate_steps: List[Tuple[AgentAction, str]]) -> Dict[str, int]:
+    """
+    Tool calls, the LLM turns that requested them and unparseable turns.
+
+    Calls requested together share one turn: ReAct batches leave the log
+    of all but the first empty, function calls share their AI message.
+    """
+    turns = parse_errors = 0
+    previous_message = None
+    for action, _ in intermediate_steps:
+        message_log = getattr(action, "message_log", None)
+        if message_log:
+            turns += message_log[-1] is not previous_message
+            previous_message = message_log[-1]
+        elif action.log:
+            turns += 1
+            previous_message = None
+        parse_errors += action.tool == "_Exception"
+    return {"tool_calls": len(intermediate_steps), "tool_turns": turns, "parse_errors": parse_errors}
@@ -0,0 +1,254 @@
+"""
+Speculative work started as soon as a message arrives.
+
+Knowledge base retrieval and the deterministic pre-lookups (trouble codes
+and known issues for any vehicle named in the message) run on a shared
+thread pool while the prompt is assembled. The agent's first LLM call
+waits for the knowledge base context up to KB_PREFETCH_WAIT_MS (only when
+the route retrieves at all; the fast path takes the context after its tool
+chain); only if retrieval overruns that budget is its context attached to
+the first tool observation instead. Tools consult the active turn's futures, waiting only if they are
+still running.
+"""
+
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextvars import ContextVar
+from functools import wraps
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.utils.helpers import get_logger
+from src.utils.config import PREFETCH_ENABLED, PREFETCH_WORKERS
+from src.agent.parallel_tools import get_tool_executor
+from src.rag.entity_extractor import get_entity_extractor
+from src.tools_impl.diagnostic_codes import search_diagnostic_code
+from src.tools_impl.known_issues import query_known_issues
+
+logger = get_logger(__name__)
+
+KB_CONTEXT_HEADER = "Información relevante de la base de conocimientos:"
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Prefetch of the turn currently being answered (read by the tool wrappers)
+_active: ContextVar[Optional["Prefetch"]] = ContextVar("active_prefetch", default=None)
+
+
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    """Shared thread pool for speculative lookups (created on first use)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        return _executor
+
+
+def _submit(fn: Callable, *args) -> Future:
+    """Run fn on the prefetch pool, or inline (already resolved) when prefetching is disabled."""
+    if PREFETCH_ENABLED:
+        return get_prefetch_executor().submit(fn, *args)
+    future: Future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _issues_key(brand: str, model: str, year: Optional[int]) -> Tuple[str, str, Optional[int]]:
+    return brand.strip().lower(), model.strip().lower(), year
+
+
+class Prefetch:
+    """Futures for one message: knowledge base context, trouble codes and known issues."""
+
+    def __init__(
+        self,
+        kb: Optional[Future] = None,
+        codes: Optional[Dict[str, Future]] = None,
+        issues: Optional[Dict[Tuple[str, str, Optional[int]], Future]] = None
+    ):
+        """
+        Args:
+            kb: Future resolving to (context, sources), or None if no retrieval was needed
+            codes: Trouble code -> future of search_diagnostic_code()
+            issues: (brand, model, year) -> future of query_known_issues()
+        """
+        self.kb = kb
+        self.codes = codes or {}
+        self.issues = issues or {}
+        self._kb_consumed = kb is None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _start_lookups(cls, message: str, kb) -> "Prefetch":
+        """Submit the code and known-issue lookups of a message."""
+        extractor = get_entity_extractor()
+        entities = extractor.extract(message)
+        year = entities["years"][0] if len(entities["years"]) == 1 else None
+
+        prefetch = cls(
+            kb=kb,
+            codes={code: _submit(search_diagnostic_code, code) for code in entities["dtc_codes"]},
+            issues={
+                _issues_key(make, model, year): _submit(query_known_issues, make, model, year)
+                for make, model in extractor.vehicles(message)
+            }
+        )
+        logger.info(
+            f"⚡ Prefetching: kb={'yes' if kb is not None else 'no'}, "
+            f"codes={list(prefetch.codes)}, vehicles={len(prefetch.issues)}"
+        )
+        return prefetch
+
+    @classmethod
+    def start(cls, message: str, retrieve: Optional[Callable[[], Tuple[str, List[Dict]]]] = None) -> "Prefetch":
+        """
+        Start the lookups for a message.
+
+        Args:
+            message: User message
+            retrieve: Knowledge base retrieval to run, or None if the message needs none
+
+        Returns:
+            Prefetch holding the running futures
+        """
+        return cls._start_lookups(message, _submit(retrieve) if retrieve else None)
+
+    @classmethod
+    async def astart(
+        cls,
+        message: str,
+        aretrieve: Optional[Callable[[], Awaitable[Tuple[str, List[Dict]]]]] = None
+    ) -> "Prefetch":
+        """
+        Async version of start(): retrieval runs as a task on the running event loop.
+
+        Args:
+            message: User message
+            aretrieve: Async knowledge base retrieval to run, or None if the message needs none
+
+        Returns:
+            Prefetch holding the running task and futures
+        """
+        kb = asyncio.ensure_future(aretrieve()) if aretrieve else None
+        if kb is not None and not PREFETCH_ENABLED:
+            await asyncio.wait({kb})
+        return cls._start_lookups(message, kb)
+
+    def activate(self):
+        """Make this the prefetch the tools consult; returns a token for deactivate()."""
+        return _active.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _active.reset(token)
+
+    def take_kb_context(self, timeout: Optional[float] = None) -> str:
+        """
+        Hand out the knowledge base context once.
+
+        Args:
+            timeout: Seconds to wait for retrieval (None waits until it finishes)
+
+        Returns:
+            The context, or "" if it was already taken, is not ready in time or failed
+        """
+        with self._lock:
+            if self._kb_consumed:
+                return ""
+            try:
+                self.kb.result(timeout=timeout)
+            except FutureTimeoutError:
+                return ""
+            except Exception:
+                pass
+            return self._consume()
+
+    async def atake_kb_context(self, timeout: Optional[float] = None) -> str:
+        """Async version of take_kb_context() (for an asyncio task or a thread pool future)."""
+        if self._kb_consumed:
+            return ""
+        done, _ = await asyncio.wait({asyncio.wrap_future(self.kb)}, timeout=timeout)
+        if not done:
+            return ""
+        with self._lock:
+            return "" if self._kb_consumed else self._consume()
+
+    def _consume(self) -> str:
+        """Mark the finished retrieval as handed out and return its context (caller holds _lock)."""
+        self._kb_consumed = True
+        try:
+            context, _ = self.kb.result()
+        except Exception as e:
+            logger.warning(f"Knowledge base prefetch failed: {e}")
+            return ""
+        return context
+
+    @property
+    def sources(self) -> List[Dict]:
+        """Sources of the knowledge base retrieval once it has finished (empty if none ran or it failed)."""
+        if self.kb is None or not self.kb.done():
+            return []
+        try:
+            return self.kb.result()[1]
+        except Exception:
+            return []
+
+    def code_result(self, code: str) -> Optional[Dict]:
+        """Prefetched search_diagnostic_code() result, or None if the code was not prefetched."""
+        future = self.codes.get(code.strip().strip("'\"").upper())
+        return future.result() if future else None
+
+    def issues_result(self, brand: str, model: str, year: Optional[int]) -> Optional[Dict]:
+        """Prefetched query_known_issues() result, or None if that vehicle was not prefetched."""
+        future = self.issues.get(_issues_key(brand, model, year))
+        return future.result() if future else None
+
+
+def active_prefetch() -> Optional[Prefetch]:
+    """Prefetch of the turn being answered in this context, if any."""
+    return _active.get()
+
+
+def with_deferred_context(func: Callable[..., str]) -> Callable[..., str]:
+    """
+    Wrap a tool function so its first observation in a turn carries the
+    knowledge base context that was not ready when the prompt was built.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs) -> str:
+        observation = func(*args, **kwargs)
+        prefetch = active_prefetch()
+        if prefetch is not None:
+            context = prefetch.take_kb_context()
+            if context:
+                observation = f"{observation}\n\n{KB_CONTEXT_HEADER}\n{context}"
+        return observation
+    return wrapper
+
+
+def async_tool(func: Callable[..., str]) -> Callable[..., Awaitable[str]]:
+    """
+    Async version of a tool function for ainvoke: the (short, blocking) tool
+    runs on the bounded tool pool, then deferred knowledge base context is
+    attached like with_deferred_context() does.
+    """
+    @wraps(func)
+    async def wrapper(*args, **kwargs) -> str:
+        # Run in a copy of the context, so the tool sees this turn's prefetch
+        context = contextvars.copy_context()
+        observation = await asyncio.get_running_loop().run_in_executor(
+            get_tool_executor(), functools.partial(context.run, func, *args, **kwargs)
+        )
+        prefetch = active_prefetch()
+        if prefetch is not None:
+            context = await prefetch.atake_kb_context()
+            if context:
+                observation = f"{observation}\n\n{KB_CONTEXT_HEADER}\n{context}"
+        return observation
+    return wrapper
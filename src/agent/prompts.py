@@ -60,6 +60,92 @@ Remember: You're assisting experienced mechanics, so be technical but clear.
 HUMAN_PREFIX = "Mechanic"
 AI_PREFIX = "Assistant"
 
+# ReAct prompt suffix: conversation memory (summary + recent turns) before the new question.
+# {kb_context} and {instructions} are filled per turn and never stored in memory,
+# which only keeps {input} (the mechanic's own message) and the final answer.
+AGENT_SUFFIX = """Begin!
+
+Previous conversation:
+{chat_history}
+
+{kb_context}Question: {input}
+
+[SISTEMA: {instructions}]
+Thought:{agent_scratchpad}"""
+
+# Variables of AGENT_SUFFIX supplied by the caller on every turn
+TURN_INPUT_VARIABLES = ["input", "kb_context", "instructions"]
+
+# Native function-calling agent: tools are called through the API, so there is no
+# text protocol; {language_instruction} is bound by the agent
+TOOL_AGENT_SYSTEM = SYSTEM_PROMPT + """
+Previous conversation:
+{chat_history}"""
+TOOL_AGENT_HUMAN = """{kb_context}{input}
+
+[SISTEMA: {language_instruction}]"""
+
+# ReAct format that also allows several independent tool calls in one step
+PARALLEL_FORMAT_INSTRUCTIONS = """Use the following format:
+
+Question: the input question you must answer
+Thought: you should always think about what to do
+Action: the action to take, should be one of [{tool_names}]
+Action Input: the input to the action
+Observation: the result of the action
+... (this Thought/Action/Action Input/Observation can repeat N times)
+Thought: I now know the final answer
+Final Answer: the final answer to the original input question
+
+When several lookups do not depend on each other (e.g. the code, the vehicle's known issues
+and its parts), request them in the same step by writing one Action/Action Input pair after
+another. They run in parallel and their observations come back together, each labeled
+with its tool name."""
+
+# Appended to the cached observation when the agent repeats a tool call
+LOOP_HINT = """
+
+[SYSTEM: You already called {tool} with this input; the result above is unchanged.
+Do not repeat it. Call a different tool or input, or write your Final Answer.]"""
+
+# Final LLM call of a function-calling run the loop guard stopped (that agent has no
+# "generate" stop of its own, so the answer is written from the gathered observations)
+LOOP_FINAL_PROMPT = """{system_prompt}
+
+Previous conversation:
+{chat_history}
+
+{kb_context}Question: {input}
+
+The diagnostic tools already returned:
+
+{observations}
+
+[SYSTEM: {instruction}]
+Do not call any more tools. Using these results, answer the mechanic.
+Write only the answer.
+
+Answer:"""
+
+# Single LLM call of the code + vehicle fast path: the tool chain has already run
+FAST_PATH_PROMPT = """{system_prompt}
+
+Previous conversation:
+{chat_history}
+
+{kb_context}Question: {input}
+
+The diagnostic tools were already run for this question:
+
+{observations}
+
+[SYSTEM: Respond in {language}.]
+Using these results, answer the mechanic: what the code means, its likely causes,
+known issues of this vehicle, the recommended part and the estimated cost.
+Write only the answer (no Thought, Action or Final Answer lines).
+
+Answer:"""
+
 # Follow-up question templates (for when more info is needed)
 CLARIFYING_QUESTIONS = {
     "engine_noise": [
@@ -0,0 +1,167 @@
+"""
+Per-session conversations on top of one shared MechanicAgent.
+
+The web UI serves many users at once. The agent's heavy, immutable parts
+(LLM client, knowledge base, tools, intent router) are created once and
+shared; each session only gets its own memory, step trace and executor.
+Sessions idle for longer than SESSION_IDLE_TIMEOUT are evicted, and when
+SESSION_MAX_SESSIONS is reached the least recently used one makes room.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from src.agent.mechanic_agent import MechanicAgent, AgentSession, create_agent
+from src.utils.helpers import get_logger
+from src.utils.config import SESSION_MAX_SESSIONS, SESSION_IDLE_TIMEOUT
+
+logger = get_logger(__name__)
+
+
+class SessionManager:
+    """Map session ids to AgentSessions of a lazily created shared agent."""
+
+    def __init__(
+        self,
+        agent_factory: Callable[[], MechanicAgent] = lambda: create_agent(verbose=False),
+        max_sessions: int = SESSION_MAX_SESSIONS,
+        idle_timeout: float = SESSION_IDLE_TIMEOUT
+    ):
+        """
+        Initialize the session manager.
+
+        Args:
+            agent_factory: Creates the shared agent (called on first use)
+            max_sessions: Maximum number of live sessions
+            idle_timeout: Seconds without a message before a session is evicted
+        """
+        self._agent_factory = agent_factory
+        self._agent: Optional[MechanicAgent] = None
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions: "OrderedDict[str, AgentSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._agent_lock = threading.Lock()
+
+    @property
+    def agent(self) -> Optional[MechanicAgent]:
+        """The shared agent, or None if no session has used it yet."""
+        return self._agent
+
+    def get_agent(self) -> MechanicAgent:
+        """Get the shared agent, creating it on first use."""
+        with self._agent_lock:
+            if self._agent is None:
+                logger.info("Initializing shared agent...")
+                self._agent = self._agent_factory()
+                logger.info("✅ Agent ready!")
+            return self._agent
+
+    def _evict_idle(self, now: float):
+        """Drop sessions idle for longer than idle_timeout (caller holds _lock)."""
+        for session_id in [
+            sid for sid, session in self._sessions.items()
+            if now - session.last_used > self.idle_timeout
+        ]:
+            del self._sessions[session_id]
+            logger.info(f"🧹 Session {session_id} evicted (idle)")
+
+    def get_session(self, session_id: str) -> AgentSession:
+        """
+        Get a session, creating it if needed.
+
+        Args:
+            session_id: Session identifier (e.g. the Gradio session hash)
+
+        Returns:
+            The session's AgentSession
+        """
+        agent = self.get_agent()
+        with self._lock:
+            now = time.monotonic()
+            self._evict_idle(now)
+
+            session = self._sessions.get(session_id)
+            if session is None:
+                while len(self._sessions) >= self.max_sessions:
+                    evicted, _ = self._sessions.popitem(last=False)
+                    logger.info(f"🧹 Session {evicted} evicted (session cap {self.max_sessions} reached)")
+                session = agent.new_session(session_id)
+                self._sessions[session_id] = session
+                logger.info(f"Session {session_id} created ({len(self._sessions)} live)")
+
+            self._sessions.move_to_end(session_id)
+            session.last_used = now
+            return session
+
+    def chat(self, session_id: str, message: str) -> Dict[str, Any]:
+        """
+        Answer a message in a session.
+
+        Args:
+            session_id: Session identifier
+            message: Message from the mechanic
+
+        Returns:
+            The agent's response dictionary
+        """
+        session = self.get_session(session_id)
+        return self.get_agent().chat(message, session=session)
+
+    async def achat(self, session_id: str, message: str) -> Dict[str, Any]:
+        """
+        Async version of chat(): conversations waiting on the LLM hold no thread.
+
+        Args:
+            session_id: Session identifier
+            message: Message from the mechanic
+
+        Returns:
+            The agent's response dictionary
+        """
+        # The first call creates the shared agent, keep that off the event loop
+        session = await asyncio.to_thread(self.get_session, session_id)
+        return await self.get_agent().achat(message, session=session)
+
+    async def astream_chat(self, session_id: str, message: str) -> AsyncIterator[Dict]:
+        """
+        Streaming version of achat() (see MechanicAgent.astream_chat).
+
+        Args:
+            session_id: Session identifier
+            message: Message from the mechanic
+
+        Yields:
+            Event dictionaries, ending with a "done" event
+        """
+        session = await asyncio.to_thread(self.get_session, session_id)
+        async for event in self.get_agent().astream_chat(message, session=session):
+            yield event
+
+    def reset(self, session_id: str):
+        """Clear a session's conversation, if it exists."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is not None and self._agent is not None:
+            self._agent.reset_conversation(session)
+
+    def close(self, session_id: str):
+        """Drop a session (e.g. when the browser tab is closed)."""
+        with self._lock:
+            if self._sessions.pop(session_id, None) is not None:
+                logger.info(f"Session {session_id} closed")
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict:
+        """Live session count and limits."""
+        with self._lock:
+            return {
+                "live_sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "idle_timeout": self.idle_timeout
+            }
@@ -0,0 +1,126 @@
+"""
+Streaming of agent progress to the UI.
+
+LangChain's astream_events reports every LLM token and tool call of the
+ReAct loop. They are translated into a small set of UI events:
+
+- {"type": "route", "intent": ...}                     message routed, turn started
+- {"type": "tool_start", "tool": ..., "tool_input": ...}
+- {"type": "tool_end", "tool": ..., "observation": ...}
+- {"type": "token", "text": ...}                        final answer text as it is generated
+- {"type": "done", "result": {...}}                     same dictionary chat() returns
+
+With the ReAct agent only text after "Final Answer:" is streamed as tokens;
+the Thought/Action lines of the protocol stay internal. Function-calling
+agents put tool calls outside the text, so all their text is the answer.
+"""
+
+from typing import Dict, List, Optional
+
+from src.agent.parallel_tools import parse_actions
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+# Characters of observation shown in tool_end events (as in the step trace)
+OBSERVATION_PREVIEW = 200
+
+
+class FinalAnswerFilter:
+    """Pass through the text of one LLM generation that follows "Final Answer:"."""
+
+    def __init__(self, marker: Optional[str] = FINAL_ANSWER_MARKER):
+        """
+        Args:
+            marker: Text that starts the answer (None: the whole generation is the answer)
+        """
+        self.marker = marker
+        self.reset()
+
+    def reset(self):
+        """Start a new generation."""
+        self._buffer = ""
+        self._answering = self.marker is None
+        self._started = False
+        self._reported: Dict[str, int] = {}
+
+    def action_input(self, tool: str) -> Optional[str]:
+        """Action Input the current generation gave a tool (the next unreported one if it called it several times)."""
+        inputs = [tool_input for name, tool_input in parse_actions(self._buffer) if name == tool]
+        index = self._reported.get(tool, 0)
+        self._reported[tool] = index + 1
+        return inputs[index] if index < len(inputs) else None
+
+    def feed(self, text: str) -> str:
+        """
+        Add a streamed chunk.
+
+        Args:
+            text: Chunk text
+
+        Returns:
+            Final answer text contained in the chunk ("" before the marker)
+        """
+        if not self._answering:
+            self._buffer += text
+            index = self._buffer.find(self.marker)
+            if index < 0:
+                return ""
+            self._answering = True
+            text = self._buffer[index + len(self.marker):]
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+
+def _chunk_text(chunk) -> str:
+    """Text of a chat message chunk or an LLM generation chunk."""
+    content = getattr(chunk, "content", None)
+    if content is None:
+        content = getattr(chunk, "text", "")
+    return content if isinstance(content, str) else ""
+
+
+def agent_events(event: Dict, answer_filter: FinalAnswerFilter) -> List[Dict]:
+    """
+    Translate one astream_events (v2) event into UI events.
+
+    Args:
+        event: LangChain streaming event
+        answer_filter: Filter tracking the current LLM generation
+
+    Returns:
+        UI events (usually zero or one)
+    """
+    kind = event["event"]
+    data = event.get("data", {})
+
+    if kind in ("on_chat_model_start", "on_llm_start"):
+        answer_filter.reset()
+    elif kind in ("on_chat_model_stream", "on_llm_stream"):
+        text = answer_filter.feed(_chunk_text(data.get("chunk")))
+        if text:
+            return [{"type": "token", "text": text}]
+    elif kind == "on_tool_start":
+        tool_input = data.get("input")
+        if isinstance(tool_input, dict) and len(tool_input) == 1:
+            tool_input = next(iter(tool_input.values()))
+        if not tool_input:
+            # String tools report no input here; take it from the ReAct text
+            tool_input = answer_filter.action_input(event["name"]) or ""
+        return [{"type": "tool_start", "tool": event["name"], "tool_input": tool_input}]
+    elif kind == "on_tool_end":
+        return [{
+            "type": "tool_end",
+            "tool": event["name"],
+            "observation": str(data.get("output"))[:OBSERVATION_PREVIEW]
+        }]
+    return []
+
+
+def root_output(event: Dict) -> Optional[Dict]:
+    """Output of the top-level run if this event is its end, else None."""
+    if event["event"] == "on_chain_end" and not event.get("parent_ids"):
+        output = event.get("data", {}).get("output")
+        return output if isinstance(output, dict) else None
+    return None
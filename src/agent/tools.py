@@ -3,8 +3,9 @@ LangChain tools integration - wraps the 5 diagnostic tools for agent use.
 """
 
 import json
-from langchain.tools import Tool
-from typing import List
+from langchain.tools import Tool, StructuredTool
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 
 from src.tools_impl.diagnostic_codes import search_diagnostic_code
 from src.tools_impl.cost_calculator import calculate_repair_cost
@@ -12,6 +13,7 @@ from src.tools_impl.parts_finder import find_replacement_parts
 from src.tools_impl.known_issues import query_known_issues
 from src.tools_impl.estimate_generator import generate_estimate
 from src.utils.helpers import get_logger
+from src.agent.prefetch import active_prefetch, with_deferred_context, async_tool
 
 logger = get_logger(__name__)
 
@@ -19,11 +21,23 @@ logger = get_logger(__name__)
 # Wrapper functions that return strings (required by LangChain Tool)
 
 def search_code_wrapper(code: str) -> str:
-    """Wrapper for diagnostic code search."""
-    result = search_diagnostic_code(code)
+    """Wrapper for diagnostic code search (uses the lookup prefetched for this message, if any)."""
+    prefetch = active_prefetch()
+    result = prefetch.code_result(code) if prefetch else None
+    if result is None:
+        result = search_diagnostic_code(code)
     return json.dumps(result, indent=2)
 
 
+def _known_issues(brand: str, model: str, year: Optional[int]) -> Dict:
+    """Known issues lookup (uses the lookup prefetched for this message, if any)."""
+    prefetch = active_prefetch()
+    result = prefetch.issues_result(brand, model, year) if prefetch else None
+    if result is None:
+        result = query_known_issues(brand, model, year)
+    return result
+
+
 def calculate_cost_wrapper(input_str: str) -> str:
     """
     Wrapper for cost calculator.
@@ -144,8 +158,7 @@ def query_issues_wrapper(vehicle_info: str) -> str:
                 "input_received": vehicle_info
             })
         
-        result = query_known_issues(brand, model, year)
-        return json.dumps(result, indent=2)
+        return json.dumps(_known_issues(brand, model, year), indent=2)
     except Exception as e:
         logger.error(f"Error in query_issues_wrapper: {e}")
         return json.dumps({"error": f"Error: {str(e)}"})
@@ -173,34 +186,127 @@ def generate_estimate_wrapper(input_str: str) -> str:
 diagnostic_code_tool = Tool(
     name="search_diagnostic_code",
     description="Search OBD-II diagnostic code. Input: code like P0420 or P0300. Returns: description, causes, cost, and steps.",
-    func=search_code_wrapper
+    func=with_deferred_context(search_code_wrapper),
+    coroutine=async_tool(search_code_wrapper)
 )
 
 cost_calculator_tool = Tool(
     name="calculate_repair_cost",
     description="Calculate repair cost. Input: 'parts: PART1, PART2 labor: HOURS'. Example: 'parts: CAT-001, O2-SENSOR labor: 2.5'. Returns: breakdown of parts, labor, taxes, total.",
-    func=calculate_cost_wrapper
+    func=with_deferred_context(calculate_cost_wrapper),
+    coroutine=async_tool(calculate_cost_wrapper)
 )
 
 parts_finder_tool = Tool(
     name="find_replacement_parts",
     description="Find parts for a vehicle. Input: 'PART_NAME for BRAND MODEL YEAR'. Example: 'catalytic converter for Toyota Camry 2019'. Returns: available parts with prices and warranty.",
-    func=find_parts_wrapper
+    func=with_deferred_context(find_parts_wrapper),
+    coroutine=async_tool(find_parts_wrapper)
 )
 
 known_issues_tool = Tool(
     name="query_known_issues",
     description="Check known issues for a vehicle. Input: 'BRAND MODEL YEAR'. Example: 'Toyota Camry 2019'. Returns: list of common problems, symptoms, and notes.",
-    func=query_issues_wrapper
+    func=with_deferred_context(query_issues_wrapper),
+    coroutine=async_tool(query_issues_wrapper)
 )
 
 estimate_generator_tool = Tool(
     name="generate_estimate",
     description="Generate professional repair estimate. Input: JSON with 'diagnosis', 'solution' (parts/labor/costs), optional 'vehicle_info' and 'customer_name'. Returns: formatted estimate document.",
-    func=generate_estimate_wrapper
+    func=with_deferred_context(generate_estimate_wrapper),
+    coroutine=async_tool(generate_estimate_wrapper)
 )
 
 
+# Typed tools for the native function-calling agent: the model fills a JSON
+# schema instead of a free-text input that has to be parsed
+
+class DiagnosticCodeInput(BaseModel):
+    code: str = Field(description="OBD-II trouble code, e.g. P0420")
+
+
+class VehicleInput(BaseModel):
+    brand: str = Field(description="Vehicle make, e.g. Toyota")
+    model: str = Field(description="Vehicle model, e.g. Corolla")
+    year: Optional[int] = Field(default=None, description="Model year, e.g. 2018")
+
+
+class PartsInput(VehicleInput):
+    part_name: str = Field(description="Part name or category, e.g. catalytic converter")
+
+
+class RepairCostInput(BaseModel):
+    parts: List[str] = Field(description="Part IDs from find_replacement_parts, e.g. ['CAT-001']")
+    labor_hours: float = Field(description="Estimated labor time in hours")
+
+
+class EstimateInput(BaseModel):
+    diagnosis: str = Field(description="Diagnosed problem")
+    solution: Dict = Field(description="Repair with 'parts' (list), 'labor_hours' and 'total_cost'")
+    vehicle_info: Optional[Dict] = Field(default=None, description="'brand', 'model' and 'year'")
+    customer_name: str = Field(default="Customer", description="Customer name")
+
+
+def search_code_structured(code: str) -> str:
+    return search_code_wrapper(code)
+
+
+def query_issues_structured(brand: str, model: str, year: Optional[int] = None) -> str:
+    return json.dumps(_known_issues(brand, model, year), indent=2)
+
+
+def find_parts_structured(part_name: str, brand: str, model: str, year: Optional[int] = None) -> str:
+    vehicle = {"brand": brand, "model": model}
+    if year:
+        vehicle["year"] = str(year)
+    return json.dumps(find_replacement_parts(vehicle, part_name), indent=2)
+
+
+def calculate_cost_structured(parts: List[str], labor_hours: float) -> str:
+    return json.dumps(calculate_repair_cost(parts, labor_hours), indent=2)
+
+
+def generate_estimate_structured(
+    diagnosis: str,
+    solution: Dict,
+    vehicle_info: Optional[Dict] = None,
+    customer_name: str = "Customer"
+) -> str:
+    return json.dumps(generate_estimate(diagnosis, solution, vehicle_info, customer_name), indent=2)
+
+
+def _structured_tool(func, name: str, description: str, args_schema) -> StructuredTool:
+    return StructuredTool.from_function(
+        func=with_deferred_context(func),
+        coroutine=async_tool(func),
+        name=name,
+        description=description,
+        args_schema=args_schema
+    )
+
+
+def get_structured_tools() -> List[StructuredTool]:
+    """Get the diagnostic tools with typed argument schemas (for tool-calling models)."""
+    return [
+        _structured_tool(search_code_structured, "search_diagnostic_code",
+                         "Look up an OBD-II trouble code: description, causes, cost and diagnostic steps.",
+                         DiagnosticCodeInput),
+        _structured_tool(calculate_cost_structured, "calculate_repair_cost",
+                         "Calculate repair cost (parts, labor, fees, taxes, total). Find the part IDs first.",
+                         RepairCostInput),
+        _structured_tool(find_parts_structured, "find_replacement_parts",
+                         "Find parts compatible with a vehicle, with prices and warranty.",
+                         PartsInput),
+        _structured_tool(query_issues_structured, "query_known_issues",
+                         "Check common problems, symptoms and notes for a vehicle.",
+                         VehicleInput),
+        _structured_tool(generate_estimate_structured, "generate_estimate",
+                         "Generate a professional repair estimate document.",
+                         EstimateInput),
+    ]
+
+
 # Export all tools as a list
 def get_all_tools() -> List[Tool]:
     """Get all available diagnostic tools for the agent."""
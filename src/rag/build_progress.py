@@ -0,0 +1,117 @@
+"""
+Progress reporting and checkpointing for knowledge base builds.
+A build embeds and upserts chunks batch by batch; after every batch the
+checkpoint is saved, so an interrupted build resumes where it stopped.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+
+class BuildProgress:
+    """Thread-safe build progress that the UI can poll."""
+
+    STAGES = ("pending", "loading", "splitting", "embedding", "validating", "ready", "failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {
+            "stage": "pending",
+            "documents_loaded": 0,
+            "chunks_total": 0,
+            "duplicates_removed": 0,
+            "chunks_embedded": 0,
+            "points_upserted": 0,
+            "resumed_from": 0,
+            "generation": None,
+            "error": None
+        }
+        self._started_at: Optional[float] = None
+        self._embedding_started_at: Optional[float] = None
+
+    def update(self, **fields):
+        """Update one or more progress fields."""
+        with self._lock:
+            if fields.get("stage") == "loading" and self._started_at is None:
+                self._started_at = time.time()
+            if fields.get("stage") == "embedding":
+                self._embedding_started_at = time.time()
+            self._state.update(fields)
+
+    def advance(self, chunks: int):
+        """Record a finished batch of `chunks` embedded and upserted points."""
+        with self._lock:
+            self._state["chunks_embedded"] += chunks
+            self._state["points_upserted"] += chunks
+
+    @property
+    def stage(self) -> str:
+        return self._state["stage"]
+
+    def snapshot(self) -> Dict:
+        """Get a copy of the current progress, with elapsed time and ETA in seconds."""
+        with self._lock:
+            state = dict(self._state)
+            now = time.time()
+            state["elapsed_seconds"] = round(now - self._started_at, 1) if self._started_at else 0.0
+
+            eta = None
+            done = state["chunks_embedded"] - state["resumed_from"]
+            remaining = state["chunks_total"] - state["chunks_embedded"]
+            if state["stage"] == "embedding" and self._embedding_started_at and done > 0:
+                rate = done / max(now - self._embedding_started_at, 1e-6)
+                eta = round(remaining / rate, 1)
+            elif state["stage"] == "ready":
+                eta = 0.0
+            state["eta_seconds"] = eta
+            return state
+
+
+def chunks_fingerprint(texts: List[str], embedding_identity: str) -> str:
+    """Fingerprint of the build input; a checkpoint is only reused if it matches."""
+    digest = hashlib.sha1(embedding_identity.encode("utf-8"))
+    for text in texts:
+        digest.update(hashlib.sha1(text.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+class BuildCheckpoint:
+    """Per-batch build checkpoint persisted as a small JSON file."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def load(self) -> Optional[Dict]:
+        """Get the saved checkpoint, or None."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable build checkpoint {self.path}: {e}")
+            return None
+
+    def save(self, **state):
+        """Atomically write the checkpoint."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        """Remove the checkpoint after a successful build."""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
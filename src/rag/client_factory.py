@@ -0,0 +1,257 @@
+"""
+Process-wide Qdrant client factory.
+Every KnowledgeBase (including the ones tools create on demand) shares one
+client per deployment, so connections and the embedded-store lock are reused
+instead of re-opened, and all calls are timed for latency metrics.
+"""
+
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from qdrant_client import QdrantClient, AsyncQdrantClient
+
+from src.utils.helpers import get_logger
+from src.utils.config import (
+    QDRANT_PATH,
+    QDRANT_HOST,
+    QDRANT_PORT,
+    QDRANT_GRPC_PORT,
+    QDRANT_PREFER_GRPC,
+    QDRANT_API_KEY,
+    QDRANT_TIMEOUT,
+    QDRANT_POOL_SIZE
+)
+
+logger = get_logger(__name__)
+
+# Client methods whose latency is recorded
+INSTRUMENTED_METHODS = (
+    "query_points",
+    "query_batch_points",
+    "scroll",
+    "count",
+    "retrieve",
+    "upsert",
+    "get_collections",
+    "get_collection",
+    "collection_exists",
+    "create_collection",
+    "delete_collection",
+    "create_payload_index",
+    "get_aliases",
+    "update_collection_aliases",
+)
+
+
+class ClientMetrics:
+    """Thread-safe latency statistics per client method."""
+
+    def __init__(self, window: int = 500):
+        """
+        Args:
+            window: Number of recent samples kept per method for percentiles
+        """
+        self.window = window
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict] = {}
+
+    def record(self, method: str, elapsed_ms: float, failed: bool = False):
+        with self._lock:
+            stats = self._stats.setdefault(method, {
+                "calls": 0,
+                "errors": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "samples": deque(maxlen=self.window)
+            })
+            stats["calls"] += 1
+            stats["errors"] += int(failed)
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["samples"].append(elapsed_ms)
+
+    def summary(self) -> Dict[str, Dict]:
+        """Get calls, errors and latency (avg/p50/p95/max, in ms) per method."""
+        with self._lock:
+            summary = {}
+            for method, stats in self._stats.items():
+                samples = sorted(stats["samples"])
+                summary[method] = {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "avg_ms": round(stats["total_ms"] / stats["calls"], 2),
+                    "p50_ms": round(samples[len(samples) // 2], 2),
+                    "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+                    "max_ms": round(stats["max_ms"], 2)
+                }
+            return summary
+
+
+def _instrument(client, metrics: ClientMetrics):
+    """Wrap the client's public methods (in place) so each call is timed."""
+    for name in INSTRUMENTED_METHODS:
+        method = getattr(client, name, None)
+        if method is None:
+            continue
+
+        if inspect.iscoroutinefunction(method):
+            async def timed(*args, _method=method, _name=name, **kwargs):
+                start = time.perf_counter()
+                failed = True
+                try:
+                    result = await _method(*args, **kwargs)
+                    failed = False
+                    return result
+                finally:
+                    metrics.record(_name, (time.perf_counter() - start) * 1000, failed)
+        else:
+            def timed(*args, _method=method, _name=name, **kwargs):
+                start = time.perf_counter()
+                failed = True
+                try:
+                    result = _method(*args, **kwargs)
+                    failed = False
+                    return result
+                finally:
+                    metrics.record(_name, (time.perf_counter() - start) * 1000, failed)
+
+        setattr(client, name, functools.wraps(method)(timed))
+    return client
+
+
+_lock = threading.Lock()
+_clients: Dict[Tuple, object] = {}
+_metrics: Dict[Tuple, ClientMetrics] = {}
+
+
+def _remote_kwargs() -> Dict:
+    """Connection settings shared by the sync and async remote clients."""
+    return {
+        "host": QDRANT_HOST,
+        "port": QDRANT_PORT,
+        "grpc_port": QDRANT_GRPC_PORT,
+        "prefer_grpc": QDRANT_PREFER_GRPC,
+        "api_key": QDRANT_API_KEY,
+        "timeout": QDRANT_TIMEOUT,
+        "pool_size": QDRANT_POOL_SIZE
+    }
+
+
+def _get_or_create(key: Tuple, factory):
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            metrics = _metrics.setdefault(key, ClientMetrics())
+            client = _instrument(factory(), metrics)
+            _clients[key] = client
+        return client
+
+
+def get_qdrant_client(path: Optional[str] = None) -> QdrantClient:
+    """
+    Get the shared Qdrant client for this process.
+
+    Connects to QDRANT_HOST when configured (optionally over gRPC), otherwise
+    opens the embedded store at `path`.
+
+    Args:
+        path: Local storage directory (defaults to QDRANT_PATH, ignored for remote)
+
+    Returns:
+        Shared QdrantClient instance
+    """
+    if QDRANT_HOST:
+        key = ("remote", QDRANT_HOST, QDRANT_PORT, QDRANT_PREFER_GRPC)
+
+        def factory():
+            logger.info(
+                f"Connecting to Qdrant at {QDRANT_HOST} "
+                f"({'gRPC' if QDRANT_PREFER_GRPC else 'HTTP'}, pool={QDRANT_POOL_SIZE})"
+            )
+            return QdrantClient(**_remote_kwargs())
+    else:
+        local_path = str(Path(path or QDRANT_PATH).resolve())
+        key = ("local", local_path)
+
+        def factory():
+            logger.info(f"Opening local Qdrant store at {local_path}")
+            return QdrantClient(path=local_path)
+
+    return _get_or_create(key, factory)
+
+
+def get_async_qdrant_client() -> Optional[AsyncQdrantClient]:
+    """
+    Get the shared async Qdrant client.
+
+    Returns:
+        Shared AsyncQdrantClient, or None in local mode (the embedded store
+        is already owned by the sync client)
+    """
+    if not QDRANT_HOST:
+        return None
+
+    key = ("remote-async", QDRANT_HOST, QDRANT_PORT, QDRANT_PREFER_GRPC)
+    return _get_or_create(key, lambda: AsyncQdrantClient(**_remote_kwargs()))
+
+
+def get_client_metrics() -> Dict[str, Dict]:
+    """
+    Get latency metrics for every shared client.
+
+    Returns:
+        Mapping of client label (e.g. "local:/app/qdrant_db") to per-method stats
+    """
+    with _lock:
+        metrics = list(_metrics.items())
+    return {
+        ":".join(str(part) for part in key): client_metrics.summary()
+        for key, client_metrics in metrics
+    }
+
+
+def _take_clients() -> Dict[Tuple, object]:
+    """Remove every shared client from the registry and return them."""
+    with _lock:
+        clients = dict(_clients)
+        _clients.clear()
+    return clients
+
+
+def close_qdrant_clients():
+    """
+    Close all shared clients (releases the local store lock and the connection pools).
+
+    Async clients are closed on a fresh event loop; from inside a running
+    loop use aclose_qdrant_clients() instead.
+    """
+    for key, client in _take_clients().items():
+        try:
+            if isinstance(client, AsyncQdrantClient):
+                asyncio.run(client.close())
+            else:
+                client.close()
+        except Exception as e:
+            logger.warning(f"Error closing Qdrant client {key}: {e}")
+
+
+async def aclose_qdrant_clients():
+    """Close all shared clients from a running event loop (awaits the async clients' pools)."""
+    for key, client in _take_clients().items():
+        try:
+            if isinstance(client, AsyncQdrantClient):
+                await client.close()
+            else:
+                client.close()
+        except Exception as e:
+            logger.warning(f"Error closing Qdrant client {key}: {e}")
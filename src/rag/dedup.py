@@ -0,0 +1,210 @@
+"""
+Near-duplicate chunk elimination with MinHash and LSH banding.
+
+Manuals from different model years repeat whole pages and the repair guides
+overlap the OBD diagnostic steps. Before embedding, chunks whose word
+shingles are near-identical (estimated Jaccard similarity above a threshold)
+are collapsed into one chunk; the provenance of the dropped copies is merged
+into the kept chunk's metadata so sources can still be cited.
+"""
+
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from langchain.schema import Document
+except ImportError:
+    from langchain_core.documents import Document
+
+from src.utils.helpers import get_logger
+from src.utils.config import KB_DEDUP_THRESHOLD, KB_DEDUP_NUM_PERM
+from src.rag.entity_extractor import DTC_PATTERN
+
+logger = get_logger(__name__)
+
+# Prime just above 2**32: (a * x + b) stays below 2**64 for 32-bit a, b, x
+_HASH_PRIME = np.uint64(4294967311)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+# Metadata fields kept for each merged duplicate
+PROVENANCE_FIELDS = ("source", "type", "page", "filename", "code", "symptom", "repair_name")
+
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def shingles(text: str, size: int = 3) -> List[int]:
+    """
+    Hash the word n-grams of a text to 32-bit integers.
+
+    Args:
+        text: Chunk text
+        size: Words per shingle
+
+    Returns:
+        Unique shingle hashes (a short text yields a single shingle)
+    """
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return sorted({zlib.crc32(gram.encode("utf-8")) for gram in grams})
+
+
+def optimal_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    Choose (bands, rows) whose LSH curve crosses at or just below `threshold`.
+
+    Pairs above the threshold almost always share a bucket; the final decision
+    is made on the estimated similarity, so erring low only costs comparisons.
+    """
+    best = (num_perm, 1)
+    best_gap = float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        crossing = (1.0 / bands) ** (1.0 / rows)
+        gap = threshold - crossing
+        if 0 <= gap < best_gap:
+            best, best_gap = (bands, rows), gap
+    return best
+
+
+class MinHashDeduplicator:
+    """Collapse near-duplicate chunks into one, merging their provenance."""
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, shingle_size: int = 3, seed: int = 1):
+        """
+        Initialize the deduplicator.
+
+        Args:
+            threshold: Minimum estimated Jaccard similarity to merge two chunks
+            num_perm: Number of MinHash permutations (signature length)
+            shingle_size: Words per shingle
+            seed: Seed for the permutations (signatures are reproducible)
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = optimal_bands(num_perm, threshold)
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 2**32 - 1, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 2**32 - 1, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of a text (num_perm uint64 values)."""
+        hashes = np.asarray(shingles(text, self.shingle_size), dtype=np.uint64)
+        permuted = (np.outer(hashes, self._a) + self._b) % _HASH_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def _candidate_pairs(self, signatures: np.ndarray) -> set:
+        """Pairs of rows that share at least one LSH band bucket."""
+        pairs = set()
+        for band in range(self.bands):
+            buckets: Dict[bytes, List[int]] = {}
+            band_values = signatures[:, band * self.rows:(band + 1) * self.rows]
+            for row, values in enumerate(band_values):
+                buckets.setdefault(values.tobytes(), []).append(row)
+            for rows in buckets.values():
+                for i in range(len(rows)):
+                    for j in range(i + 1, len(rows)):
+                        pairs.add((rows[i], rows[j]))
+        return pairs
+
+    def find_duplicates(self, texts: List[str]) -> List[List[int]]:
+        """
+        Group near-duplicate texts.
+
+        Args:
+            texts: Chunk texts
+
+        Returns:
+            Groups of row indices in input order; the first row of each group is kept
+        """
+        if not texts:
+            return []
+
+        signatures = np.vstack([self.signature(text) for text in texts])
+        dtc_codes = [frozenset(DTC_PATTERN.findall(text.upper())) for text in texts]
+
+        parent = list(range(len(texts)))
+
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for i, j in self._candidate_pairs(signatures):
+            # Chunks about different trouble codes are distinct knowledge, however similar
+            if dtc_codes[i] != dtc_codes[j]:
+                continue
+            if np.mean(signatures[i] == signatures[j]) >= self.threshold:
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+
+        groups: Dict[int, List[int]] = {}
+        for row in range(len(texts)):
+            groups.setdefault(find(row), []).append(row)
+        return list(groups.values())
+
+    def deduplicate(self, chunks: List[Document]) -> List[Document]:
+        """
+        Drop near-duplicate chunks, keeping the first of each group.
+
+        The kept chunk gets `duplicate_count` and `duplicate_sources` (the
+        provenance fields of the dropped copies) in its metadata.
+
+        Args:
+            chunks: Split documents, in build order
+
+        Returns:
+            Deduplicated chunks, in build order
+        """
+        groups = self.find_duplicates([chunk.page_content for chunk in chunks])
+
+        kept = []
+        for group in sorted(groups, key=lambda rows: rows[0]):
+            representative = chunks[group[0]]
+            if len(group) > 1:
+                metadata = dict(representative.metadata)
+                metadata["duplicate_count"] = len(group) - 1
+                metadata["duplicate_sources"] = [
+                    {
+                        field: chunks[row].metadata[field]
+                        for field in PROVENANCE_FIELDS
+                        if field in chunks[row].metadata
+                    }
+                    for row in group[1:]
+                ]
+                representative = Document(page_content=representative.page_content, metadata=metadata)
+            kept.append(representative)
+
+        removed = len(chunks) - len(kept)
+        if removed:
+            logger.info(f"🧹 Removed {removed} near-duplicate chunks ({len(chunks)} -> {len(kept)})")
+        return kept
+
+
+def deduplicate_chunks(chunks: List[Document], threshold: Optional[float] = None) -> List[Document]:
+    """
+    Deduplicate chunks with the configured MinHash settings.
+
+    Args:
+        chunks: Split documents
+        threshold: Override for KB_DEDUP_THRESHOLD
+
+    Returns:
+        Deduplicated chunks
+    """
+    deduplicator = MinHashDeduplicator(
+        threshold=KB_DEDUP_THRESHOLD if threshold is None else threshold,
+        num_perm=KB_DEDUP_NUM_PERM
+    )
+    return deduplicator.deduplicate(chunks)
@@ -0,0 +1,222 @@
+"""
+Ingest-time entity extraction for chunk metadata.
+
+Each chunk is tagged with the diagnostic trouble codes, vehicle makes,
+models and years, and catalog parts it mentions. The fields are stored in
+the point payload with payload indexes, so a question that names a code or
+part ("P0171 on Honda Civic") can be answered by a filtered lookup instead
+of a semantic search. Vehicles come from KNOWN_ISSUES_DATABASE and the
+parts catalog's compatible vehicles; parts come from the parts catalog.
+"""
+
+import re
+import warnings
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from qdrant_client.http import models as rest
+
+from src.utils.helpers import get_logger, load_json_file
+from src.utils.config import PARTS_CATALOG_PATH
+from src.tools_impl.known_issues import KNOWN_ISSUES_DATABASE
+
+logger = get_logger(__name__)
+
+DTC_PATTERN = re.compile(r"\b[PBCU][0-3][0-9A-F]{3}\b")
+YEAR_PATTERN = re.compile(r"\b(19[89]\d|20[0-4]\d)(?:\s*[-–]\s*(19[89]\d|20[0-4]\d))?\b")
+
+# Payload fields written for every chunk (all lists)
+ENTITY_FIELDS = ("dtc_codes", "vehicle_makes", "vehicle_models", "years", "part_ids")
+
+# Payload fields with a keyword index: the entities plus the document type used by intent routing
+INDEXED_FIELDS = ENTITY_FIELDS + ("type",)
+
+# Fields that identify a chunk precisely enough for a lookup without semantic search
+LOOKUP_FIELDS = ("dtc_codes", "part_ids")
+
+# Ranking weight of each matched field in lookups
+_FIELD_WEIGHTS = {"dtc_codes": 4, "part_ids": 3, "vehicle_models": 2, "vehicle_makes": 1, "years": 1}
+
+
+def _phrase_pattern(phrase: str, plural: bool = False) -> "re.Pattern":
+    """Case-insensitive whole-phrase pattern, tolerant of extra whitespace."""
+    words = [re.escape(word) for word in phrase.lower().split()]
+    if plural and words:
+        words[-1] = words[-1].rstrip("s") + "s?"
+    return re.compile(r"(?<!\w)" + r"\s+".join(words) + r"(?!\w)", re.IGNORECASE)
+
+
+def part_base_name(name: str) -> str:
+    """Catalog name without variant details: 'Brake Pads - Front (OEM)' -> 'Brake Pads'."""
+    return re.sub(r"\(.*?\)", "", name.split(" - ")[0]).strip()
+
+
+class EntityExtractor:
+    """Extract trouble codes, vehicles, years and catalog parts from text."""
+
+    def __init__(self, vehicles: Iterable[Tuple[str, str]], parts: Iterable[Dict]):
+        """
+        Initialize the extractor.
+
+        Args:
+            vehicles: (make, model) pairs, e.g. ("Honda", "Civic")
+            parts: Catalog parts with "id" and "name"
+        """
+        self._makes: Dict[str, "re.Pattern"] = {}
+        self._models: List[Tuple[str, str, "re.Pattern"]] = []
+        for make, model in sorted(set(vehicles)):
+            self._makes.setdefault(make, _phrase_pattern(make))
+            self._models.append((make, model, _phrase_pattern(model)))
+
+        self._part_ids: Dict[str, "re.Pattern"] = {}
+        self._part_names: Dict[str, Tuple["re.Pattern", List[str]]] = {}
+        for part in parts:
+            self._part_ids[part["id"]] = re.compile(rf"(?<![\w-]){re.escape(part['id'])}(?![\w-])", re.IGNORECASE)
+            base = part_base_name(part["name"]).lower()
+            if base:
+                pattern, ids = self._part_names.setdefault(base, (_phrase_pattern(base, plural=True), []))
+                ids.append(part["id"])
+
+    def vehicles(self, text: str) -> List[Tuple[str, str]]:
+        """(make, model) pairs whose model is named in a text."""
+        return [(make, model) for make, model, pattern in self._models if pattern.search(text)]
+
+    def extract(self, text: str) -> Dict[str, List]:
+        """
+        Extract entities from a text.
+
+        Args:
+            text: Chunk or query text
+
+        Returns:
+            Dictionary with a sorted list for each field in ENTITY_FIELDS
+        """
+        dtc_codes = set(DTC_PATTERN.findall(text.upper()))
+
+        makes, models = set(), set()
+        for make, model in self.vehicles(text):
+            makes.add(make)
+            models.add(model)
+        for make, pattern in self._makes.items():
+            if pattern.search(text):
+                makes.add(make)
+
+        years = set()
+        for match in YEAR_PATTERN.finditer(text):
+            first = int(match.group(1))
+            last = int(match.group(2)) if match.group(2) else first
+            if 0 <= last - first <= 30:
+                years.update(range(first, last + 1))
+            else:
+                years.add(first)
+
+        part_ids = {part_id for part_id, pattern in self._part_ids.items() if pattern.search(text)}
+        for pattern, ids in self._part_names.values():
+            if pattern.search(text):
+                part_ids.update(ids)
+
+        return {
+            "dtc_codes": sorted(dtc_codes),
+            "vehicle_makes": sorted(makes),
+            "vehicle_models": sorted(models),
+            "years": sorted(years),
+            "part_ids": sorted(part_ids)
+        }
+
+
+def _catalog_vehicles(parts: List[Dict], makes: Iterable[str]) -> List[Tuple[str, str]]:
+    """Parse 'Toyota Corolla 2015-2020' style compatible vehicles into (make, model)."""
+    vehicles = []
+    known_makes = sorted(set(makes), key=len, reverse=True)
+    for part in parts:
+        for vehicle in part.get("compatible_vehicles", []):
+            name = YEAR_PATTERN.sub("", vehicle).strip()
+            make = next((m for m in known_makes if name.lower().startswith(m.lower() + " ")), None)
+            if make is None:
+                make, _, model = name.partition(" ")
+            else:
+                model = name[len(make):].strip()
+            if make and model:
+                vehicles.append((make, model))
+    return vehicles
+
+
+@lru_cache(maxsize=1)
+def get_entity_extractor() -> EntityExtractor:
+    """Build the extractor from KNOWN_ISSUES_DATABASE and the parts catalog (cached)."""
+    vehicles = [tuple(key.split(" ", 1)) for key in KNOWN_ISSUES_DATABASE if " " in key]
+
+    try:
+        parts = load_json_file(PARTS_CATALOG_PATH)["parts"]
+    except Exception as e:
+        logger.warning(f"Parts catalog unavailable for entity extraction: {e}")
+        parts = []
+
+    vehicles += _catalog_vehicles(parts, [make for make, _ in vehicles])
+    return EntityExtractor(vehicles, parts)
+
+
+def create_entity_indexes(client, collection_name: str):
+    """
+    Create payload indexes for the entity and document type fields of a collection.
+
+    Args:
+        client: Qdrant client
+        collection_name: Collection to index
+    """
+    # The embedded local store filters by scanning and warns that indexes are a no-op
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="Payload indexes have no effect")
+        for field in INDEXED_FIELDS:
+            schema = rest.PayloadSchemaType.INTEGER if field == "years" else rest.PayloadSchemaType.KEYWORD
+            client.create_payload_index(collection_name=collection_name, field_name=field, field_schema=schema)
+
+
+def lookup_filter(entities: Dict[str, List]) -> Optional[rest.Filter]:
+    """
+    Filter matching chunks that mention any of the query's codes or parts.
+
+    Args:
+        entities: Entities extracted from the query
+
+    Returns:
+        Qdrant filter, or None if the query names no code or part
+    """
+    conditions = [
+        rest.FieldCondition(key=field, match=rest.MatchAny(any=list(entities[field])))
+        for field in LOOKUP_FIELDS
+        if entities.get(field)
+    ]
+    if not conditions:
+        return None
+    return rest.Filter(should=conditions)
+
+
+def type_filter(doc_types: Optional[List[str]]) -> Optional[rest.Filter]:
+    """
+    Filter restricting a search to some document types.
+
+    Args:
+        doc_types: Document "type" values (e.g. ["symptom_diagnosis"]), or None
+
+    Returns:
+        Qdrant filter, or None to search every type
+    """
+    if not doc_types:
+        return None
+    return rest.Filter(must=[rest.FieldCondition(key="type", match=rest.MatchAny(any=list(doc_types)))])
+
+
+def match_score(payload: Dict, entities: Dict[str, List]) -> int:
+    """
+    Rank a looked-up chunk by how many query entities it mentions.
+
+    Codes weigh most, then parts, models, makes and years, so for
+    "P0171 on Honda Civic" the Civic-specific P0171 chunk comes first.
+    """
+    score = 0
+    for field, weight in _FIELD_WEIGHTS.items():
+        wanted = entities.get(field) or []
+        if wanted:
+            score += weight * len(set(wanted) & set(payload.get(field) or []))
+    return score
@@ -0,0 +1,120 @@
+"""
+Cross-lingual retrieval evaluation on the bilingual eval set.
+
+Each case pairs an English and a Spanish query with the knowledge base entry
+both should retrieve. Comparing hit rate and MRR per language shows whether
+the embedding model answers Spanish questions against the English knowledge
+base directly, without a translation round trip.
+
+Usage:
+    python -m src.rag.evaluation [--k 3] [--min-hit-rate 0.8]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    from langchain.schema import Document
+except ImportError:
+    from langchain_core.documents import Document
+
+from src.utils.helpers import get_logger, load_json_file
+from src.utils.config import BILINGUAL_EVAL_PATH
+
+logger = get_logger(__name__)
+
+LANGUAGES = ("en", "es")
+
+
+def load_eval_cases(path: Path = BILINGUAL_EVAL_PATH) -> List[Dict]:
+    """Load the bilingual eval cases."""
+    return load_json_file(path)["cases"]
+
+
+def doc_matches(doc: Document, expect: Dict) -> bool:
+    """
+    Check whether a retrieved document is the expected knowledge base entry.
+
+    Args:
+        doc: Retrieved document
+        expect: Metadata field -> expected value (codes also match `dtc_codes`)
+
+    Returns:
+        True if every expected field matches
+    """
+    metadata = doc.metadata or {}
+    for field, value in expect.items():
+        actual = str(metadata.get(field, "")).strip().lower()
+        if actual == str(value).strip().lower():
+            continue
+        if field == "code" and value in (metadata.get("dtc_codes") or []):
+            continue
+        return False
+    return True
+
+
+def evaluate_retrieval(knowledge_base, cases: Optional[List[Dict]] = None, k: int = 3) -> Dict:
+    """
+    Measure hit rate@k and MRR for each query language.
+
+    Args:
+        knowledge_base: KnowledgeBase (anything with search(query, k, search_type))
+        cases: Eval cases (defaults to the bilingual eval set)
+        k: Results retrieved per query
+
+    Returns:
+        Dictionary with per-language "hit_rate" and "mrr", the English-Spanish
+        hit rate gap and the missed queries
+    """
+    cases = load_eval_cases() if cases is None else cases
+    report: Dict = {"k": k, "cases": len(cases), "misses": []}
+
+    for language in LANGUAGES:
+        hits, reciprocal_ranks = 0, 0.0
+        for case in cases:
+            docs = knowledge_base.search(case[language], k=k, search_type="similarity")
+            rank = next((i for i, doc in enumerate(docs, 1) if doc_matches(doc, case["expect"])), None)
+            if rank is None:
+                report["misses"].append({"language": language, "query": case[language], "expect": case["expect"]})
+            else:
+                hits += 1
+                reciprocal_ranks += 1.0 / rank
+        report[language] = {
+            "hit_rate": round(hits / len(cases), 3) if cases else 0.0,
+            "mrr": round(reciprocal_ranks / len(cases), 3) if cases else 0.0
+        }
+
+    report["cross_lingual_gap"] = round(report["en"]["hit_rate"] - report["es"]["hit_rate"], 3)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point (exit code 1 if the Spanish hit rate is below --min-hit-rate)."""
+    parser = argparse.ArgumentParser(description="Bilingual retrieval evaluation")
+    parser.add_argument("--k", type=int, default=3, help="Results retrieved per query")
+    parser.add_argument("--min-hit-rate", type=float, default=None, help="Fail if the Spanish hit rate is lower")
+    args = parser.parse_args(argv)
+
+    from src.rag.knowledge_base import KnowledgeBase
+
+    kb = KnowledgeBase()
+    report = evaluate_retrieval(kb, k=args.k)
+
+    print(f"Embedding model: {kb.embedding_identity}")
+    print(f"Cases: {report['cases']}  k={report['k']}")
+    for language in LANGUAGES:
+        print(f"  {language}: hit@{args.k}={report[language]['hit_rate']:.3f}  MRR={report[language]['mrr']:.3f}")
+    print(f"  English-Spanish gap: {report['cross_lingual_gap']:+.3f}")
+    for miss in report["misses"]:
+        print(f"  ✗ [{miss['language']}] {miss['query']} -> {miss['expect']}")
+
+    if args.min_hit_rate is not None and report["es"]["hit_rate"] < args.min_hit_rate:
+        print(f"❌ Spanish hit rate below {args.min_hit_rate}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,525 @@
+"""
+Frozen, read-only export of the knowledge base for multi-process serving.
+
+The embedded Qdrant store holds an exclusive lock on its directory, so only
+one process can open it. A single writer exports each finished build as a
+numbered generation of flat files (normalized vectors + JSONL payloads), and
+any number of worker processes memory-map the current generation and search
+it with exact NumPy dot products, without taking any lock.
+
+Usage:
+    python -m src.rag.frozen_index export   # writer: export the current collection
+    python -m src.rag.frozen_index info     # show the active generation
+"""
+
+import json
+import mmap
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import portalocker
+from qdrant_client.http import models as rest
+
+from src.utils.helpers import get_logger
+from src.utils.config import FROZEN_INDEX_PATH, FROZEN_INDEX_KEEP_GENERATIONS
+from src.rag.entity_extractor import INDEXED_FIELDS
+
+logger = get_logger(__name__)
+
+POINTER_FILE = "CURRENT"
+WRITER_LOCK_FILE = "writer.lock"
+GENERATION_PREFIX = "gen-"
+
+
+def read_pointer(base_dir: Path, pointer_name: str = POINTER_FILE) -> Optional[str]:
+    """Read an atomic pointer file, or None if it doesn't exist yet."""
+    pointer = Path(base_dir) / pointer_name
+    try:
+        value = pointer.read_text(encoding="utf-8").strip()
+        return value or None
+    except FileNotFoundError:
+        return None
+
+
+def write_pointer(base_dir: Path, value: str, pointer_name: str = POINTER_FILE):
+    """Atomically replace a pointer file (readers see either the old or new value)."""
+    base_dir = Path(base_dir)
+    base_dir.mkdir(parents=True, exist_ok=True)
+    tmp = base_dir / f".{pointer_name}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(value)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, base_dir / pointer_name)
+
+
+class WriterLock:
+    """
+    Exclusive, non-blocking lock that elects the single writer process.
+
+    Raises:
+        RuntimeError: If another process already holds the writer lock
+    """
+
+    def __init__(self, base_dir: Path = FROZEN_INDEX_PATH):
+        self.path = Path(base_dir) / WRITER_LOCK_FILE
+        self._file = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a")
+        try:
+            portalocker.lock(self._file, portalocker.LOCK_EX | portalocker.LOCK_NB)
+        except portalocker.LockException:
+            self._file.close()
+            self._file = None
+            raise RuntimeError(
+                f"Another process is already writing the knowledge base ({self.path})"
+            )
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            portalocker.unlock(self._file)
+            self._file.close()
+            self._file = None
+
+
+def _next_generation(base_dir: Path) -> int:
+    existing = [
+        int(p.name[len(GENERATION_PREFIX):])
+        for p in base_dir.glob(f"{GENERATION_PREFIX}*")
+        if p.is_dir() and p.name[len(GENERATION_PREFIX):].isdigit()
+    ]
+    return max(existing, default=0) + 1
+
+
+def write_index_files(
+    target_dir: Path,
+    ids: List,
+    vectors,
+    payloads: List[Dict],
+    metadata: Optional[Dict] = None
+) -> Dict:
+    """
+    Write the flat index files (vectors.npy, payloads.jsonl, offsets.npy,
+    entity_index.json, meta.json).
+
+    Args:
+        target_dir: Directory to create and fill
+        ids: Point ids, aligned with vectors
+        vectors: Embedding matrix (one row per point)
+        payloads: Point payloads, aligned with vectors
+        metadata: Extra fields stored in meta.json
+
+    Returns:
+        The meta.json contents
+    """
+    target_dir = Path(target_dir)
+    target_dir.mkdir(parents=True)
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim != 2:
+        matrix = matrix.reshape(len(ids), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    np.save(target_dir / "vectors.npy", matrix / norms)
+
+    # JSONL payloads plus byte offsets, so readers decode only the hits
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    with open(target_dir / "payloads.jsonl", "wb") as f:
+        for i, (point_id, payload) in enumerate(zip(ids, payloads)):
+            line = json.dumps({"id": point_id, "payload": payload}, ensure_ascii=False).encode("utf-8") + b"\n"
+            f.write(line)
+            offsets[i + 1] = offsets[i] + len(line)
+    np.save(target_dir / "offsets.npy", offsets)
+
+    # Indexed field -> value -> rows, for filtered lookups without a payload scan
+    entity_index: Dict[str, Dict[str, List[int]]] = {field: {} for field in INDEXED_FIELDS}
+    for row, payload in enumerate(payloads):
+        for field in INDEXED_FIELDS:
+            values = payload.get(field)
+            for value in values if isinstance(values, list) else [values] if values is not None else []:
+                entity_index[field].setdefault(str(value), []).append(row)
+    with open(target_dir / "entity_index.json", "w", encoding="utf-8") as f:
+        json.dump(entity_index, f)
+
+    meta = {
+        "count": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]) if matrix.size else 0,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **(metadata or {})
+    }
+    with open(target_dir / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def scroll_collection(client, collection_name: str, batch_size: int = 256):
+    """
+    Read every point of a collection.
+
+    Returns:
+        Tuple of (ids, vectors, payloads)
+    """
+    ids, vectors, payloads = [], [], []
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True
+        )
+        for record in records:
+            ids.append(record.id)
+            vectors.append(record.vector)
+            payloads.append(record.payload or {})
+        if offset is None:
+            break
+    return ids, vectors, payloads
+
+
+def publish_generation(tmp_dir: Path, base_dir: Path = FROZEN_INDEX_PATH, keep: int = FROZEN_INDEX_KEEP_GENERATIONS) -> Path:
+    """
+    Move a fully written index directory into place as the next generation.
+
+    Must be called while holding the WriterLock.
+
+    Args:
+        tmp_dir: Directory holding complete index files (on the same filesystem)
+        base_dir: Directory holding all generations
+        keep: Number of generations to keep on disk
+
+    Returns:
+        Path of the new generation directory
+    """
+    base_dir = Path(base_dir)
+    generation = _next_generation(base_dir)
+    name = f"{GENERATION_PREFIX}{generation:06d}"
+
+    meta_path = Path(tmp_dir) / "meta.json"
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["generation"] = generation
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    os.replace(tmp_dir, base_dir / name)
+    write_pointer(base_dir, name)
+    logger.info(f"✅ Frozen index generation {name} published ({meta.get('count', 0)} points)")
+
+    _remove_old_generations(base_dir, keep)
+    return base_dir / name
+
+
+def write_generation(
+    ids: List,
+    vectors: np.ndarray,
+    payloads: List[Dict],
+    base_dir: Path = FROZEN_INDEX_PATH,
+    metadata: Optional[Dict] = None,
+    keep: int = FROZEN_INDEX_KEEP_GENERATIONS
+) -> Path:
+    """
+    Write a new frozen generation and make it the active one.
+
+    Must be called while holding the WriterLock.
+
+    Args:
+        ids: Point ids, aligned with vectors
+        vectors: Embedding matrix (one row per point)
+        payloads: Point payloads, aligned with vectors
+        base_dir: Directory holding all generations
+        metadata: Extra fields stored in meta.json (e.g. embedding model)
+        keep: Number of generations to keep on disk (older ones are removed)
+
+    Returns:
+        Path of the new generation directory
+    """
+    base_dir = Path(base_dir)
+    base_dir.mkdir(parents=True, exist_ok=True)
+
+    tmp_dir = base_dir / f".staging-{os.getpid()}.tmp"
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+
+    write_index_files(tmp_dir, ids, vectors, payloads, metadata)
+    return publish_generation(tmp_dir, base_dir=base_dir, keep=keep)
+
+
+def _remove_old_generations(base_dir: Path, keep: int):
+    """Delete all but the newest `keep` generations (never the active one)."""
+    active = read_pointer(base_dir)
+    generations = sorted(
+        p for p in base_dir.glob(f"{GENERATION_PREFIX}*") if p.is_dir()
+    )
+    for old in generations[:-keep] if keep > 0 else generations:
+        if old.name == active:
+            continue
+        # Readers that still map the old files keep them alive until they refresh
+        shutil.rmtree(old, ignore_errors=True)
+        logger.info(f"Removed old frozen index generation {old.name}")
+
+
+def export_collection(
+    client,
+    collection_name: Union[str, List[str]],
+    base_dir: Path = FROZEN_INDEX_PATH,
+    metadata: Optional[Dict] = None,
+    batch_size: int = 256
+) -> Path:
+    """
+    Export a Qdrant collection as a new frozen generation.
+
+    Args:
+        client: Qdrant client owning the collection
+        collection_name: Collection to export, or a list of shards merged into one index
+        base_dir: Directory holding all generations
+        metadata: Extra fields stored in meta.json
+        batch_size: Points fetched per scroll request
+
+    Returns:
+        Path of the new generation directory
+    """
+    names = [collection_name] if isinstance(collection_name, str) else list(collection_name)
+    ids, vectors, payloads = [], [], []
+    for name in names:
+        shard_ids, shard_vectors, shard_payloads = scroll_collection(client, name, batch_size)
+        ids += shard_ids
+        vectors += shard_vectors
+        payloads += shard_payloads
+    collection_name = ", ".join(names)
+
+    logger.info(f"Exporting {len(ids)} points from '{collection_name}' to frozen index...")
+    with WriterLock(base_dir):
+        return write_generation(
+            ids,
+            np.asarray(vectors, dtype=np.float32),
+            payloads,
+            base_dir=base_dir,
+            metadata={"collection": collection_name, **(metadata or {})}
+        )
+
+
+class FrozenIndex:
+    """
+    Lock-free, read-only view of the active frozen generation.
+
+    Exposes the subset of the QdrantClient API used by KnowledgeBase
+    (query_points), so it can stand in for the client in read-only mode.
+    """
+
+    def __init__(self, base_dir: Path = FROZEN_INDEX_PATH, refresh_interval: float = 5.0):
+        """
+        Args:
+            base_dir: Directory holding all generations
+            refresh_interval: Seconds between checks for a newer generation
+        """
+        self.base_dir = Path(base_dir)
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self.generation: Optional[str] = None
+        self.meta: Dict = {}
+        self._vectors: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._payloads: Optional[mmap.mmap] = None
+        self._entity_index: Optional[Dict[str, Dict[str, List[int]]]] = None
+        self.refresh(force=True)
+
+    @staticmethod
+    def exists(base_dir: Path = FROZEN_INDEX_PATH) -> bool:
+        """Check whether a frozen generation has been published."""
+        active = read_pointer(Path(base_dir))
+        return bool(active) and (Path(base_dir) / active / "meta.json").exists()
+
+    def refresh(self, force: bool = False):
+        """Switch to a newer generation if the writer has published one."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+
+        active = read_pointer(self.base_dir)
+        if active is None:
+            raise FileNotFoundError(f"No frozen index published in {self.base_dir}")
+        if active == self.generation:
+            return
+
+        with self._lock:
+            if active == self.generation:
+                return
+            gen_dir = self.base_dir / active
+            with open(gen_dir / "meta.json", encoding="utf-8") as f:
+                meta = json.load(f)
+            vectors = np.load(gen_dir / "vectors.npy", mmap_mode="r")
+            offsets = np.load(gen_dir / "offsets.npy", mmap_mode="r")
+            with open(gen_dir / "payloads.jsonl", "rb") as f:
+                payloads = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else None
+            entity_index = None
+            if (gen_dir / "entity_index.json").exists():
+                with open(gen_dir / "entity_index.json", encoding="utf-8") as f:
+                    entity_index = json.load(f)
+
+            self._vectors, self._offsets, self._payloads = vectors, offsets, payloads
+            self._entity_index = entity_index
+            self.meta, self.generation = meta, active
+            logger.info(f"Frozen index loaded: {active} ({meta.get('count', 0)} points)")
+
+    def __len__(self) -> int:
+        return 0 if self._vectors is None else int(self._vectors.shape[0])
+
+    def _record(self, index: int) -> Dict:
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return json.loads(self._payloads[start:end])
+
+    def query_points(
+        self,
+        collection_name: str = None,
+        query: List[float] = None,
+        limit: int = 10,
+        with_vectors: bool = False,
+        query_filter: Optional[rest.Filter] = None,
+        **kwargs
+    ) -> rest.QueryResponse:
+        """
+        Exact cosine search over the memory-mapped vectors.
+
+        Args:
+            collection_name: Ignored (a frozen index holds one collection)
+            query: Query embedding
+            limit: Number of results
+            with_vectors: Whether to include vectors in the results
+            query_filter: Optional payload filter (same subset as scroll())
+
+        Returns:
+            QueryResponse with ScoredPoint results, like QdrantClient.query_points
+        """
+        self.refresh()
+        vectors = self._vectors
+        if vectors is None or len(self) == 0 or limit <= 0:
+            return rest.QueryResponse(points=[])
+
+        q = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+
+        scores = vectors @ q
+        if query_filter is not None:
+            allowed = np.zeros(scores.shape[0], dtype=bool)
+            allowed[sorted(self._filter_rows(query_filter))] = True
+            scores = np.where(allowed, scores, -np.inf)
+            limit = min(limit, int(allowed.sum()))
+            if limit <= 0:
+                return rest.QueryResponse(points=[])
+        limit = min(limit, scores.shape[0])
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+
+        points = []
+        for index in top:
+            record = self._record(int(index))
+            points.append(rest.ScoredPoint(
+                id=record["id"],
+                version=0,
+                score=float(scores[index]),
+                payload=record["payload"],
+                vector=vectors[index].tolist() if with_vectors else None
+            ))
+        return rest.QueryResponse(points=points)
+
+    def _condition_rows(self, condition: rest.FieldCondition) -> set:
+        """Rows whose payload field matches a MatchValue/MatchAny condition."""
+        match = condition.match
+        values = match.any if isinstance(match, rest.MatchAny) else [match.value]
+        wanted = {str(value) for value in values}
+
+        field_index = (self._entity_index or {}).get(condition.key)
+        if field_index is not None:
+            return {row for value in wanted for row in field_index.get(value, [])}
+
+        rows = set()
+        for row in range(len(self)):
+            value = self._record(row)["payload"].get(condition.key)
+            found = value if isinstance(value, list) else [value]
+            if wanted & {str(v) for v in found}:
+                rows.add(row)
+        return rows
+
+    def _filter_rows(self, payload_filter: rest.Filter) -> set:
+        """Rows matching every `must` condition and at least one `should` condition."""
+        rows = set(range(len(self)))
+        for condition in payload_filter.must or []:
+            rows &= self._condition_rows(condition)
+        if payload_filter.should:
+            rows &= set().union(*(self._condition_rows(c) for c in payload_filter.should))
+        return rows
+
+    def scroll(
+        self,
+        collection_name: str = None,
+        scroll_filter: Optional[rest.Filter] = None,
+        limit: int = 10,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        **kwargs
+    ):
+        """
+        Fetch points matching a payload filter, like QdrantClient.scroll.
+
+        Only `must` and `should` lists of field conditions with MatchValue or
+        MatchAny are supported (what entity lookups use).
+
+        Args:
+            collection_name: Ignored (a frozen index holds one collection)
+            scroll_filter: Payload filter (None returns the first points)
+            limit: Maximum number of points
+            with_payload: Whether to include payloads
+            with_vectors: Whether to include vectors
+
+        Returns:
+            Tuple of (records, None)
+        """
+        self.refresh()
+        if self._vectors is None or len(self) == 0 or limit <= 0:
+            return [], None
+
+        rows = set(range(len(self))) if scroll_filter is None else self._filter_rows(scroll_filter)
+
+        records = []
+        for row in sorted(rows)[:limit]:
+            record = self._record(row)
+            records.append(rest.Record(
+                id=record["id"],
+                payload=record["payload"] if with_payload else None,
+                vector=self._vectors[row].tolist() if with_vectors else None
+            ))
+        return records, None
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "info"
+
+    if command == "export":
+        from src.rag.client_factory import get_qdrant_client
+        from src.utils.config import QDRANT_COLLECTION_NAME
+
+        path = export_collection(get_qdrant_client(), QDRANT_COLLECTION_NAME)
+        print(f"✅ Exported frozen index to {path}")
+    elif command == "info":
+        if not FrozenIndex.exists():
+            print(f"No frozen index in {FROZEN_INDEX_PATH}")
+        else:
+            index = FrozenIndex()
+            print(json.dumps(index.meta, indent=2))
+    else:
+        print(__doc__)
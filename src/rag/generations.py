@@ -0,0 +1,171 @@
+"""
+Generation-numbered collections behind a stable alias (blue-green rebuilds).
+
+Each build writes a fresh collection (e.g. automotive_knowledge_g0003). Once
+it is validated, the alias `automotive_knowledge` is repointed to it in a
+single atomic alias update and the previous generations are dropped.
+Searches always go through the alias, so they keep hitting the old
+generation at full speed while a rebuild runs, and a crashed build never
+replaces a working index.
+"""
+
+import re
+from typing import Dict, List, Optional
+
+from qdrant_client.http import models as rest
+
+from src.utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+
+def generation_collection_name(alias: str, generation: int) -> str:
+    """Physical collection name for a generation of an aliased collection."""
+    return f"{alias}_g{generation:04d}"
+
+
+def _generation_pattern(alias: str) -> "re.Pattern":
+    return re.compile(rf"^{re.escape(alias)}_g(\d{{4,}})$")
+
+
+def list_generations(client, alias: str) -> List[int]:
+    """List existing generation numbers for an alias, oldest first."""
+    pattern = _generation_pattern(alias)
+    generations = []
+    for collection in client.get_collections().collections:
+        match = pattern.match(collection.name)
+        if match:
+            generations.append(int(match.group(1)))
+    return sorted(generations)
+
+
+def next_generation(client, alias: str) -> int:
+    """Number for the next generation to build."""
+    return max(list_generations(client, alias), default=0) + 1
+
+
+def get_alias_target(client, alias: str) -> Optional[str]:
+    """Collection the alias currently points to, or None."""
+    for description in client.get_aliases().aliases:
+        if description.alias_name == alias:
+            return description.collection_name
+    return None
+
+
+def is_legacy_collection(client, alias: str) -> bool:
+    """True if `alias` is a real collection from before generations were used."""
+    return get_alias_target(client, alias) is None and any(
+        c.name == alias for c in client.get_collections().collections
+    )
+
+
+def collection_metadata(client, collection_name: str) -> Dict:
+    """
+    Metadata stored with a collection (embedding identity, projection).
+
+    Args:
+        client: Qdrant client, or a FrozenIndex (whose meta.json plays that role)
+        collection_name: Collection or alias (ignored for a frozen index)
+
+    Returns:
+        The metadata dictionary (empty for collections created without it)
+    """
+    meta = getattr(client, "meta", None)
+    if isinstance(meta, dict):
+        return meta
+    return client.get_collection(collection_name).config.metadata or {}
+
+
+def validate_generation(client, collection_name: str, expected_points: int, probe_vector=None):
+    """
+    Check a freshly built generation before it goes live.
+
+    Args:
+        client: Qdrant client
+        collection_name: Generation collection to check
+        expected_points: Number of points that were upserted
+        probe_vector: Optional vector that must find at least one result
+
+    Raises:
+        ValueError: If the generation is incomplete or not searchable
+    """
+    count = client.count(collection_name=collection_name, exact=True).count
+    if count != expected_points:
+        raise ValueError(
+            f"Generation {collection_name} has {count} points, expected {expected_points}"
+        )
+
+    if probe_vector is not None and expected_points > 0:
+        hits = client.query_points(collection_name=collection_name, query=probe_vector, limit=1).points
+        if not hits:
+            raise ValueError(f"Generation {collection_name} returned no results for the probe query")
+
+
+def swap_alias(client, alias: str, collection_name: str):
+    """
+    Atomically point `alias` to `collection_name`.
+
+    See swap_aliases() for the one-time migration of a legacy collection.
+    """
+    swap_aliases(client, {alias: collection_name})
+
+
+def swap_aliases(client, targets: Dict[str, str]):
+    """
+    Atomically repoint several aliases (e.g. all shards of one build) in a single update.
+
+    A legacy collection that has an alias' name must be dropped before the
+    alias can be created, and Qdrant cannot do both in one alias update. The
+    drops are therefore sent last, right before the update: during that
+    one-time migration, searches on the name fail for the span of one round
+    trip (the alias update itself). Later swaps have no gap.
+
+    Args:
+        client: Qdrant client
+        targets: Alias -> collection it should point to
+    """
+    operations = []
+    legacy = []
+    for alias, collection_name in targets.items():
+        if is_legacy_collection(client, alias):
+            legacy.append(alias)
+        elif get_alias_target(client, alias) is not None:
+            operations.append(rest.DeleteAliasOperation(
+                delete_alias=rest.DeleteAlias(alias_name=alias)
+            ))
+        operations.append(rest.CreateAliasOperation(
+            create_alias=rest.CreateAlias(collection_name=collection_name, alias_name=alias)
+        ))
+
+    for alias in legacy:
+        logger.info(f"Migrating legacy collection '{alias}' to an alias")
+        client.delete_collection(alias)
+    client.update_collection_aliases(change_aliases_operations=operations)
+    for alias, collection_name in targets.items():
+        logger.info(f"Alias '{alias}' now points to '{collection_name}'")
+
+
+def garbage_collect_generations(client, alias: str, keep: Optional[str] = None) -> List[str]:
+    """
+    Drop every generation except the live one (and `keep`).
+
+    Also removes collections left behind by interrupted builds.
+
+    Returns:
+        Names of the dropped collections
+    """
+    live = {get_alias_target(client, alias), keep}
+    dropped = []
+    for generation in list_generations(client, alias):
+        name = generation_collection_name(alias, generation)
+        if name in live:
+            continue
+        try:
+            client.delete_collection(name)
+            dropped.append(name)
+        except Exception as e:
+            logger.warning(f"Could not drop old generation {name}: {e}")
+
+    if dropped:
+        logger.info(f"Garbage-collected generations: {', '.join(dropped)}")
+    return dropped
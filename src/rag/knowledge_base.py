@@ -4,7 +4,10 @@ Handles document embedding and vector database creation/management.
 """
 
 import os
-from typing import List, Optional
+import asyncio
+import functools
+import threading
+from typing import Dict, List, Optional
 from pathlib import Path
 
 try:
@@ -12,7 +15,7 @@ try:
 except ImportError:
     from langchain.text_splitter import RecursiveCharacterTextSplitter
     
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, AsyncQdrantClient
 from qdrant_client.models import Distance, VectorParams, PointStruct
 from langchain_community.embeddings import HuggingFaceEmbeddings
 
@@ -31,19 +34,75 @@ from src.utils.config import (
     QDRANT_PATH,
     QDRANT_COLLECTION_NAME,
     QDRANT_HOST,
-    QDRANT_PORT,
-    QDRANT_API_KEY,
+    KB_READ_ONLY,
+    FROZEN_INDEX_EXPORT,
+    KB_BUILD_BATCH_SIZE,
+    KB_BUILD_CHECKPOINT_FILE,
+    KB_SNAPSHOT_PATH,
+    KB_DEDUP_ENABLED,
+    KB_SHARDING_ENABLED,
+    KB_PROJECTION,
+    KB_AUTO_MIGRATE_EMBEDDINGS,
+    KB_PROJECTION_DIM,
+    KB_PROJECTION_FIT_SAMPLES,
+    ENTITY_LOOKUP_SCAN_LIMIT,
+    HUGGINGFACE_EMBEDDING_MODEL,
+    get_embedding_identity,
     CHUNK_SIZE,
     CHUNK_OVERLAP,
+    SEARCH_TYPE,
+    MMR_FETCH_K,
+    MMR_LAMBDA,
     OBD_CODES_PATH,
     SYMPTOMS_PATH,
     REPAIR_GUIDES_PATH,
     PDF_DOCS_PATH
 )
 from src.rag.document_loader import load_all_knowledge_base
+from src.rag.mmr import maximal_marginal_relevance
+from src.rag.dedup import deduplicate_chunks
+from src.rag.entity_extractor import (
+    get_entity_extractor,
+    create_entity_indexes,
+    lookup_filter,
+    type_filter,
+    match_score
+)
+from src.rag.client_factory import get_qdrant_client, get_async_qdrant_client
+from src.rag.frozen_index import FrozenIndex, export_collection
+from src.rag.build_progress import BuildProgress, BuildCheckpoint, chunks_fingerprint
+from src.rag.generations import (
+    generation_collection_name,
+    next_generation,
+    validate_generation,
+    swap_aliases,
+    garbage_collect_generations,
+    collection_metadata
+)
+from src.rag.projection import EmbeddingProjection, load_projection, sample_indices
+from src.rag.shards import (
+    shard_for,
+    shard_alias,
+    shard_aliases,
+    shard_vectors_config,
+    merge_by_score,
+    fan_out,
+    afan_out
+)
 
 logger = get_logger(__name__)
 
+# Points per scroll request of an entity lookup
+LOOKUP_PAGE_SIZE = 256
+
+# Process-wide: only one build (initial or rebuild) runs at a time
+_BUILD_LOCK = threading.Lock()
+
+
+def build_in_progress() -> bool:
+    """Check whether a knowledge base build is currently running in this process."""
+    return _BUILD_LOCK.locked()
+
 
 class KnowledgeBase:
     """
@@ -53,7 +112,10 @@ class KnowledgeBase:
     def __init__(
         self,
         persist_directory: str = QDRANT_PATH,
-        rebuild: bool = False
+        rebuild: bool = False,
+        read_only: bool = KB_READ_ONLY,
+        progress: Optional[BuildProgress] = None,
+        sharded: bool = KB_SHARDING_ENABLED
     ):
         """
         Initialize the knowledge base.
@@ -61,9 +123,18 @@ class KnowledgeBase:
         Args:
             persist_directory: Directory to store Qdrant database
             rebuild: If True, rebuild the database from scratch
+            read_only: If True, search the published frozen index instead of
+                opening the Qdrant store (lets many worker processes share it)
+            progress: Optional progress tracker updated while building
+            sharded: If True, keep one collection per source type and fan searches
+                out to all of them (the frozen index is always a single collection)
         """
         self.persist_directory = persist_directory
         self.collection_name = QDRANT_COLLECTION_NAME
+        self.read_only = read_only
+        self.sharded = sharded and not read_only
+        self.progress = progress or BuildProgress()
+        self.checkpoint = BuildCheckpoint(Path(persist_directory) / KB_BUILD_CHECKPOINT_FILE)
         
         # Lazy load embeddings (avoid loading PyTorch at startup)
         self._embeddings = None
@@ -75,15 +146,31 @@ class KnowledgeBase:
             separators=["\n\n", "\n", " ", ""]
         )
         
-        # Qdrant client will be created on demand
+        # Qdrant clients will be created on demand
         self.client = None
+        self.async_client = None
+        
+        # Fitted dimensionality reduction applied to documents and queries (None = full-dim)
+        self.projection: Optional[EmbeddingProjection] = None
         
         self.vectorstore = None  # Qdrant client store
         
         # Initialize or load the database
-        if rebuild or not self._database_exists():
-            logger.info("Building knowledge base from scratch...")
-            self._build_database()
+        if self.read_only:
+            if rebuild:
+                raise ValueError("Cannot rebuild a read-only knowledge base")
+            self._load_frozen_index()
+        elif rebuild or not self._database_exists():
+            # Another instance may be building already: wait for it, then re-check
+            with _BUILD_LOCK:
+                if not rebuild and not self._database_exists() and KB_SNAPSHOT_PATH:
+                    self._restore_snapshot()
+                if rebuild or not self._database_exists():
+                    logger.info("Building knowledge base from scratch...")
+                    self._build_database()
+                    return
+            logger.info("Loading knowledge base built by another instance...")
+            self._load_database()
         else:
             logger.info("Loading existing knowledge base...")
             self._load_database()
@@ -107,7 +194,7 @@ class KnowledgeBase:
                     logger.warning(f"LM Studio error: {e}, falling back to HuggingFace")
                     self._embeddings = self._get_huggingface_embeddings()
             else:
-                logger.info("Loading HuggingFace embeddings (all-MiniLM-L6-v2)...")
+                logger.info(f"Loading HuggingFace embeddings ({HUGGINGFACE_EMBEDDING_MODEL})...")
                 self._embeddings = self._get_huggingface_embeddings()
         
         return self._embeddings
@@ -115,115 +202,336 @@ class KnowledgeBase:
     def _get_huggingface_embeddings(self):
         """Get HuggingFace embeddings"""
         return HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
+            model_name=HUGGINGFACE_EMBEDDING_MODEL,
             model_kwargs={'device': 'cpu'},
             encode_kwargs={'normalize_embeddings': True}
         )
     
     def _database_exists(self) -> bool:
-        """Check if the Qdrant database already exists."""
+        """Check if the Qdrant collection (or its alias, or all shard aliases) already exists."""
         try:
-            # Check if directory exists and has content
-            if QDRANT_HOST:
-                # For remote, we would need to check collections
-                client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, api_key=QDRANT_API_KEY)
-                collections = client.get_collections().collections
-                return any(c.name == self.collection_name for c in collections)
-            else:
-                # For local, check if directory exists
-                db_path = Path(self.persist_directory)
-                return db_path.exists() and any(db_path.iterdir())
+            client = get_qdrant_client(self.persist_directory)
+            return all(client.collection_exists(alias) for alias in self._aliases().values())
         except Exception as e:
             logger.warning(f"Error checking for existing database: {e}")
             return False
     
+    @property
+    def embedding_identity(self) -> str:
+        """Identify the embedding provider and model (stored with builds and snapshots)."""
+        embeddings = self._embeddings
+        if embeddings is None:
+            return get_embedding_identity()
+        model = getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None)
+        return f"{type(embeddings).__name__}:{model or 'default'}"
+    
     def _build_database(self):
-        """Build the vector database from knowledge base files."""
+        """
+        Build the vector database from knowledge base files.
+        
+        Chunks are embedded and upserted in batches of KB_BUILD_BATCH_SIZE and a
+        checkpoint is written after each batch, so an interrupted build resumes
+        in the same generation instead of starting over.
+        """
+        progress = self.progress
+        progress.update(stage="loading", error=None)
         logger.info("Loading documents from knowledge base...")
         
-        # Load all documents
-        documents = load_all_knowledge_base(
-            OBD_CODES_PATH,
-            SYMPTOMS_PATH,
-            REPAIR_GUIDES_PATH,
-            PDF_DOCS_PATH
-        )
+        try:
+            # Load all documents
+            documents = load_all_knowledge_base(
+                OBD_CODES_PATH,
+                SYMPTOMS_PATH,
+                REPAIR_GUIDES_PATH,
+                PDF_DOCS_PATH
+            )
+            progress.update(stage="splitting", documents_loaded=len(documents))
+            
+            # Split documents into chunks
+            logger.info("Splitting documents into chunks...")
+            chunks = self.text_splitter.split_documents(documents)
+            logger.info(f"Created {len(chunks)} chunks from {len(documents)} documents")
+            
+            if KB_DEDUP_ENABLED:
+                deduplicated = deduplicate_chunks(chunks)
+                progress.update(duplicates_removed=len(chunks) - len(deduplicated))
+                chunks = deduplicated
+            
+            # Tag codes, vehicles and parts for filtered lookups
+            extractor = get_entity_extractor()
+            for chunk in chunks:
+                chunk.metadata.update(extractor.extract(chunk.page_content))
+            
+            self._embed_and_upsert(chunks)
+        except Exception as e:
+            progress.update(stage="failed", error=str(e))
+            raise
+        
+        progress.update(stage="ready")
         
-        # Split documents into chunks
-        logger.info("Splitting documents into chunks...")
-        chunks = self.text_splitter.split_documents(documents)
-        logger.info(f"Created {len(chunks)} chunks from {len(documents)} documents")
+    def _embed_and_upsert(self, chunks: List[Document]):
+        """Embed chunks batch by batch into a new (or resumed) generation and swap it in."""
+        progress = self.progress
         
         # Create vector store using Qdrant directly
         logger.info("Creating embeddings and building vector database...")
         logger.info("(This may take a few minutes on first run...)")
         
-        # Initialize Qdrant client
-        if QDRANT_HOST:
-            self.client = QdrantClient(
-                host=QDRANT_HOST,
-                port=QDRANT_PORT,
-                api_key=QDRANT_API_KEY
-            )
-        else:
-            self.client = QdrantClient(path=self.persist_directory)
+        # Get the shared Qdrant client
+        self.client = get_qdrant_client(self.persist_directory)
         
-        # Get embeddings for all chunks
-        logger.info("Computing embeddings for all chunks...")
         texts = [chunk.page_content for chunk in chunks]
         metadatas = [chunk.metadata for chunk in chunks]
-        embeddings = self.embeddings.embed_documents(texts)
+        fingerprint = chunks_fingerprint(texts, f"{self.embedding_identity}|{KB_PROJECTION}:{KB_PROJECTION_DIM}")
+        batch_size = KB_BUILD_BATCH_SIZE
         
-        # Create collection if it doesn't exist
-        try:
-            collection_info = self.client.get_collection(self.collection_name)
-            logger.info(f"Collection {self.collection_name} already exists, recreating...")
-            self.client.delete_collection(self.collection_name)
-        except Exception:
-            pass  # Collection doesn't exist yet
-        
-        # Create collection with proper vector size
-        vector_size = len(embeddings[0]) if embeddings else 384
-        self.client.create_collection(
-            collection_name=self.collection_name,
-            vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE)
-        )
+        # Alias each chunk goes to (one per shard when sharding is enabled)
+        shards = {alias: shard for shard, alias in self._aliases().items()}
+        chunk_aliases = [self._alias_for(metadata) for metadata in metadatas]
         
-        # Upsert points to collection
-        logger.info(f"Upserting {len(embeddings)} embeddings to collection...")
-        
-        points = []
-        for idx, (embedding, text, metadata) in enumerate(zip(embeddings, texts, metadatas)):
-            point = PointStruct(
-                id=idx,
-                vector=embedding,
-                payload={
-                    "page_content": text,
-                    "source": metadata.get("source", "unknown"),
-                    "page": metadata.get("page", 0),
-                    **metadata  # Include all metadata
-                }
-            )
-            points.append(point)
+        # Resume an interrupted build of the same input, otherwise start a new generation
+        saved = self.checkpoint.load()
+        if (
+            saved
+            and saved.get("fingerprint") == fingerprint
+            and saved.get("batch_size") == batch_size
+            and set(saved.get("collections", {})) == set(shards)
+            and all(self.client.collection_exists(name) for name in saved["collections"].values())
+        ):
+            generation = saved["generation"]
+            targets = saved["collections"]
+            batches_done = saved["batches_done"]
+            projection = load_projection(self.client, next(iter(targets.values())))
+            logger.info(f"Resuming generation {generation} at batch {batches_done}")
+        else:
+            generation = max(next_generation(self.client, alias) for alias in shards)
+            targets = {alias: generation_collection_name(alias, generation) for alias in shards}
+            batches_done = 0
+            projection = None
+            logger.info(f"Building generation {generation} in {', '.join(targets.values())}")
         
-        self.client.upsert(
-            collection_name=self.collection_name,
-            points=points
+        resumed_chunks = min(batches_done * batch_size, len(texts))
+        progress.update(
+            stage="embedding",
+            generation=generation,
+            chunks_total=len(texts),
+            chunks_embedded=resumed_chunks,
+            points_upserted=resumed_chunks,
+            resumed_from=resumed_chunks
         )
         
-        logger.info(f"✅ Knowledge base built and saved to Qdrant collection '{self.collection_name}'")
+        # Fit the projection on an evenly spaced sample (embeddings are reused below)
+        sample_embeddings: Dict[int, List[float]] = {}
+        if KB_PROJECTION and batches_done == 0 and texts:
+            projection, sample_embeddings = self._fit_projection(texts)
+        
+        probe_vector = None
+        try:
+            for start in range(resumed_chunks, len(texts), batch_size):
+                batch_texts = texts[start:start + batch_size]
+                missing = [i for i in range(start, start + len(batch_texts)) if i not in sample_embeddings]
+                fresh = iter(self.embeddings.embed_documents([texts[i] for i in missing]) if missing else [])
+                embeddings = [
+                    sample_embeddings.pop(i) if i in sample_embeddings else next(fresh)
+                    for i in range(start, start + len(batch_texts))
+                ]
+                if projection is not None:
+                    embeddings = projection.transform(embeddings).tolist()
+                if probe_vector is None:
+                    probe_vector = embeddings[0]
+                
+                # Create the collections with proper vector size (first batch only)
+                for alias, target_collection in targets.items():
+                    if not self.client.collection_exists(target_collection):
+                        self.client.create_collection(
+                            collection_name=target_collection,
+                            metadata=self._collection_metadata(projection),
+                            **self._collection_config(shards[alias], len(embeddings[0]))
+                        )
+                        create_entity_indexes(self.client, target_collection)
+                
+                points_by_alias: Dict[str, List[PointStruct]] = {}
+                for offset, (embedding, text) in enumerate(zip(embeddings, batch_texts)):
+                    metadata = metadatas[start + offset]
+                    points_by_alias.setdefault(chunk_aliases[start + offset], []).append(PointStruct(
+                        id=start + offset,
+                        vector=embedding,
+                        payload={
+                            "page_content": text,
+                            "source": metadata.get("source", "unknown"),
+                            "page": metadata.get("page", 0),
+                            **metadata  # Include all metadata
+                        }
+                    ))
+                
+                for alias, points in points_by_alias.items():
+                    self.client.upsert(
+                        collection_name=targets[alias],
+                        points=points
+                    )
+                
+                batches_done += 1
+                progress.advance(len(batch_texts))
+                self.checkpoint.save(
+                    fingerprint=fingerprint,
+                    generation=generation,
+                    collections=targets,
+                    batch_size=batch_size,
+                    batches_done=batches_done
+                )
+                logger.info(f"Upserted {start + len(batch_texts)}/{len(texts)} chunks")
+            
+            progress.update(stage="validating")
+            if probe_vector is None and texts:
+                probe_vector = self._embed_query(texts[0])
+            for alias, target_collection in targets.items():
+                validate_generation(
+                    self.client,
+                    target_collection,
+                    expected_points=chunk_aliases.count(alias),
+                    probe_vector=probe_vector
+                )
+        except ValueError:
+            # Validation failed: the partial generation is unusable
+            logger.error(f"Generation {generation} failed validation, keeping the current index")
+            self.checkpoint.clear()
+            for target_collection in targets.values():
+                if self.client.collection_exists(target_collection):
+                    self.client.delete_collection(target_collection)
+            raise
+        
+        # Go live atomically (all shards in one alias update), then drop the previous generations
+        swap_aliases(self.client, targets)
+        self.projection = projection
+        for alias, target_collection in targets.items():
+            garbage_collect_generations(self.client, alias, keep=target_collection)
+        self.checkpoint.clear()
+        
+        logger.info(f"✅ Knowledge base built and saved to Qdrant ({', '.join(targets.values())})")
+        
+        if FROZEN_INDEX_EXPORT:
+            self._publish_frozen_index()
     
-    def _load_database(self):
-        """Load an existing vector database."""
+    def _collection_metadata(self, projection: Optional[EmbeddingProjection]) -> Dict:
+        """Metadata stored with each new collection (checked on load to detect a model change)."""
+        metadata = {"embedding_identity": self.embedding_identity}
+        if projection is not None:
+            metadata["projection"] = projection.to_metadata()
+        return metadata
+    
+    def _fit_projection(self, texts: List[str]):
+        """
+        Embed a sample of the chunks and fit the configured projection on it.
+        
+        Returns:
+            Tuple of (projection, row -> full-dimensional embedding of the sampled rows)
+        """
+        rows = sample_indices(len(texts), KB_PROJECTION_FIT_SAMPLES)
+        vectors = []
+        for start in range(0, len(rows), KB_BUILD_BATCH_SIZE):
+            vectors.extend(self.embeddings.embed_documents([texts[i] for i in rows[start:start + KB_BUILD_BATCH_SIZE]]))
+        
+        projection = EmbeddingProjection.fit(vectors, KB_PROJECTION_DIM, method=KB_PROJECTION)
+        report = projection.report
+        logger.info(
+            f"📉 Fitted {projection.method} projection {projection.source_dim} -> {projection.target_dim} dims "
+            f"on {len(rows)} chunks (recall@{report['k']} vs full-dim search: {report['recall_at_k']})"
+        )
+        return projection, dict(zip(rows, vectors))
+    
+    def _embed_query(self, query: str) -> List[float]:
+        """Embed a query (projected like the stored vectors, if a projection is in use)."""
+        embedding = self.embeddings.embed_query(query)
+        return self.projection.transform(embedding).tolist() if self.projection else embedding
+    
+    def _stale_embedding_identity(self) -> bool:
+        """True if the stored vectors were embedded with a different model than the configured one."""
+        stored = collection_metadata(self.client, next(iter(self._aliases().values()))).get("embedding_identity")
+        if stored is None:
+            # Collections built before the identity was recorded are assumed current
+            return False
+        if stored != self.embedding_identity:
+            logger.warning(f"🔁 Embedding model changed: index uses '{stored}', configured '{self.embedding_identity}'")
+            return True
+        return False
+    
+    def _aliases(self) -> Dict[str, str]:
+        """Shard name -> alias searched (a single unnamed shard when sharding is off)."""
+        if self.sharded:
+            return shard_aliases(self.collection_name)
+        return {"": self.collection_name}
+    
+    def _alias_for(self, metadata: Dict) -> str:
+        """Alias of the collection a chunk is stored in."""
+        if self.sharded:
+            return shard_alias(self.collection_name, shard_for(metadata))
+        return self.collection_name
+    
+    def _collection_config(self, shard: str, dim: int) -> Dict:
+        """create_collection settings for a shard (on-disk storage for large ones)."""
+        if self.sharded:
+            return shard_vectors_config(shard, dim)
+        return {"vectors_config": VectorParams(size=dim, distance=Distance.COSINE)}
+    
+    def _publish_frozen_index(self):
+        """Export the collection as a new frozen generation for read-only workers."""
+        metadata = {
+            "embedding_provider": os.getenv("EMBEDDING_PROVIDER", "huggingface").lower(),
+            "embedding_identity": self.embedding_identity
+        }
+        if self.projection is not None:
+            metadata["projection"] = self.projection.to_metadata()
+        try:
+            export_collection(
+                self.client,
+                list(self._aliases().values()),
+                metadata=metadata
+            )
+        except Exception as e:
+            logger.error(f"Failed to publish frozen index: {e}")
+    
+    def _restore_snapshot(self, target: str = "qdrant"):
+        """Restore KB_SNAPSHOT_PATH instead of embedding from scratch (failures fall back to a build)."""
+        from src.rag.snapshot import import_snapshot
+        
+        if self.sharded and target == "qdrant":
+            logger.warning("Snapshots hold a single collection; building the sharded knowledge base instead")
+            return
+        
+        logger.info(f"Restoring knowledge base snapshot from {KB_SNAPSHOT_PATH}...")
         try:
-            if QDRANT_HOST:
-                self.client = QdrantClient(
-                    host=QDRANT_HOST,
-                    port=QDRANT_PORT,
-                    api_key=QDRANT_API_KEY
+            if target == "qdrant":
+                import_snapshot(
+                    KB_SNAPSHOT_PATH,
+                    target="qdrant",
+                    client=get_qdrant_client(self.persist_directory),
+                    collection_name=self.collection_name
                 )
             else:
-                self.client = QdrantClient(path=self.persist_directory)
+                import_snapshot(KB_SNAPSHOT_PATH, target="frozen")
+        except Exception as e:
+            logger.error(f"Snapshot restore failed: {e}")
+    
+    def _load_frozen_index(self):
+        """Attach to the published frozen index (no Qdrant lock is taken)."""
+        if not FrozenIndex.exists() and KB_SNAPSHOT_PATH:
+            self._restore_snapshot(target="frozen")
+        if not FrozenIndex.exists():
+            raise FileNotFoundError(
+                "No frozen index published yet. Run the writer with FROZEN_INDEX_EXPORT=True "
+                "or `python -m src.rag.frozen_index export`."
+            )
+        self.client = FrozenIndex()
+        self.projection = load_projection(self.client, self.collection_name)
+        if self._stale_embedding_identity():
+            logger.error("The frozen index was embedded with a different model; publish a rebuilt one")
+        self.progress.update(stage="ready", generation=self.client.meta.get("generation"))
+        logger.info(f"✅ Knowledge base attached read-only to frozen index {self.client.generation}")
+    
+    def _load_database(self):
+        """Load an existing vector database (migrating it if it was embedded with another model)."""
+        try:
+            self.client = get_qdrant_client(self.persist_directory)
             
             # Load vectorstore from existing collection
             self.vectorstore = Qdrant(
@@ -232,19 +540,47 @@ class KnowledgeBase:
                 embeddings=self.embeddings
             )
             
-            logger.info("✅ Knowledge base loaded successfully")
+            stale = self._stale_embedding_identity()
+            if not stale:
+                self.projection = load_projection(self.client, next(iter(self._aliases().values())))
         except Exception as e:
             logger.error(f"Failed to load database: {e}")
             logger.info("Rebuilding database...")
-            self._build_database()
+            with _BUILD_LOCK:
+                self._build_database()
+            return
+        
+        if stale:
+            # Outside the try: a disabled migration or a failed rebuild must not trigger another rebuild
+            if not KB_AUTO_MIGRATE_EMBEDDINGS:
+                raise ValueError("Embedding model changed; rebuild the knowledge base or set KB_AUTO_MIGRATE_EMBEDDINGS")
+            # Blue-green: the old generation stays live for other processes until the swap
+            with _BUILD_LOCK:
+                self._build_database()
+            return
+        
+        self.progress.update(stage="ready")
+        logger.info("✅ Knowledge base loaded successfully")
     
-    def search(self, query: str, k: int = 3) -> List[Document]:
+    def search(
+        self,
+        query: str,
+        k: int = 3,
+        search_type: Optional[str] = None,
+        fetch_k: Optional[int] = None,
+        lambda_mult: Optional[float] = None,
+        doc_types: Optional[List[str]] = None
+    ) -> List[Document]:
         """
         Search the knowledge base for relevant documents.
         
         Args:
             query: Search query
             k: Number of results to return
+            search_type: "similarity" or "mmr" (defaults to SEARCH_TYPE)
+            fetch_k: Candidates fetched before MMR re-selection
+            lambda_mult: MMR relevance/diversity trade-off (1.0 = pure relevance)
+            doc_types: Only search these document types (e.g. ["symptom_diagnosis"])
             
         Returns:
             List of relevant documents
@@ -252,28 +588,285 @@ class KnowledgeBase:
         if not self.client:
             raise ValueError("Vector store not initialized")
         
-        logger.info(f"Searching knowledge base for: '{query}'")
+        search_type = (search_type or SEARCH_TYPE).lower()
+        logger.info(f"Searching knowledge base for: '{query}' ({search_type})")
         
         # Embed the query
-        query_embedding = self.embeddings.embed_query(query)
+        query_embedding = self._embed_query(query)
         
-        # Search using Qdrant client's query method
-        search_results = self.client.query_points(
-            collection_name=self.collection_name,
-            query=query_embedding,
-            limit=k
-        )
+        if search_type == "mmr":
+            candidates = self._query_points(
+                query_embedding, limit=max(fetch_k or MMR_FETCH_K, k), with_vectors=True, doc_types=doc_types
+            )
+            points = self._mmr_select(query_embedding, candidates, k, lambda_mult)
+        else:
+            points = self._query_points(query_embedding, limit=k, doc_types=doc_types)
+        
+        documents = self._points_to_documents(points)
+        logger.info(f"Found {len(documents)} relevant documents")
+        return documents
+    
+    async def asearch(
+        self,
+        query: str,
+        k: int = 3,
+        search_type: Optional[str] = None,
+        fetch_k: Optional[int] = None,
+        lambda_mult: Optional[float] = None,
+        doc_types: Optional[List[str]] = None
+    ) -> List[Document]:
+        """
+        Async version of search().
+        
+        Uses Qdrant's async client against a remote server; the embedded local
+        store has no async API, so its queries run in the default executor.
+        
+        Args:
+            query: Search query
+            k: Number of results to return
+            search_type: "similarity" or "mmr" (defaults to SEARCH_TYPE)
+            fetch_k: Candidates fetched before MMR re-selection
+            lambda_mult: MMR relevance/diversity trade-off (1.0 = pure relevance)
+            doc_types: Only search these document types (e.g. ["symptom_diagnosis"])
+            
+        Returns:
+            List of relevant documents
+        """
+        if not self.client:
+            raise ValueError("Vector store not initialized")
+        
+        search_type = (search_type or SEARCH_TYPE).lower()
+        logger.info(f"Searching knowledge base (async) for: '{query}' ({search_type})")
+        
+        query_embedding = await self._aembed_query(query)
+        
+        if search_type == "mmr":
+            candidates = await self._aquery_points(
+                query_embedding, limit=max(fetch_k or MMR_FETCH_K, k), with_vectors=True, doc_types=doc_types
+            )
+            points = self._mmr_select(query_embedding, candidates, k, lambda_mult)
+        else:
+            points = await self._aquery_points(query_embedding, limit=k, doc_types=doc_types)
+        
+        documents = self._points_to_documents(points)
+        logger.info(f"Found {len(documents)} relevant documents")
+        return documents
+    
+    def lookup(self, query: str, k: int = 3, entities: Optional[Dict[str, List]] = None) -> List[Document]:
+        """
+        Answer a query that names a trouble code or catalog part by a filtered lookup.
+        
+        No embedding is computed: chunks tagged with the query's codes or parts
+        are fetched by payload filter and ranked by how many of the query's
+        entities (codes, parts, models, makes, years) they mention.
+        
+        Args:
+            query: Search query, e.g. "P0171 on Honda Civic"
+            k: Number of results to return
+            entities: Entities already extracted from the query
+            
+        Returns:
+            Matching documents with a `lookup_score` (empty if the query names no code or part)
+        """
+        if not self.client:
+            raise ValueError("Vector store not initialized")
+        
+        entities = entities or get_entity_extractor().extract(query)
+        query_filter = lookup_filter(entities)
+        if query_filter is None:
+            return []
+        
+        def scroll_shard(shard: str, alias: str) -> list:
+            # Rank every tagged chunk (up to the scan limit), not just the first page in id order
+            points, offset = [], None
+            while len(points) < ENTITY_LOOKUP_SCAN_LIMIT:
+                page, offset = self.client.scroll(
+                    collection_name=alias,
+                    scroll_filter=query_filter,
+                    limit=min(LOOKUP_PAGE_SIZE, ENTITY_LOOKUP_SCAN_LIMIT - len(points)),
+                    offset=offset,
+                    with_payload=True
+                )
+                points.extend(page)
+                if offset is None:
+                    break
+            return points
+        
+        points = self._gather_shards(scroll_shard)
+        return self._rank_lookup(points, entities, k)
+    
+    async def alookup(self, query: str, k: int = 3, entities: Optional[Dict[str, List]] = None) -> List[Document]:
+        """
+        Async version of lookup().
+        
+        Args:
+            query: Search query
+            k: Number of results to return
+            entities: Entities already extracted from the query
+            
+        Returns:
+            Matching documents with a `lookup_score`
+        """
+        if not self.client:
+            raise ValueError("Vector store not initialized")
+        
+        async_client = self._get_async_client()
+        if async_client is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, functools.partial(self.lookup, query, k, entities))
+        
+        entities = entities or get_entity_extractor().extract(query)
+        query_filter = lookup_filter(entities)
+        if query_filter is None:
+            return []
+        
+        async def scroll_shard(shard: str, alias: str) -> list:
+            points, offset = [], None
+            while len(points) < ENTITY_LOOKUP_SCAN_LIMIT:
+                page, offset = await async_client.scroll(
+                    collection_name=alias,
+                    scroll_filter=query_filter,
+                    limit=min(LOOKUP_PAGE_SIZE, ENTITY_LOOKUP_SCAN_LIMIT - len(points)),
+                    offset=offset,
+                    with_payload=True
+                )
+                points.extend(page)
+                if offset is None:
+                    break
+            return points
+        
+        if not self.sharded:
+            return self._rank_lookup(await scroll_shard("", self.collection_name), entities, k)
+        results = await afan_out(scroll_shard, self._aliases())
+        return self._rank_lookup([p for points in results.values() for p in points], entities, k)
+    
+    def _rank_lookup(self, points: list, entities: Dict[str, List], k: int) -> List[Document]:
+        """Order looked-up points by entity overlap (stable for ties) and keep the top k."""
+        ranked = sorted(points, key=lambda point: -match_score(point.payload or {}, entities))[:k]
+        documents = self._points_to_documents(ranked)
+        for document, point in zip(documents, ranked):
+            document.metadata["lookup_score"] = match_score(point.payload or {}, entities)
+        logger.info(f"Entity lookup found {len(points)} tagged chunks, returning {len(documents)}")
+        return documents
+    
+    async def _aembed_query(self, query: str) -> List[float]:
+        """Embed a query without blocking the event loop."""
+        embeddings = self.embeddings
+        if hasattr(embeddings, "aembed_query"):
+            embedding = await embeddings.aembed_query(query)
+            return self.projection.transform(embedding).tolist() if self.projection else embedding
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._embed_query, query)
+    
+    def _get_async_client(self) -> Optional[AsyncQdrantClient]:
+        """Get the shared async Qdrant client (remote deployments only)."""
+        if self.async_client is None:
+            self.async_client = get_async_qdrant_client()
+        return self.async_client
+    
+    def _gather_shards(self, query_shard) -> list:
+        """Run `query_shard(shard, alias)` on the collection, or on every shard in parallel."""
+        if not self.sharded:
+            return query_shard("", self.collection_name)
+        results = fan_out(query_shard, self._aliases())
+        return [point for points in results.values() for point in points]
+    
+    def _search_aliases(self, doc_types: Optional[List[str]] = None) -> Dict[str, str]:
+        """Shards that can hold the given document types (all of them if None)."""
+        aliases = self._aliases()
+        if not doc_types:
+            return aliases
+        wanted = {shard_for({"type": doc_type}) for doc_type in doc_types}
+        return {shard: alias for shard, alias in aliases.items() if shard in wanted}
+    
+    def _query_points(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        with_vectors: bool = False,
+        doc_types: Optional[List[str]] = None
+    ) -> list:
+        """Run a nearest-neighbour query against the collection (or all shards, merged by score)."""
+        query_filter = type_filter(doc_types)
+        
+        def query_shard(shard: str, alias: str) -> list:
+            return self.client.query_points(
+                collection_name=alias,
+                query=query_embedding,
+                limit=limit,
+                with_vectors=with_vectors,
+                query_filter=query_filter
+            ).points
         
-        # Convert scored points to Document objects
+        if not self.sharded:
+            return query_shard("", self.collection_name)
+        return merge_by_score(fan_out(query_shard, self._search_aliases(doc_types)), limit)
+    
+    async def _aquery_points(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        with_vectors: bool = False,
+        doc_types: Optional[List[str]] = None
+    ) -> list:
+        """Async nearest-neighbour query (executor fallback for local mode)."""
+        async_client = self._get_async_client()
+        if async_client is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                None,
+                functools.partial(self._query_points, query_embedding, limit, with_vectors, doc_types)
+            )
+        
+        query_filter = type_filter(doc_types)
+        
+        async def query_shard(shard: str, alias: str) -> list:
+            search_results = await async_client.query_points(
+                collection_name=alias,
+                query=query_embedding,
+                limit=limit,
+                with_vectors=with_vectors,
+                query_filter=query_filter
+            )
+            return search_results.points
+        
+        if not self.sharded:
+            return await query_shard("", self.collection_name)
+        return merge_by_score(await afan_out(query_shard, self._search_aliases(doc_types)), limit)
+    
+    @staticmethod
+    def _mmr_select(
+        query_embedding: List[float],
+        candidates: list,
+        k: int,
+        lambda_mult: Optional[float] = None
+    ) -> list:
+        """Re-select a diverse top-k from candidates fetched with their vectors."""
+        candidates = [point for point in candidates if point.vector is not None]
+        if len(candidates) <= k:
+            return candidates
+        
+        selected = maximal_marginal_relevance(
+            query_embedding,
+            [point.vector for point in candidates],
+            k=k,
+            lambda_mult=MMR_LAMBDA if lambda_mult is None else lambda_mult
+        )
+        return [candidates[i] for i in selected]
+    
+    @staticmethod
+    def _points_to_documents(points) -> List[Document]:
+        """Convert Qdrant scored points to Document objects."""
         documents = []
-        for point in search_results.points:
+        for point in points:
             # Extract ALL metadata from the payload
             payload = point.payload or {}
             page_content = payload.get("page_content", "")
             
             # Build metadata dictionary with all available fields
             metadata = {
-                "score": point.score
+                "score": getattr(point, "score", None),
+                "chunk_id": point.id
             }
             
             # Add all fields from payload except page_content
@@ -293,7 +886,6 @@ class KnowledgeBase:
             )
             documents.append(doc)
         
-        logger.info(f"Found {len(documents)} relevant documents")
         return documents
     
     def search_with_scores(self, query: str, k: int = 3) -> List[tuple]:
@@ -307,11 +899,9 @@ class KnowledgeBase:
         Returns:
             List of (document, score) tuples
         """
-        if not self.vectorstore:
-            raise ValueError("Vector store not initialized")
-        
         logger.info(f"Searching knowledge base (with scores) for: '{query}'")
-        results = self.vectorstore.similarity_search_with_score(query, k=k)
+        # Goes through search() so sharded collections are covered too
+        results = [(doc, doc.metadata["score"]) for doc in self.search(query, k=k, search_type="similarity")]
         logger.info(f"Found {len(results)} relevant documents")
         
         return results
@@ -322,10 +912,39 @@ class KnowledgeBase:
             raise ValueError("Vector store not initialized")
         return self.vectorstore
     
-    def rebuild(self):
-        """Rebuild the knowledge base from scratch."""
-        logger.info("Rebuilding knowledge base...")
-        self._build_database()
+    def rebuild(self, background: bool = False) -> Optional[threading.Thread]:
+        """
+        Rebuild the knowledge base from scratch.
+        
+        The new index is built as a separate generation and swapped in
+        atomically, so searches keep working during the rebuild.
+        
+        Args:
+            background: If True, build in a daemon thread and return it
+            
+        Returns:
+            The build thread when background=True, otherwise None
+        """
+        if self.read_only:
+            raise ValueError("Cannot rebuild a read-only knowledge base")
+        
+        if not background:
+            logger.info("Rebuilding knowledge base...")
+            with _BUILD_LOCK:
+                self._build_database()
+            return None
+        
+        def run():
+            with _BUILD_LOCK:
+                try:
+                    self._build_database()
+                except Exception as e:
+                    logger.error(f"Background rebuild failed: {e}")
+        
+        logger.info("Rebuilding knowledge base in the background...")
+        thread = threading.Thread(target=run, name="kb-rebuild", daemon=True)
+        thread.start()
+        return thread
 
 
 def initialize_knowledge_base(rebuild: bool = False) -> KnowledgeBase:
@@ -346,6 +965,67 @@ def initialize_knowledge_base(rebuild: bool = False) -> KnowledgeBase:
         raise
 
 
+class KnowledgeBaseLoader:
+    """
+    Builds or loads the knowledge base in a background thread.
+    
+    Callers keep working without the knowledge base until `ready` is True,
+    and can poll `status()` for build progress.
+    """
+    
+    def __init__(self, rebuild: bool = False):
+        """
+        Args:
+            rebuild: Whether to rebuild from scratch
+        """
+        self.rebuild = rebuild
+        self.progress = BuildProgress()
+        self.knowledge_base: Optional[KnowledgeBase] = None
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self) -> "KnowledgeBaseLoader":
+        """Start loading in a daemon thread (no-op if already started)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="kb-loader", daemon=True)
+            self._thread.start()
+        return self
+    
+    def _run(self):
+        try:
+            self.knowledge_base = KnowledgeBase(rebuild=self.rebuild, progress=self.progress)
+        except Exception as e:
+            logger.error(f"Failed to initialize knowledge base: {e}")
+            self.progress.update(stage="failed", error=str(e))
+    
+    @property
+    def ready(self) -> bool:
+        """True once the knowledge base can be searched."""
+        return self.knowledge_base is not None
+    
+    def status(self) -> Dict:
+        """Get build progress (stage, counts, ETA) plus a `ready` flag."""
+        return {"ready": self.ready, **self.progress.snapshot()}
+    
+    def wait(self, timeout: Optional[float] = None) -> Optional[KnowledgeBase]:
+        """Block until loading finishes (or timeout) and return the knowledge base."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.knowledge_base
+
+
+def start_knowledge_base_loader(rebuild: bool = False) -> KnowledgeBaseLoader:
+    """
+    Start building or loading the knowledge base in the background.
+    
+    Args:
+        rebuild: Whether to rebuild from scratch
+        
+    Returns:
+        Started KnowledgeBaseLoader
+    """
+    return KnowledgeBaseLoader(rebuild=rebuild).start()
+
+
 if __name__ == "__main__":
     # Test knowledge base
     print("Initializing knowledge base...")
@@ -0,0 +1,64 @@
+"""
+Maximal Marginal Relevance (MMR) re-selection for retrieval results.
+Picks results that are relevant to the query but not redundant with each other.
+"""
+
+from typing import List, Sequence
+
+import numpy as np
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length (zero rows are left untouched)."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def maximal_marginal_relevance(
+    query_vector: Sequence[float],
+    candidate_vectors: Sequence[Sequence[float]],
+    k: int = 3,
+    lambda_mult: float = 0.5
+) -> List[int]:
+    """
+    Select a diverse subset of candidates using MMR.
+
+    All similarities are computed up front with two matrix products, so the
+    greedy selection loop only does O(n) vector work per pick.
+
+    Args:
+        query_vector: Query embedding
+        candidate_vectors: Candidate embeddings (one row per candidate)
+        k: Number of candidates to select
+        lambda_mult: Trade-off between relevance (1.0) and diversity (0.0)
+
+    Returns:
+        Indices of the selected candidates, in selection order
+    """
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    if candidates.ndim != 2 or candidates.shape[0] == 0 or k <= 0:
+        return []
+
+    k = min(k, candidates.shape[0])
+    candidates = _normalize_rows(candidates)
+    query = _normalize_rows(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+
+    relevance = candidates @ query
+    pairwise = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    available = np.ones(candidates.shape[0], dtype=bool)
+    available[selected[0]] = False
+    # Highest similarity of every candidate to anything already selected
+    max_redundancy = pairwise[selected[0]].copy()
+
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_redundancy, pairwise[best], out=max_redundancy)
+
+    return selected
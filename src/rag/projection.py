@@ -0,0 +1,222 @@
+"""
+Embedding dimensionality reduction with a projection fitted at build time.
+
+Larger embedding models (e.g. 768-d nomic-embed-text) double vector memory
+and search cost compared to MiniLM. With KB_PROJECTION set, a PCA (fitted on
+a sample of the build's embeddings) or a seeded random orthogonal projection
+maps every vector to KB_PROJECTION_DIM dimensions. The projection is stored
+in the collection metadata (and in frozen index / snapshot meta.json) and is
+applied to queries as well, together with a recall@k report that compares
+projected against full-dimensional search on the fit sample.
+
+Usage:
+    python -m src.rag.projection info   # show the live collection's projection and recall report
+"""
+
+import base64
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.utils.helpers import get_logger
+from src.rag.generations import collection_metadata
+
+logger = get_logger(__name__)
+
+PROJECTION_METHODS = ("pca", "random")
+
+
+def _encode(array: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(array, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def _decode(data: str, shape) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32).reshape(shape)
+
+
+class EmbeddingProjection:
+    """Linear projection y = (x - mean) @ components.T to a lower dimension."""
+
+    def __init__(self, method: str, mean: np.ndarray, components: np.ndarray, report: Optional[Dict] = None):
+        """
+        Args:
+            method: "pca" or "random"
+            mean: Vector subtracted before projecting (zeros for random projections)
+            components: Projection matrix, shape (target_dim, source_dim)
+            report: Recall report computed when the projection was fitted
+        """
+        self.method = method
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+        self.report = report or {}
+
+    @property
+    def source_dim(self) -> int:
+        return int(self.components.shape[1])
+
+    @property
+    def target_dim(self) -> int:
+        return int(self.components.shape[0])
+
+    @classmethod
+    def fit(cls, vectors, target_dim: int, method: str = "pca", seed: int = 0) -> "EmbeddingProjection":
+        """
+        Fit a projection on sample embeddings.
+
+        PCA needs at least `target_dim` samples; with fewer, a random
+        projection is used instead.
+
+        Args:
+            vectors: Sample embeddings, shape (n, source_dim)
+            target_dim: Output dimension
+            method: "pca" or "random"
+            seed: Seed for the random projection
+
+        Returns:
+            Fitted projection
+        """
+        if method not in PROJECTION_METHODS:
+            raise ValueError(f"Unknown projection method: {method}")
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        source_dim = matrix.shape[1]
+        if target_dim >= source_dim:
+            raise ValueError(f"Projection dim {target_dim} must be below the embedding dim {source_dim}")
+
+        if method == "pca" and matrix.shape[0] < target_dim:
+            logger.warning(
+                f"Only {matrix.shape[0]} samples to fit a {target_dim}-d PCA, using a random projection"
+            )
+            method = "random"
+
+        if method == "pca":
+            mean = matrix.mean(axis=0)
+            # Rows of vt are the principal axes, by decreasing variance
+            _, _, vt = np.linalg.svd(matrix - mean, full_matrices=False)
+            components = vt[:target_dim]
+        else:
+            mean = np.zeros(source_dim, dtype=np.float32)
+            gaussian = np.random.RandomState(seed).standard_normal((source_dim, target_dim))
+            q, _ = np.linalg.qr(gaussian)
+            components = q.T
+
+        projection = cls(method, mean, components)
+        projection.report = projection.recall_report(matrix)
+        return projection
+
+    def transform(self, vectors) -> np.ndarray:
+        """
+        Project embeddings (one vector or a matrix).
+
+        Args:
+            vectors: Embeddings with source_dim columns
+
+        Returns:
+            Projected float32 array with the same leading shape
+        """
+        array = np.asarray(vectors, dtype=np.float32)
+        return (array - self.mean) @ self.components.T
+
+    def recall_report(self, vectors, k: int = 10, max_queries: int = 200) -> Dict:
+        """
+        Recall@k of projected cosine search against full-dimensional search.
+
+        Each sample vector (up to max_queries) queries the rest of the sample.
+
+        Args:
+            vectors: Full-dimensional embeddings
+            k: Neighbours compared per query
+            max_queries: Maximum number of query vectors
+
+        Returns:
+            Dictionary with recall, k, query count and dimensions
+        """
+        full = np.asarray(vectors, dtype=np.float32)
+        n = full.shape[0]
+        k = min(k, n - 1)
+        if k <= 0:
+            return {"recall_at_k": None, "k": 0, "queries": 0,
+                    "source_dim": self.source_dim, "target_dim": self.target_dim}
+
+        def neighbours(matrix: np.ndarray, queries: np.ndarray) -> np.ndarray:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            normalized = matrix / np.where(norms == 0, 1.0, norms)
+            scores = normalized[queries] @ normalized.T
+            scores[np.arange(len(queries)), queries] = -np.inf  # Exclude the query itself
+            return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        queries = np.linspace(0, n - 1, min(n, max_queries)).astype(int)
+        exact = neighbours(full, queries)
+        approx = neighbours(self.transform(full), queries)
+        hits = sum(len(set(e) & set(a)) for e, a in zip(exact, approx))
+
+        return {
+            "recall_at_k": round(hits / (len(queries) * k), 4),
+            "k": int(k),
+            "queries": int(len(queries)),
+            "source_dim": self.source_dim,
+            "target_dim": self.target_dim
+        }
+
+    def to_metadata(self) -> Dict:
+        """Serialize for collection / meta.json storage."""
+        return {
+            "method": self.method,
+            "source_dim": self.source_dim,
+            "target_dim": self.target_dim,
+            "mean": _encode(self.mean),
+            "components": _encode(self.components),
+            "report": self.report
+        }
+
+    @classmethod
+    def from_metadata(cls, data: Dict) -> "EmbeddingProjection":
+        """Rebuild a projection stored with to_metadata()."""
+        return cls(
+            data["method"],
+            _decode(data["mean"], (data["source_dim"],)),
+            _decode(data["components"], (data["target_dim"], data["source_dim"])),
+            data.get("report")
+        )
+
+
+def sample_indices(count: int, samples: int) -> List[int]:
+    """Evenly spaced rows used to fit the projection (covers every source type)."""
+    if count <= 0:
+        return []
+    return sorted(set(np.linspace(0, count - 1, min(count, samples)).astype(int).tolist()))
+
+
+def projection_metadata(client, collection_name: str) -> Optional[Dict]:
+    """
+    Stored projection of a collection, alias or frozen index.
+
+    Args:
+        client: Qdrant client or FrozenIndex
+        collection_name: Collection or alias (ignored for a frozen index)
+
+    Returns:
+        Projection metadata, or None if vectors are full-dimensional
+    """
+    return collection_metadata(client, collection_name).get("projection")
+
+
+def load_projection(client, collection_name: str) -> Optional[EmbeddingProjection]:
+    """Load the projection stored with a collection, if any."""
+    data = projection_metadata(client, collection_name)
+    return EmbeddingProjection.from_metadata(data) if data else None
+
+
+if __name__ == "__main__":
+    from src.rag.client_factory import get_qdrant_client
+    from src.rag.shards import shard_aliases
+    from src.utils.config import QDRANT_COLLECTION_NAME, KB_SHARDING_ENABLED
+
+    client = get_qdrant_client()
+    name = next(iter(shard_aliases(QDRANT_COLLECTION_NAME).values())) if KB_SHARDING_ENABLED else QDRANT_COLLECTION_NAME
+    data = projection_metadata(client, name)
+    if not data:
+        print(f"'{name}' stores full-dimensional vectors (no projection)")
+    else:
+        print(json.dumps({key: data[key] for key in ("method", "source_dim", "target_dim", "report")}, indent=2))
@@ -2,7 +2,9 @@
 Retriever configuration for querying the knowledge base.
 """
 
-from typing import List, Dict
+import asyncio
+import time
+from typing import List, Dict, Optional
 from qdrant_client import QdrantClient
 
 try:
@@ -14,8 +16,10 @@ except ImportError:
         from langchain.docstore.document import Document
 
 from src.utils.helpers import get_logger
-from src.utils.config import TOP_K_RESULTS, QDRANT_HOST, QDRANT_PORT, QDRANT_API_KEY, QDRANT_COLLECTION_NAME
+from src.utils.config import TOP_K_RESULTS, RERANK_CANDIDATES, ENTITY_LOOKUP_ENABLED, QDRANT_HOST, QDRANT_PORT, QDRANT_API_KEY, QDRANT_COLLECTION_NAME
 from src.rag.knowledge_base import KnowledgeBase
+from src.rag.reranker import CrossEncoderReranker
+from src.rag.entity_extractor import get_entity_extractor, LOOKUP_FIELDS
 
 logger = get_logger(__name__)
 
@@ -25,29 +29,130 @@ class KnowledgeRetriever:
     Wrapper for retrieving relevant information from the knowledge base.
     """
     
-    def __init__(self, knowledge_base: 'KnowledgeBase', k: int = TOP_K_RESULTS):
+    def __init__(
+        self,
+        knowledge_base: 'KnowledgeBase',
+        k: int = TOP_K_RESULTS,
+        search_type: Optional[str] = None,
+        reranker: Optional[CrossEncoderReranker] = None,
+        rerank_candidates: int = RERANK_CANDIDATES,
+        entity_lookup: bool = ENTITY_LOOKUP_ENABLED
+    ):
         """
         Initialize the retriever.
         
         Args:
             knowledge_base: KnowledgeBase instance
             k: Number of documents to retrieve
+            search_type: "similarity" or "mmr" (defaults to SEARCH_TYPE config)
+            reranker: Optional cross-encoder reranking stage
+            rerank_candidates: First-stage candidates fetched when reranking
+            entity_lookup: Answer queries naming a code or part with a filtered lookup first
         """
         self.knowledge_base = knowledge_base
         self.k = k
+        self.search_type = search_type
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        self.entity_lookup = entity_lookup
     
-    def retrieve(self, query: str) -> List[Document]:
+    def _lookup_entities(self, query: str) -> Optional[Dict[str, List]]:
+        """Entities of a query that can be looked up by payload filter, or None."""
+        if not self.entity_lookup:
+            return None
+        entities = get_entity_extractor().extract(query)
+        return entities if any(entities[field] for field in LOOKUP_FIELDS) else None
+    
+    def _merge(self, exact: List[Document], docs: List[Document]) -> List[Document]:
+        """Exact lookup hits first, then semantic results that are not already included."""
+        seen = {doc.metadata.get("chunk_id") for doc in exact}
+        merged = exact + [doc for doc in docs if doc.metadata.get("chunk_id") not in seen]
+        return merged[:self.k]
+    
+    def _search(self, query: str, k: int, doc_types: Optional[List[str]] = None) -> List[Document]:
+        """Semantic search, restricted to doc_types when given (unrestricted if that finds nothing)."""
+        if doc_types:
+            docs = self.knowledge_base.search(query, k=k, search_type=self.search_type, doc_types=doc_types)
+            if docs:
+                return docs
+            logger.info(f"No {doc_types} documents found, searching all types")
+        return self.knowledge_base.search(query, k=k, search_type=self.search_type)
+    
+    async def _asearch(self, query: str, k: int, doc_types: Optional[List[str]] = None) -> List[Document]:
+        """Async version of _search()."""
+        if doc_types:
+            docs = await self.knowledge_base.asearch(query, k=k, search_type=self.search_type, doc_types=doc_types)
+            if docs:
+                return docs
+            logger.info(f"No {doc_types} documents found, searching all types")
+        return await self.knowledge_base.asearch(query, k=k, search_type=self.search_type)
+    
+    def retrieve(self, query: str, doc_types: Optional[List[str]] = None) -> List[Document]:
         """
         Retrieve relevant documents for a query.
         
         Args:
             query: Search query
+            doc_types: Restrict the semantic search to these document types (from the intent router)
             
         Returns:
             List of relevant documents
         """
         logger.info(f"Retrieving documents for query: '{query}'")
-        docs = self.knowledge_base.search(query, k=self.k)
+        
+        exact = []
+        entities = self._lookup_entities(query)
+        if entities:
+            exact = self.knowledge_base.lookup(query, k=self.k, entities=entities)
+            if len(exact) >= self.k:
+                logger.info(f"Answered by entity lookup ({len(exact)} documents)")
+                return exact
+        
+        if self.reranker is None:
+            docs = self._search(query, self.k, doc_types)
+        else:
+            start = time.perf_counter()
+            candidates = self._search(query, max(self.k, self.rerank_candidates), doc_types)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            docs = self.reranker.rerank(query, candidates, top_k=self.k, elapsed_ms=elapsed_ms)
+        
+        docs = self._merge(exact, docs)
+        logger.info(f"Retrieved {len(docs)} documents")
+        return docs
+    
+    async def aretrieve(self, query: str, doc_types: Optional[List[str]] = None) -> List[Document]:
+        """
+        Async version of retrieve().
+        
+        Args:
+            query: Search query
+            doc_types: Restrict the semantic search to these document types (from the intent router)
+            
+        Returns:
+            List of relevant documents
+        """
+        logger.info(f"Retrieving documents (async) for query: '{query}'")
+        
+        exact = []
+        entities = self._lookup_entities(query)
+        if entities:
+            exact = await self.knowledge_base.alookup(query, k=self.k, entities=entities)
+            if len(exact) >= self.k:
+                logger.info(f"Answered by entity lookup ({len(exact)} documents)")
+                return exact
+        
+        if self.reranker is None:
+            docs = await self._asearch(query, self.k, doc_types)
+        else:
+            start = time.perf_counter()
+            candidates = await self._asearch(query, max(self.k, self.rerank_candidates), doc_types)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            # Cross-encoder scoring is CPU-bound, keep it off the event loop
+            docs = await asyncio.to_thread(
+                self.reranker.rerank, query, candidates, self.k, elapsed_ms
+            )
+        
+        docs = self._merge(exact, docs)
         logger.info(f"Retrieved {len(docs)} documents")
         return docs
     
@@ -89,19 +194,44 @@ class KnowledgeRetriever:
         docs = self.retrieve(query)
         return self.format_context(docs)
 
-    def retrieve_with_sources(self, query: str) -> tuple[str, List[Dict]]:
+    def retrieve_with_sources(self, query: str, doc_types: Optional[List[str]] = None) -> tuple[str, List[Dict]]:
         """
         Retrieve documents and return formatted context with source metadata.
         
         Args:
             query: Search query
+            doc_types: Restrict the semantic search to these document types
             
         Returns:
             Tuple of (formatted_context, list_of_source_metadata)
         """
-        docs = self.retrieve(query)
-        context = self.format_context(docs)
+        docs = self.retrieve(query, doc_types)
+        return self.format_context(docs), self.build_sources(docs)
+    
+    async def aretrieve_with_sources(self, query: str, doc_types: Optional[List[str]] = None) -> tuple[str, List[Dict]]:
+        """
+        Async version of retrieve_with_sources().
         
+        Args:
+            query: Search query
+            doc_types: Restrict the semantic search to these document types
+            
+        Returns:
+            Tuple of (formatted_context, list_of_source_metadata)
+        """
+        docs = await self.aretrieve(query, doc_types)
+        return self.format_context(docs), self.build_sources(docs)
+    
+    def build_sources(self, docs: List[Document]) -> List[Dict]:
+        """
+        Build source metadata for display from retrieved documents.
+        
+        Args:
+            docs: Retrieved documents
+            
+        Returns:
+            List of source metadata dictionaries
+        """
         sources = []
         for doc in docs:
             metadata = doc.metadata or {}
@@ -134,10 +264,15 @@ class KnowledgeRetriever:
                 "title": title,
                 "type": source_type,
                 "page": metadata.get("page"),
-                "score": round(metadata.get("score", 0), 3)
+                "score": round(metadata.get("score") or 0, 3),
+                # Sources of near-duplicate chunks merged into this one at build time
+                "also_in": [
+                    duplicate.get("filename") or duplicate.get("source", "unknown")
+                    for duplicate in metadata.get("duplicate_sources", [])
+                ]
             })
             
-        return context, sources
+        return sources
     
     def get_base_retriever(self):
         """Get the underlying LangChain retriever."""
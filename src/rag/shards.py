@@ -0,0 +1,154 @@
+"""
+Per-source-type collection shards with parallel fan-out search.
+
+With KB_SHARDING_ENABLED, OBD codes, symptoms, repair guides and PDF manuals
+each live in their own collection (each behind its own generation alias,
+e.g. `automotive_knowledge_obd_codes`). The small structured shards stay in
+RAM with a tight HNSW graph, large manual shards can keep vectors and graph
+on disk. A search queries every shard concurrently and merges the hits by
+score, with optional per-shard quotas so manuals cannot crowd out the
+structured records.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from qdrant_client.models import Distance, VectorParams, HnswConfigDiff
+
+from src.utils.helpers import get_logger
+from src.utils.config import KB_SHARD_QUOTAS, KB_ON_DISK_SHARDS
+
+logger = get_logger(__name__)
+
+# Document "type" metadata -> shard name
+SHARD_BY_TYPE = {
+    "diagnostic_code": "obd_codes",
+    "symptom_diagnosis": "symptoms",
+    "repair_procedure": "repair_guides",
+    "manual": "manuals"
+}
+SHARDS = tuple(SHARD_BY_TYPE.values())
+DEFAULT_SHARD = "manuals"
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def shard_for(metadata: Dict) -> str:
+    """Shard a chunk belongs to (unknown types go with the manuals)."""
+    return SHARD_BY_TYPE.get(metadata.get("type"), DEFAULT_SHARD)
+
+
+def shard_alias(collection_name: str, shard: str) -> str:
+    """Alias name of a shard of a collection."""
+    return f"{collection_name}_{shard}"
+
+
+def shard_aliases(collection_name: str) -> Dict[str, str]:
+    """Shard name -> alias for every shard of a collection."""
+    return {shard: shard_alias(collection_name, shard) for shard in SHARDS}
+
+
+def shard_vectors_config(shard: str, dim: int) -> Dict:
+    """
+    Collection settings for a shard.
+
+    Args:
+        shard: Shard name
+        dim: Vector dimension
+
+    Returns:
+        Keyword arguments for create_collection
+    """
+    on_disk = shard in KB_ON_DISK_SHARDS
+    return {
+        "vectors_config": VectorParams(size=dim, distance=Distance.COSINE, on_disk=on_disk),
+        "hnsw_config": HnswConfigDiff(on_disk=on_disk) if on_disk else None
+    }
+
+
+def merge_by_score(results: Dict[str, list], limit: int, quotas: Optional[Dict[str, int]] = None) -> list:
+    """
+    Merge per-shard hits into one ranking.
+
+    Args:
+        results: Shard name -> scored points
+        limit: Number of points to return
+        quotas: Maximum points each shard may contribute while other shards
+            can fill the slots (defaults to KB_SHARD_QUOTAS)
+
+    Returns:
+        Points sorted by descending score
+    """
+    quotas = KB_SHARD_QUOTAS if quotas is None else quotas
+    merged, leftovers = [], []
+    for shard, points in results.items():
+        quota = quotas.get(shard, limit)
+        merged.extend(points[:quota])
+        leftovers.extend(points[quota:])
+    merged.sort(key=lambda point: point.score, reverse=True)
+    merged = merged[:limit]
+    # Slots the other shards could not fill go back to the capped shards
+    if len(merged) < limit:
+        leftovers.sort(key=lambda point: point.score, reverse=True)
+        merged.extend(leftovers[:limit - len(merged)])
+        merged.sort(key=lambda point: point.score, reverse=True)
+    return merged
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=len(SHARDS), thread_name_prefix="kb-shard")
+        return _executor
+
+
+def fan_out(query_shard: Callable[[str, str], list], aliases: Dict[str, str]) -> Dict[str, list]:
+    """
+    Run a query against every shard concurrently.
+
+    A shard that fails is logged and contributes no hits.
+
+    Args:
+        query_shard: Function (shard, alias) -> points
+        aliases: Shard name -> alias
+
+    Returns:
+        Shard name -> points
+    """
+    futures = {shard: _get_executor().submit(query_shard, shard, alias) for shard, alias in aliases.items()}
+    results = {}
+    for shard, future in futures.items():
+        try:
+            results[shard] = future.result()
+        except Exception as e:
+            logger.warning(f"Shard '{shard}' query failed: {e}")
+            results[shard] = []
+    return results
+
+
+async def afan_out(query_shard, aliases: Dict[str, str]) -> Dict[str, list]:
+    """
+    Async version of fan_out(); `query_shard` is a coroutine function.
+
+    Args:
+        query_shard: Coroutine function (shard, alias) -> points
+        aliases: Shard name -> alias
+
+    Returns:
+        Shard name -> points
+    """
+    outcomes = await asyncio.gather(
+        *(query_shard(shard, alias) for shard, alias in aliases.items()),
+        return_exceptions=True
+    )
+    results = {}
+    for shard, outcome in zip(aliases, outcomes):
+        if isinstance(outcome, Exception):
+            logger.warning(f"Shard '{shard}' query failed: {outcome}")
+            outcome = []
+        results[shard] = outcome
+    return results
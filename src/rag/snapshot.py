@@ -0,0 +1,325 @@
+"""
+Versioned, checksummed knowledge base snapshots for fast cold starts.
+
+A snapshot is a directory holding the flat index files used by the frozen
+index (vectors, payloads with page content, byte offsets), a DTC side index
+and a manifest with SHA-256 checksums and the embedding model identity.
+Importing never re-embeds anything: into the frozen index it is a streamed
+file copy that workers memory-map, and into Qdrant it is a batched upsert of
+the stored vectors.
+
+Usage:
+    python -m src.rag.snapshot export ./snapshots/kb-2025-12
+    python -m src.rag.snapshot verify ./snapshots/kb-2025-12
+    python -m src.rag.snapshot import ./snapshots/kb-2025-12 [--target qdrant|frozen] [--force]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from qdrant_client.models import Distance, VectorParams, PointStruct
+
+from src.utils.helpers import get_logger
+from src.utils.config import (
+    QDRANT_COLLECTION_NAME,
+    FROZEN_INDEX_PATH,
+    get_embedding_identity
+)
+from src.rag.frozen_index import (
+    WriterLock,
+    write_index_files,
+    scroll_collection,
+    publish_generation
+)
+from src.rag.entity_extractor import DTC_PATTERN, create_entity_indexes
+from src.rag.projection import projection_metadata
+from src.rag.generations import (
+    generation_collection_name,
+    next_generation,
+    validate_generation,
+    swap_alias,
+    garbage_collect_generations
+)
+
+logger = get_logger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 2  # 2: entity_index.json
+MANIFEST_FILE = "manifest.json"
+SNAPSHOT_FILES = ("vectors.npy", "offsets.npy", "payloads.jsonl", "entity_index.json", "meta.json", "dtc_index.json")
+
+
+def _sha256(path: Path, block_size: int = 1 << 20) -> str:
+    """Checksum a file without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_dtc_index(payloads: List[Dict]) -> Dict[str, List[int]]:
+    """
+    Map each diagnostic trouble code to the rows that mention it.
+
+    Args:
+        payloads: Point payloads, in row order
+
+    Returns:
+        Dictionary of code -> sorted row indices
+    """
+    index: Dict[str, set] = {}
+    for row, payload in enumerate(payloads):
+        codes = set(DTC_PATTERN.findall(str(payload.get("page_content", "")).upper()))
+        if payload.get("code"):
+            codes.add(str(payload["code"]).upper())
+        for code in codes:
+            index.setdefault(code, set()).add(row)
+    return {code: sorted(rows) for code, rows in sorted(index.items())}
+
+
+def export_snapshot(
+    client,
+    output_dir: Path,
+    collection_name: str = QDRANT_COLLECTION_NAME,
+    embedding_identity: Optional[str] = None
+) -> Path:
+    """
+    Export a collection (or alias) as a snapshot directory.
+
+    Args:
+        client: Qdrant client (or FrozenIndex-compatible scroll source)
+        output_dir: Snapshot directory to create (must not exist)
+        collection_name: Collection or alias to export
+        embedding_identity: Embedding model identity (defaults to the configured one)
+
+    Returns:
+        Path of the snapshot directory
+    """
+    output_dir = Path(output_dir)
+    if output_dir.exists():
+        raise FileExistsError(f"Snapshot directory already exists: {output_dir}")
+
+    embedding_identity = embedding_identity or get_embedding_identity()
+    ids, vectors, payloads = scroll_collection(client, collection_name)
+    logger.info(f"Exporting snapshot of '{collection_name}' ({len(ids)} points) to {output_dir}...")
+
+    staging = output_dir.with_name(f".{output_dir.name}.tmp")
+    if staging.exists():
+        shutil.rmtree(staging)
+
+    metadata = {"collection": collection_name, "embedding_identity": embedding_identity}
+    projection = projection_metadata(client, collection_name)
+    if projection:
+        metadata["projection"] = projection
+    meta = write_index_files(staging, ids, vectors, payloads, metadata)
+    with open(staging / "dtc_index.json", "w", encoding="utf-8") as f:
+        json.dump(build_dtc_index(payloads), f)
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "collection": collection_name,
+        "count": meta["count"],
+        "dim": meta["dim"],
+        "distance": "Cosine",
+        "embedding_identity": embedding_identity,
+        "files": {
+            name: {"sha256": _sha256(staging / name), "bytes": (staging / name).stat().st_size}
+            for name in SNAPSHOT_FILES
+        }
+    }
+    with open(staging / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    os.replace(staging, output_dir)
+    logger.info(f"✅ Snapshot exported: {output_dir} ({meta['count']} points, dim={meta['dim']})")
+    return output_dir
+
+
+def verify_snapshot(snapshot_dir: Path, expected_identity: Optional[str] = None, force: bool = False) -> Dict:
+    """
+    Check a snapshot's version, checksums and embedding model.
+
+    Args:
+        snapshot_dir: Snapshot directory
+        expected_identity: Embedding identity the snapshot must match (defaults to the configured one)
+        force: Accept a snapshot made with a different embedding model
+
+    Returns:
+        The snapshot manifest
+
+    Raises:
+        ValueError: If the snapshot is incompatible or corrupted
+    """
+    snapshot_dir = Path(snapshot_dir)
+    with open(snapshot_dir / MANIFEST_FILE, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported snapshot format {manifest.get('format_version')} "
+            f"(expected {SNAPSHOT_FORMAT_VERSION})"
+        )
+
+    for name, info in manifest["files"].items():
+        path = snapshot_dir / name
+        if not path.exists() or path.stat().st_size != info["bytes"] or _sha256(path) != info["sha256"]:
+            raise ValueError(f"Snapshot file {name} is missing or corrupted")
+
+    expected_identity = expected_identity or get_embedding_identity()
+    if manifest["embedding_identity"] != expected_identity:
+        message = (
+            f"Snapshot was embedded with '{manifest['embedding_identity']}' "
+            f"but this deployment uses '{expected_identity}'"
+        )
+        if not force:
+            raise ValueError(message)
+        logger.warning(f"{message} (forced)")
+
+    return manifest
+
+
+def _import_into_frozen(snapshot_dir: Path, base_dir: Path, manifest: Dict) -> str:
+    """Stream-copy the index files into a new frozen generation."""
+    base_dir = Path(base_dir)
+    with WriterLock(base_dir):
+        staging = base_dir / f".import-{os.getpid()}.tmp"
+        if staging.exists():
+            shutil.rmtree(staging)
+        staging.mkdir(parents=True)
+        for name in list(manifest["files"]) + [MANIFEST_FILE]:
+            shutil.copyfile(snapshot_dir / name, staging / name)
+        return publish_generation(staging, base_dir=base_dir).name
+
+
+def _import_into_qdrant(
+    snapshot_dir: Path,
+    client,
+    collection_name: str,
+    manifest: Dict,
+    batch_size: int = 256
+) -> str:
+    """Upsert the stored vectors into a new generation and swap it in."""
+    vectors = np.load(snapshot_dir / "vectors.npy", mmap_mode="r")
+    with open(snapshot_dir / "meta.json", encoding="utf-8") as f:
+        projection = json.load(f).get("projection")
+    target_collection = generation_collection_name(collection_name, next_generation(client, collection_name))
+
+    # Projected vectors keep their projection, so queries are reduced the same way
+    client.create_collection(
+        collection_name=target_collection,
+        vectors_config=VectorParams(size=manifest["dim"], distance=Distance.COSINE),
+        metadata={"embedding_identity": manifest["embedding_identity"], **({"projection": projection} if projection else {})}
+    )
+    create_entity_indexes(client, target_collection)
+
+    try:
+        with open(snapshot_dir / "payloads.jsonl", encoding="utf-8") as f:
+            batch: List[PointStruct] = []
+            for row, line in enumerate(f):
+                record = json.loads(line)
+                batch.append(PointStruct(id=record["id"], vector=vectors[row].tolist(), payload=record["payload"]))
+                if len(batch) >= batch_size:
+                    client.upsert(collection_name=target_collection, points=batch)
+                    batch = []
+            if batch:
+                client.upsert(collection_name=target_collection, points=batch)
+
+        validate_generation(
+            client,
+            target_collection,
+            expected_points=manifest["count"],
+            probe_vector=vectors[0].tolist() if manifest["count"] else None
+        )
+    except Exception:
+        client.delete_collection(target_collection)
+        raise
+
+    swap_alias(client, collection_name, target_collection)
+    garbage_collect_generations(client, collection_name, keep=target_collection)
+    return target_collection
+
+
+def import_snapshot(
+    snapshot_dir: Path,
+    target: str = "qdrant",
+    client=None,
+    collection_name: str = QDRANT_COLLECTION_NAME,
+    frozen_dir: Path = FROZEN_INDEX_PATH,
+    force: bool = False
+) -> str:
+    """
+    Restore a snapshot without re-embedding anything.
+
+    Args:
+        snapshot_dir: Snapshot directory
+        target: "qdrant" (new collection generation) or "frozen" (read-only workers)
+        client: Qdrant client for target="qdrant" (defaults to the shared client)
+        collection_name: Alias to point at the restored generation
+        frozen_dir: Frozen index directory for target="frozen"
+        force: Accept a snapshot made with a different embedding model
+
+    Returns:
+        Name of the restored collection or frozen generation
+    """
+    start = time.perf_counter()
+    snapshot_dir = Path(snapshot_dir)
+    manifest = verify_snapshot(snapshot_dir, force=force)
+
+    if target == "frozen":
+        restored = _import_into_frozen(snapshot_dir, frozen_dir, manifest)
+    elif target == "qdrant":
+        if client is None:
+            from src.rag.client_factory import get_qdrant_client
+            client = get_qdrant_client()
+        restored = _import_into_qdrant(snapshot_dir, client, collection_name, manifest)
+    else:
+        raise ValueError(f"Unknown snapshot import target: {target}")
+
+    logger.info(
+        f"✅ Snapshot restored into {target} '{restored}' "
+        f"({manifest['count']} points in {time.perf_counter() - start:.1f}s)"
+    )
+    return restored
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Knowledge base snapshot export/import")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export the live collection")
+    export_parser.add_argument("output_dir", type=Path)
+
+    verify_parser = subparsers.add_parser("verify", help="Verify checksums and embedding model")
+    verify_parser.add_argument("snapshot_dir", type=Path)
+    verify_parser.add_argument("--force", action="store_true", help="Ignore embedding model mismatch")
+
+    import_parser = subparsers.add_parser("import", help="Restore a snapshot")
+    import_parser.add_argument("snapshot_dir", type=Path)
+    import_parser.add_argument("--target", choices=["qdrant", "frozen"], default="qdrant")
+    import_parser.add_argument("--force", action="store_true", help="Ignore embedding model mismatch")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        from src.rag.client_factory import get_qdrant_client
+        path = export_snapshot(get_qdrant_client(), args.output_dir)
+        print(f"✅ Snapshot exported to {path}")
+    elif args.command == "verify":
+        manifest = verify_snapshot(args.snapshot_dir, force=args.force)
+        print(f"✅ Snapshot OK: {manifest['count']} points, {manifest['embedding_identity']}")
+    elif args.command == "import":
+        restored = import_snapshot(args.snapshot_dir, target=args.target, force=args.force)
+        print(f"✅ Snapshot restored: {restored}")
+
+
+if __name__ == "__main__":
+    main()
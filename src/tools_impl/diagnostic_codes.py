@@ -50,7 +50,9 @@ def search_diagnostic_code(code: str) -> Dict:
             # Fallback 1: Search in vector database (PDFs) for codes not in JSON
             logger.info(f"Code {code} not found in JSON, searching in vector database...")
             try:
-                from src.rag.knowledge_base import KnowledgeBase
+                from src.rag.knowledge_base import KnowledgeBase, build_in_progress
+                if build_in_progress():
+                    raise RuntimeError("knowledge base is still being built")
                 kb = KnowledgeBase()
                 search_results = kb.search(code, k=5)
                 
@@ -32,6 +32,13 @@ DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 # Embeddings Configuration
 EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "huggingface").lower()
 
+# HuggingFace embedding model (used when EMBEDDING_PROVIDER=huggingface)
+# English-only default; for Spanish queries against the English knowledge base use a
+# multilingual model such as sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2
+HUGGINGFACE_EMBEDDING_MODEL = os.getenv("HUGGINGFACE_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# Rebuild (blue-green) when the stored collection was embedded with a different model
+KB_AUTO_MIGRATE_EMBEDDINGS = os.getenv("KB_AUTO_MIGRATE_EMBEDDINGS", "true").lower() == "true"
+
 # LM Studio Configuration
 LMSTUDIO_BASE_URL = os.getenv("LMSTUDIO_BASE_URL", "http://localhost:8000")
 LMSTUDIO_EMBEDDING_MODEL = os.getenv("LMSTUDIO_EMBEDDING_MODEL", "nomic-embed-text")
@@ -43,6 +50,19 @@ QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME", "automotive_knowled
 QDRANT_HOST = os.getenv("QDRANT_HOST", None)  # None = use local file storage
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", None)
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "False").lower() == "true"
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "10"))  # Seconds per request (remote only)
+QDRANT_POOL_SIZE = int(os.getenv("QDRANT_POOL_SIZE", "8"))  # Max HTTP connections / gRPC channels
+
+# Frozen read-only index (multi-process serving of the local knowledge base)
+KB_READ_ONLY = os.getenv("KB_READ_ONLY", "False").lower() == "true"  # Workers: search the frozen index
+FROZEN_INDEX_EXPORT = os.getenv("FROZEN_INDEX_EXPORT", "False").lower() == "true"  # Writer: export after build
+FROZEN_INDEX_PATH = Path(os.getenv("FROZEN_INDEX_PATH", "./qdrant_frozen"))
+FROZEN_INDEX_KEEP_GENERATIONS = int(os.getenv("FROZEN_INDEX_KEEP_GENERATIONS", "2"))
+
+# Knowledge base snapshot restored on first start instead of building (fast cold starts)
+KB_SNAPSHOT_PATH = os.getenv("KB_SNAPSHOT_PATH", None)
 
 # Project Paths
 DATA_DIR = BASE_DIR / "data"
@@ -54,6 +74,8 @@ OBD_CODES_PATH = KNOWLEDGE_BASE_DIR / "obd_codes.json"
 SYMPTOMS_PATH = KNOWLEDGE_BASE_DIR / "common_symptoms.json"
 REPAIR_GUIDES_PATH = KNOWLEDGE_BASE_DIR / "repair_guides.txt"
 PDF_DOCS_PATH = KNOWLEDGE_BASE_DIR / "pdfs"
+EVAL_DIR = DATA_DIR / "eval"
+BILINGUAL_EVAL_PATH = EVAL_DIR / "bilingual_retrieval.json"
 
 # Mock Data Files
 PARTS_CATALOG_PATH = MOCK_DATA_DIR / "parts_catalog.json"
@@ -65,6 +87,103 @@ CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
 TOP_K_RESULTS = 3
 
+# Knowledge base build (embedded and upserted in batches, checkpointed per batch)
+KB_BUILD_BATCH_SIZE = int(os.getenv("KB_BUILD_BATCH_SIZE", "64"))
+KB_BUILD_CHECKPOINT_FILE = "build_checkpoint.json"  # Stored in QDRANT_PATH
+
+# Near-duplicate chunks (MinHash estimated Jaccard >= threshold) are merged before embedding
+KB_DEDUP_ENABLED = os.getenv("KB_DEDUP_ENABLED", "true").lower() == "true"
+KB_DEDUP_THRESHOLD = float(os.getenv("KB_DEDUP_THRESHOLD", "0.85"))
+KB_DEDUP_NUM_PERM = int(os.getenv("KB_DEDUP_NUM_PERM", "128"))
+
+# Optional dimensionality reduction of stored and query embeddings: "" (off), "pca" or "random"
+KB_PROJECTION = os.getenv("KB_PROJECTION", "").lower()
+KB_PROJECTION_DIM = int(os.getenv("KB_PROJECTION_DIM", "256"))
+KB_PROJECTION_FIT_SAMPLES = int(os.getenv("KB_PROJECTION_FIT_SAMPLES", "2048"))
+
+# One collection per source type (OBD codes, symptoms, repair guides, manuals), searched in parallel
+KB_SHARDING_ENABLED = os.getenv("KB_SHARDING_ENABLED", "false").lower() == "true"
+# Max results a shard may contribute to a merged search, e.g. "manuals:2"
+KB_SHARD_QUOTAS = {
+    shard.strip(): int(quota)
+    for shard, _, quota in (item.partition(":") for item in os.getenv("KB_SHARD_QUOTAS", "manuals:2").split(","))
+    if shard.strip() and quota.strip()
+}
+# Shards whose vectors and HNSW graph are kept on disk instead of RAM
+KB_ON_DISK_SHARDS = {s.strip() for s in os.getenv("KB_ON_DISK_SHARDS", "manuals").split(",") if s.strip()}
+
+# Queries naming a trouble code or catalog part are answered by a filtered payload lookup first
+ENTITY_LOOKUP_ENABLED = os.getenv("ENTITY_LOOKUP_ENABLED", "true").lower() == "true"
+# Maximum tagged chunks per shard ranked by a lookup (scrolled in pages until exhausted or capped)
+ENTITY_LOOKUP_SCAN_LIMIT = int(os.getenv("ENTITY_LOOKUP_SCAN_LIMIT", "2048"))
+
+# Web UI sessions: each browser session has its own conversation on a shared agent
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "500"))  # Least recently used evicted beyond this
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "1800"))  # Seconds without a message
+# Chat requests served concurrently (async handlers: they mostly wait on the LLM)
+SESSION_CONCURRENCY = int(os.getenv("SESSION_CONCURRENCY", "256"))
+
+# Conversation memory: recent turns verbatim, older ones folded into a rolling summary
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1500"))  # Approximate tokens of history per prompt
+MEMORY_MIN_RECENT_TURNS = int(os.getenv("MEMORY_MIN_RECENT_TURNS", "2"))  # Always kept verbatim
+# "llm" (summarized in the background, off the response path) or "extractive" (no extra LLM call)
+MEMORY_SUMMARY_MODE = os.getenv("MEMORY_SUMMARY_MODE", "llm").lower()
+
+# Intent router: minimum score to search only one intent's document types; less confident
+# messages search the whole knowledge base (only greetings, thanks and prices skip retrieval)
+INTENT_ROUTER_MIN_SCORE = float(os.getenv("INTENT_ROUTER_MIN_SCORE", "0.9"))
+
+# Messages naming one trouble code and one vehicle run the code/issues/parts/cost tools
+# directly and make a single LLM call; less confident matches use the full agent
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+FAST_PATH_MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.8"))  # 0-1
+FAST_PATH_MAX_CHARS = int(os.getenv("FAST_PATH_MAX_CHARS", "280"))  # Longer messages use the agent
+
+# Agent: "react" (text Thought/Action protocol), "tools" (native function calling with typed
+# tool schemas) or "auto" (function calling for models OpenRouter lists as supporting tools)
+AGENT_MODE = os.getenv("AGENT_MODE", "auto").lower()
+
+# Independent tool calls requested in one ReAct step run concurrently on a bounded pool
+PARALLEL_TOOLS_ENABLED = os.getenv("PARALLEL_TOOLS_ENABLED", "true").lower() == "true"
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "8"))
+
+# Fix near-miss ReAct output (translated keywords, misspelled tool names, inline inputs)
+# locally instead of sending a parsing error back to the LLM
+OUTPUT_REPAIR_ENABLED = os.getenv("OUTPUT_REPAIR_ENABLED", "true").lower() == "true"
+
+# Repeated tool calls (same tool and input) are answered from the earlier observation with a
+# corrective hint; after LOOP_GUARD_MAX_REPEATS repeats the agent is made to answer
+LOOP_GUARD_ENABLED = os.getenv("LOOP_GUARD_ENABLED", "true").lower() == "true"
+LOOP_GUARD_MAX_REPEATS = int(os.getenv("LOOP_GUARD_MAX_REPEATS", "2"))
+
+# Speculative retrieval and code / known-issue lookups started when a message arrives
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "4"))
+# How long the agent's first LLM call waits for knowledge base context before starting without
+# it; late context is attached to the first tool observation instead. Only routes that retrieve
+# wait, and fast path turns never do (their tool chain runs while retrieval finishes)
+KB_PREFETCH_WAIT_MS = float(os.getenv("KB_PREFETCH_WAIT_MS", "400"))
+
+# Retrieval strategy: "similarity" (plain top-k) or "mmr" (diverse top-k)
+SEARCH_TYPE = os.getenv("SEARCH_TYPE", "similarity").lower()
+MMR_FETCH_K = int(os.getenv("MMR_FETCH_K", "20"))  # Candidates fetched before MMR re-selection
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.5"))  # 1.0 = pure relevance, 0.0 = pure diversity
+
+# Cross-encoder reranking (optional second stage, CPU)
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "False").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "10"))  # First-stage candidates to rerank
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "4096"))
+RERANK_LATENCY_BUDGET_MS = float(os.getenv("RERANK_LATENCY_BUDGET_MS", "300"))
+
+def get_embedding_identity() -> str:
+    """Identify the configured embedding provider and model (stored with builds and snapshots)."""
+    if EMBEDDING_PROVIDER == "lmstudio":
+        return f"LMStudioEmbeddings:{LMSTUDIO_EMBEDDING_MODEL}"
+    return f"HuggingFaceEmbeddings:{HUGGINGFACE_EMBEDDING_MODEL}"
+
+
 # Validation
 def validate_config():
     """Validate that required configuration is present."""
@@ -10,10 +10,11 @@ import logging
 logger = logging.getLogger(__name__)
 
 try:
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI
 except ImportError:
     logger.warning("openai package not installed. Install with: pip install openai")
     OpenAI = None
+    AsyncOpenAI = None
 
 
 class LMStudioEmbeddings:
@@ -70,6 +71,9 @@ class LMStudioEmbeddings:
             api_key=self.api_key
         )
         
+        # Async client is created on first async call
+        self._async_client = None
+        
         # Verify connection
         self._verify_connection()
     
@@ -168,6 +172,61 @@ class LMStudioEmbeddings:
             logger.error(f"Error in embed_query: {e}")
             raise
     
+    @property
+    def async_client(self) -> "AsyncOpenAI":
+        """Async OpenAI client pointing to LM Studio (created on demand)"""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                base_url=f"{self.base_url}/v1",
+                api_key=self.api_key
+            )
+        return self._async_client
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Async version of embed_documents (single batched request)
+        
+        Args:
+            texts: List of text strings to embed
+            
+        Returns:
+            List of embedding vectors (each is a list of floats)
+        """
+        if not texts:
+            return []
+        
+        try:
+            response = await self.async_client.embeddings.create(
+                model=self.model,
+                input=texts
+            )
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        
+        except Exception as e:
+            logger.error(f"Error in aembed_documents: {e}")
+            raise
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        Async version of embed_query
+        
+        Args:
+            text: Query text to embed
+            
+        Returns:
+            Embedding vector (list of floats)
+        """
+        try:
+            response = await self.async_client.embeddings.create(
+                model=self.model,
+                input=text
+            )
+            return response.data[0].embedding
+        
+        except Exception as e:
+            logger.error(f"Error in aembed_query: {e}")
+            raise
+    
     @property
     def embedding_dim(self) -> int:
         """Get dimension of embeddings"""
@@ -74,6 +74,14 @@ class ModelManager:
             self.failed_models.add(model_id)
             self.current_model_index += 1
 
+    def supports_tools(self, model_id: str) -> bool:
+        """Whether OpenRouter lists tool calling among the model's supported parameters."""
+        return any(
+            "tools" in (model.get("supported_parameters") or [])
+            for model in self.available_models
+            if model.get("id") == model_id
+        )
+
     def get_current_model_name(self) -> str:
         """Get human readable name of current model."""
         if self.current_model_index < len(self.available_models):
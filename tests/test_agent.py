@@ -11,6 +11,42 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 
+@pytest.fixture
+def make_agent(monkeypatch):
+    """
+    Build MechanicAgent through __init__ without OpenRouter or a knowledge base.
+
+    ModelManager lists one model (with or without tool calling), ChatOpenAI
+    returns the given fake model and the knowledge base loader never starts.
+    """
+    from src.agent import mechanic_agent
+    from src.rag.knowledge_base import KnowledgeBaseLoader
+
+    def build(llm, tools=False, fast_path=None, retriever=None):
+        model = {"id": "with-tools" if tools else "text-only",
+                 "supported_parameters": ["temperature", "tools"] if tools else ["temperature"]}
+
+        class _ModelManager(mechanic_agent.ModelManager):
+            def _refresh_models(self):
+                self.available_models = [model]
+                self.failed_models.clear()
+                self.current_model_index = 0
+
+        monkeypatch.setattr(mechanic_agent, "ModelManager", _ModelManager)
+        monkeypatch.setattr(mechanic_agent, "ChatOpenAI", lambda **kwargs: llm)
+        monkeypatch.setattr(mechanic_agent, "OPENROUTER_API_KEY", "test-key")
+        monkeypatch.setattr(mechanic_agent, "AGENT_MODE", "auto")
+        monkeypatch.setattr(mechanic_agent, "start_knowledge_base_loader", lambda rebuild=False: KnowledgeBaseLoader())
+
+        agent = mechanic_agent.MechanicAgent(verbose=False)
+        if fast_path is not None:
+            agent.fast_path = fast_path
+        agent.retriever = retriever
+        return agent
+
+    return build
+
+
 def test_agent_imports():
     """Test that agent modules can be imported."""
     try:
@@ -42,6 +78,667 @@ def test_tools_available():
         assert expected_tool in tool_names, f"Tool {expected_tool} not found"
 
 
+def test_intent_router_picks_retrieval_strategy():
+    """Test multilingual intent routing and its latency."""
+    import time
+    from src.agent.intent_router import IntentRouter, AhoCorasick
+    
+    matches = AhoCorasick({"ruido": ("symptom", 1.0), "chirri*": ("symptom", 1.0), "mil": ("code", 1.0)}).find(
+        "ruido chirriante, similar"
+    )
+    assert sorted(word for word, _, _ in matches) == ["chirri", "ruido"]
+    
+    router = IntentRouter()
+    expected = {
+        "ruido chirriante al frenar": "symptom_search",
+        "The car is leaking coolant": "symptom_search",
+        "¿Qué significa el código P0420?": "code_lookup",
+        "P0171": "code_lookup",
+        "¿Cómo cambio las pastillas de freno?": "repair_guide_search",
+        "Wiring diagram in the service manual": "manual_search",
+        "Hola, buenos días": "none",
+        "¿Cuánto cuesta el presupuesto?": "none",
+    }
+    for message, intent in expected.items():
+        assert router.route(message).intent == intent, message
+    
+    decision = router.route("ruido chirriante al frenar")
+    assert decision.doc_types == ["symptom_diagnosis"] and decision.needs_retrieval
+    assert router.route("gracias").doc_types is None
+    
+    # Every message the old keyword list sent to the knowledge base still retrieves
+    old_keywords = ["code", "P0", "symptom", "noise", "leak", "problem", "issue", "manual", "guide", "pdf",
+                    "código", "síntoma", "ruido", "fuga", "problema", "asunto", "sintoma", "barulho",
+                    "vazamento", "symptôme", "bruit", "fuite", "problème", "manuel"]
+    old_matches = [f"Hola, tengo un {keyword} con mi coche" for keyword in old_keywords] + [
+        "I have a problem with my brakes", "Tengo un problema con el embrague", "There is an issue with the clutch",
+        "Is there a guide for this?", "¿Tienes el PDF?", "P0301 after rain", "Gracias, pero sigue el ruido",
+    ]
+    for message in old_matches:
+        assert any(keyword.lower() in message.lower() for keyword in old_keywords), message
+        assert router.route(message).needs_retrieval, message
+    # Paraphrases no intent is confident about search the whole knowledge base
+    for message in ["Mi coche pierde aceite", "My brakes feel spongy", "The transmission slips",
+                    "my car pulls left when braking", "el aire acondicionado no enfría", "luz de avería"]:
+        decision = router.route(message)
+        assert decision.needs_retrieval and (decision.intent != "general_search" or decision.doc_types is None), message
+    assert not router.route("ok perfecto").needs_retrieval
+    
+    start = time.perf_counter()
+    for _ in range(200):
+        router.route("Tengo un Toyota Corolla 2018 con el código P0420 y ruido al frenar")
+    assert (time.perf_counter() - start) / 200 < 0.001
+
+
+def test_prefetch_overlaps_retrieval_with_first_call(monkeypatch):
+    """Test that lookups start with the message and tools wait on them only when used."""
+    import json
+    import threading
+    from src.agent import tools
+    from src.agent.prefetch import Prefetch, KB_CONTEXT_HEADER
+    
+    released = threading.Event()
+    
+    def slow_retrieve():
+        released.wait(5)
+        return "brake pad wear indicator", [{"title": "Symptom: Squealing brakes"}]
+    
+    prefetch = Prefetch.start("Toyota Corolla 2018 con P0420 y ruido al frenar", slow_retrieve)
+    assert set(prefetch.codes) == {"P0420"}
+    assert ("toyota", "corolla", 2018) in prefetch.issues
+    # Retrieval overran the wait budget: its context goes to the first tool observation
+    assert prefetch.take_kb_context(timeout=0) == ""
+    
+    monkeypatch.setattr(tools, "search_diagnostic_code", lambda code: pytest.fail("code looked up twice"))
+    token = prefetch.activate()
+    try:
+        released.set()
+        observation = tools.diagnostic_code_tool.func("P0420")
+    finally:
+        Prefetch.deactivate(token)
+    
+    result, context = observation.split(f"\n\n{KB_CONTEXT_HEADER}\n")
+    assert json.loads(result)["code"] == "P0420"
+    assert context == "brake pad wear indicator"
+    assert prefetch.sources[0]["title"] == "Symptom: Squealing brakes"
+    # The context is handed out once
+    assert prefetch.take_kb_context() == ""
+
+
+def test_kb_context_reaches_prompt_when_agent_answers_without_tools(make_agent):
+    """Test that routed knowledge base context is in the first prompt and its sources are reported."""
+    import time
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    
+    class _RecordingModel(FakeListChatModel):
+        prompts: list = []
+        
+        def _call(self, messages, *args, **kwargs):
+            self.prompts.append(messages[-1].content)
+            return super()._call(messages, *args, **kwargs)
+    
+    class _Retriever:
+        def retrieve_with_sources(self, query, doc_types=None):
+            time.sleep(0.05)  # A real search is not instantaneous
+            return "Brake pads worn below 3mm squeal", [{"title": "Symptom: Squealing brakes"}]
+    
+    agent = make_agent(_RecordingModel(responses=["Thought: lo sé\nFinal Answer: Revisa las pastillas."]),
+                       retriever=_Retriever())
+    
+    result = agent.chat("El auto hace un ruido chirriante al frenar")
+    assert result["response"] == "Revisa las pastillas." and result["steps"] == []
+    assert "Brake pads worn below 3mm squeal" in agent.llm.prompts[0]
+    assert result["sources"] == [{"title": "Symptom: Squealing brakes"}]
+
+
+def test_session_manager_isolates_and_evicts_sessions():
+    """Test per-session memory on a shared agent, the session cap and idle eviction."""
+    from src.agent.mechanic_agent import MechanicAgent
+    from src.agent.session_manager import SessionManager
+    
+    class _SharedAgent:
+        created = 0
+        llm = None
+        new_session = MechanicAgent.new_session
+        
+        def __init__(self):
+            _SharedAgent.created += 1
+        
+        def chat(self, message, session=None):
+            session.memory.save_context({"input": message}, {"output": f"echo {message}"})
+            return {"response": f"echo {message}", "history": len(session.memory.chat_memory.messages)}
+        
+        def reset_conversation(self, session=None):
+            session.memory.clear()
+    
+    manager = SessionManager(agent_factory=_SharedAgent, max_sessions=2, idle_timeout=60)
+    assert manager.chat("alice", "P0420")["history"] == 2
+    assert manager.chat("bob", "ruido al frenar")["history"] == 2
+    assert manager.chat("alice", "¿y el precio?")["history"] == 4
+    assert _SharedAgent.created == 1
+    
+    # Cap reached: the least recently used session (bob) makes room
+    manager.chat("carol", "hola")
+    assert len(manager) == 2
+    assert manager.chat("bob", "otra vez")["history"] == 2
+    
+    manager.reset("bob")
+    assert manager.get_session("bob").memory.chat_memory.messages == []
+    
+    manager.idle_timeout = 0
+    manager.get_session("dave")
+    assert manager.stats()["live_sessions"] == 1
+
+
+def test_achat_serves_concurrent_sessions_on_one_loop(make_agent, monkeypatch):
+    """Test that achat runs conversations concurrently with ainvoke and async tools."""
+    import asyncio
+    import time
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from src.agent import tools
+    
+    class _Executor:
+        async def ainvoke(self, inputs):
+            await asyncio.sleep(0.1)  # Waiting on the LLM
+            observation = await tools.diagnostic_code_tool.coroutine("P0420")
+            return {"output": inputs["input"].split("\n")[0], "intermediate_steps": [], "observation": observation}
+    
+    class _Retriever:
+        async def aretrieve_with_sources(self, query, doc_types=None):
+            return "catalytic converter efficiency", [{"title": "OBD Code P0420"}]
+    
+    agent = make_agent(FakeListChatModel(responses=["unused"]), retriever=_Retriever())
+    monkeypatch.setattr(agent, "_executor_for", lambda session: _Executor())
+    sessions = [agent.new_session(f"s{i}") for i in range(50)]
+    
+    async def run_all():
+        return await asyncio.gather(*(
+            agent.achat(f"Código P0420 sesión {i}", session=session) for i, session in enumerate(sessions)
+        ))
+    
+    start = time.perf_counter()
+    results = asyncio.run(run_all())
+    assert time.perf_counter() - start < 2.5  # 50 x 0.1s sequentially would be 5s
+    assert [r["response"] for r in results] == [f"Código P0420 sesión {i}" for i in range(50)]
+    assert all(r["success"] and r["intent"] == "code_lookup" for r in results)
+    assert results[0]["sources"] == [{"title": "OBD Code P0420"}]
+
+
+def test_session_guard_serializes_async_turns_and_reset(make_agent, monkeypatch):
+    """Test that a reset waits for the session's in-flight async turn instead of clearing it mid-turn."""
+    import asyncio
+    import threading
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    
+    events = []
+    
+    class _Executor:
+        delay = 0.2
+        
+        def __init__(self, memory):
+            self.memory = memory
+        
+        async def ainvoke(self, inputs):
+            events.append(f"start {inputs['input']}")
+            await asyncio.sleep(self.delay)
+            await self.memory.asave_context({"input": inputs["input"]}, {"output": "ok"})
+            events.append(f"end {inputs['input']}")
+            return {"output": "ok", "intermediate_steps": []}
+    
+    agent = make_agent(FakeListChatModel(responses=["unused"]))
+    monkeypatch.setattr(agent, "_executor_for", lambda session: _Executor(session.memory))
+    session = agent.new_session("s")
+    
+    async def run():
+        turn = asyncio.create_task(agent.achat("hola, ruido al frenar", session=session))
+        await asyncio.sleep(0.05)
+        reset = asyncio.get_running_loop().run_in_executor(None, agent.reset_conversation, session)
+        await asyncio.gather(turn, reset)
+        events.append("reset done")
+        # A turn waiting on the guard does not block the loop, and a cancelled wait leaves it free
+        async with session.alocked():
+            waiter = asyncio.create_task(agent.achat("otra", session=session))
+            await asyncio.sleep(0.05)
+            waiter.cancel()
+        async with session.alocked():
+            pass
+        
+        # Turns queued behind a synchronous turn wait on the loop, not on a thread each,
+        # and run in arrival order
+        _Executor.delay = 0
+        session.lock.acquire()
+        threads = threading.active_count()
+        queued = [asyncio.create_task(agent.achat(f"turno {i}", session=session)) for i in range(10)]
+        await asyncio.sleep(0.1)
+        assert threading.active_count() == threads
+        session.lock.release()
+        await asyncio.gather(*queued)
+    
+    asyncio.run(run())
+    assert events[:3] == ["start hola, ruido al frenar", "end hola, ruido al frenar", "reset done"]
+    assert [e for e in events[3:] if e.startswith("start")] == [f"start turno {i}" for i in range(10)]
+    assert len(session.memory.chat_memory.messages) == 20 and not session.lock.locked()
+
+
+def test_astream_chat_yields_tool_steps_and_answer_tokens(make_agent):
+    """Test streaming of tool events and final answer tokens through a real ReAct executor."""
+    import asyncio
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+    from src.agent.streaming import FinalAnswerFilter
+    
+    answer_filter = FinalAnswerFilter()
+    assert [answer_filter.feed(t) for t in ["Thought: ok\nFinal Ans", "wer: ", "El ", "catalizador"]] == ["", "", "El ", "catalizador"]
+    
+    agent = make_agent(GenericFakeChatModel(messages=iter([
+        AIMessage(content="Thought: busco el código\nAction: search_diagnostic_code\nAction Input: P0420"),
+        AIMessage(content="Thought: ya lo sé\nFinal Answer: El catalizador está por debajo del umbral."),
+    ])))
+    
+    async def collect():
+        return [event async for event in agent.astream_chat("Tengo el código P0420")]
+    
+    events = asyncio.run(collect())
+    kinds = [event["type"] for event in events]
+    assert kinds[:3] == ["route", "tool_start", "tool_end"] and kinds[-1] == "done"
+    assert events[1]["tool"] == "search_diagnostic_code" and events[1]["tool_input"] == "P0420"
+    assert '"code": "P0420"' in events[2]["observation"]
+    
+    result = events[-1]["result"]
+    assert result["success"] and result["steps"][0]["tool"] == "search_diagnostic_code"
+    assert "".join(e["text"] for e in events if e["type"] == "token") == result["response"]
+    assert result["response"] == "El catalizador está por debajo del umbral."
+    # Only the raw message and the answer were saved to the session memory
+    human, ai = agent.memory.chat_memory.messages
+    assert human.content == "Tengo el código P0420" and ai.content == result["response"]
+
+
+def test_parallel_tool_calls_run_concurrently_in_one_step():
+    """Test that several actions in one ReAct step run concurrently and cost one LLM turn."""
+    import asyncio
+    import time
+    from langchain.tools import Tool
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from src.agent.parallel_tools import ParallelZeroShotAgent, ParallelAgentExecutor, tool_call_stats
+    from src.agent.prefetch import async_tool
+    
+    def slow(name):
+        def lookup(tool_input):
+            time.sleep(0.3)
+            return f"{name} result for {tool_input}"
+        return Tool(name=name, description=name, func=lookup, coroutine=async_tool(lookup))
+    
+    tools = [slow("search_diagnostic_code"), slow("query_known_issues")]
+    
+    def executor():
+        llm = FakeListChatModel(responses=[
+            "Thought: both are independent\nAction: search_diagnostic_code\nAction Input: P0420\n"
+            "Action: query_known_issues\nAction Input: Toyota Corolla 2018",
+            "Thought: done\nFinal Answer: Catalizador."
+        ])
+        agent = ParallelZeroShotAgent.from_llm_and_tools(llm, tools)
+        return ParallelAgentExecutor.from_agent_and_tools(agent=agent, tools=tools, return_intermediate_steps=True)
+    
+    for run in (lambda e: e.invoke({"input": "P0420 Corolla"}), lambda e: asyncio.run(e.ainvoke({"input": "P0420 Corolla"}))):
+        react = executor()
+        start = time.perf_counter()
+        result = run(react)
+        assert time.perf_counter() - start < 0.55  # Sequentially 0.6s
+        steps = result["intermediate_steps"]
+        assert [(a.tool, a.tool_input) for a, _ in steps] == [
+            ("search_diagnostic_code", "P0420"), ("query_known_issues", "Toyota Corolla 2018")
+        ]
+        assert tool_call_stats(steps) == {"tool_calls": 2, "tool_turns": 1, "parse_errors": 0}
+        assert result["output"] == "Catalizador."
+    
+    scratchpad = react.agent._construct_scratchpad(steps)
+    assert "Observation: [search_diagnostic_code] search_diagnostic_code result for P0420" in scratchpad
+    assert scratchpad.endswith("Toyota Corolla 2018\nThought:")
+
+
+def test_output_parser_repairs_malformed_react_output_locally():
+    """Test that near-miss ReAct output is repaired and only ambiguous output escalates."""
+    import pytest
+    from langchain_core.agents import AgentAction, AgentFinish
+    from langchain_core.exceptions import OutputParserException
+    from src.agent.output_parser import TolerantOutputParser
+    
+    parser = TolerantOutputParser(tool_names=["search_diagnostic_code", "query_known_issues"])
+    
+    def action(text):
+        result = parser.parse(text)
+        assert isinstance(result, AgentAction)
+        return result.tool, result.tool_input
+    
+    assert action("Pensamiento: busco el código\n**Acción:** search_diagnostic_code\n**Entrada de acción:** P0420") \
+        == ("search_diagnostic_code", "P0420")
+    assert action('Thought: x\nAction: "serch_diagnostic_code"\nAction Input: P0420') == ("search_diagnostic_code", "P0420")
+    assert action("Thought: x\nAction: search_diagnostic_code(P0420)") == ("search_diagnostic_code", "P0420")
+    assert action("Thought: x\nAction: query_known_issues\nToyota Corolla 2018") == ("query_known_issues", "Toyota Corolla 2018")
+    
+    batch = parser.parse("Thought: x\nAction: search_diagnostic_code(P0420)\nAcción: query_known_issues(Toyota Corolla)")
+    assert [(a.tool, a.tool_input) for a in batch] == [("search_diagnostic_code", "P0420"), ("query_known_issues", "Toyota Corolla")]
+    
+    # The answer is kept as written (including its own "Acción:" lines); protocol text after it is dropped
+    finish = parser.parse("Thought: listo\nRespuesta final: Revisar el catalizador.\n**Acción:** reemplazarlo\nThought: más")
+    assert isinstance(finish, AgentFinish)
+    assert finish.return_values["output"] == "Revisar el catalizador.\n**Acción:** reemplazarlo"
+    
+    # Ambiguous output still goes back to the model
+    with pytest.raises(OutputParserException):
+        parser.parse("Thought: I should look up the code first")
+    with pytest.raises(OutputParserException):
+        parser.parse("Thought: x\nAction: check_the_wiring\n\nObservation: ")
+
+
+def test_loop_guard_stops_repeated_tool_calls():
+    """Test that repeated tool calls are answered from cache and end with a forced final answer."""
+    import asyncio
+    from langchain.tools import Tool
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from src.agent.parallel_tools import ParallelZeroShotAgent, ParallelAgentExecutor
+    from src.agent.streaming import root_output
+    
+    calls = []
+    tools = [Tool(name="search_diagnostic_code", description="code", func=lambda code: calls.append(code) or f"{code}: catalyst")]
+    
+    def executor():
+        repeat = "Thought: look it up\nAction: search_diagnostic_code\nAction Input: P0420"
+        llm = FakeListChatModel(responses=[repeat, repeat, 'Thought: again\nAction: search_diagnostic_code\nAction Input: "p0420"',
+                                           "Final Answer: Catalizador."])
+        agent = ParallelZeroShotAgent.from_llm_and_tools(llm, tools)
+        return ParallelAgentExecutor.from_agent_and_tools(
+            agent=agent, tools=tools, max_iterations=20, return_intermediate_steps=True, max_repeats=2
+        )
+    
+    async def stream_events(executor):
+        outputs = [root_output(event) async for event in executor.astream_events({"input": "P0420"}, version="v2")]
+        return [output for output in outputs if output][-1]
+    
+    runs = (
+        lambda e: e.invoke({"input": "P0420"}),
+        lambda e: asyncio.run(e.ainvoke({"input": "P0420"})),
+        # The step iterator behind stream/astream_events never calls _call/_acall
+        lambda e: [chunk for chunk in e.stream({"input": "P0420"}) if "output" in chunk][-1],
+        lambda e: asyncio.run(stream_events(e)),
+    )
+    for run in runs:
+        calls.clear()
+        result = run(executor())
+        assert calls == ["P0420"]  # The repeats never reached the tool
+        steps = result["intermediate_steps"]
+        assert len(steps) == 3 and "already called search_diagnostic_code" in steps[1][1]
+        assert result["loop_guard"] == {"repeats": 2, "cached_calls": 2, "max_iterations_avoided": 17, "stopped": True}
+        assert result["output"] == "Catalizador."
+
+
+def test_loop_guard_writes_answer_for_tool_calling_agent(make_agent):
+    """Test that a function-calling run stopped by the guard ends with an LLM answer over the observations."""
+    from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+    from langchain_core.messages import AIMessage
+    from src.agent.fast_path import FastPathPlanner
+
+    class _ToolModel(FakeMessagesListChatModel):
+        prompts: list = []
+
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+        def _generate(self, messages, *args, **kwargs):
+            self.prompts.append(messages[-1].content)
+            return super()._generate(messages, *args, **kwargs)
+
+    repeat = [AIMessage(content="", tool_calls=[
+        {"name": "search_diagnostic_code", "args": {"code": "P0420"}, "id": f"call_{i}"}
+    ]) for i in range(3)]
+    agent = make_agent(_ToolModel(responses=repeat + [AIMessage(content="El catalizador está por debajo del umbral.")]),
+                       tools=True, fast_path=FastPathPlanner(enabled=False))
+
+    result = agent.chat("¿Qué significa el código P0420?")
+    assert result["agent_mode"] == "tools" and result["repeated_calls"] == 2
+    assert result["response"] == "El catalizador está por debajo del umbral."
+    assert result["max_iterations_avoided"] == 17
+    # One final call without tools, over the single distinct observation
+    final_prompt = agent.llm.prompts[-1]
+    assert "Do not call any more tools" in final_prompt and final_prompt.count('"code": "P0420"') == 1
+    assert "already called" not in final_prompt
+
+
+def test_streamed_and_invoked_turns_give_the_same_result(make_agent):
+    """Test that astream_chat honours the executor's hooks (loop guard, forced answer) like achat."""
+    import asyncio
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel, FakeMessagesListChatModel
+    from langchain_core.messages import AIMessage
+    from src.agent.fast_path import FastPathPlanner
+    
+    class _ToolModel(FakeMessagesListChatModel):
+        def bind_tools(self, tools, **kwargs):
+            return self
+    
+    repeat = "Thought: busco el código\nAction: search_diagnostic_code\nAction Input: P0420"
+    models = {
+        "react": lambda: FakeListChatModel(responses=[repeat] * 3 + ["Thought: ya\nFinal Answer: Revisa el catalizador."]),
+        "tools": lambda: _ToolModel(responses=[
+            AIMessage(content="", tool_calls=[{"name": "search_diagnostic_code", "args": {"code": "P0420"}, "id": f"call_{i}"}])
+            for i in range(3)
+        ] + [AIMessage(content="Revisa el catalizador.")]),
+    }
+    
+    async def streamed(agent, message):
+        return [event async for event in agent.astream_chat(message)][-1]["result"]
+    
+    for mode, model in models.items():
+        results = []
+        for run in (lambda agent, message: agent.achat(message), streamed):
+            agent = make_agent(model(), tools=mode == "tools", fast_path=FastPathPlanner(enabled=False))
+            results.append(asyncio.run(run(agent, "¿Qué significa el código P0420?")))
+        invoked, streamed_result = results
+        assert streamed_result == invoked, mode
+        assert invoked["agent_mode"] == mode and invoked["response"] == "Revisa el catalizador."
+        assert invoked["repeated_calls"] == 2 and invoked["tool_calls"] == 3
+        assert [s["tool"] for s in invoked["steps"]] == ["search_diagnostic_code"] * 3
+
+
+def test_tool_calling_agent_uses_typed_tool_schemas(make_agent):
+    """Test the native function-calling agent: typed tool calls, no text parsing, turn statistics."""
+    from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+    from langchain_core.messages import AIMessage
+    from src.agent.fast_path import FastPathPlanner
+    from src.utils.model_manager import ModelManager
+    
+    class _ToolModel(FakeMessagesListChatModel):
+        def bind_tools(self, tools, **kwargs):
+            return self
+    
+    manager = object.__new__(ModelManager)
+    manager.available_models = [
+        {"id": "with-tools", "supported_parameters": ["temperature", "tools"]},
+        {"id": "text-only", "supported_parameters": ["temperature"]},
+    ]
+    assert manager.supports_tools("with-tools") and not manager.supports_tools("text-only")
+    
+    agent = make_agent(_ToolModel(responses=[
+        AIMessage(content="", tool_calls=[
+            {"name": "search_diagnostic_code", "args": {"code": "P0420"}, "id": "call_1"},
+            {"name": "query_known_issues", "args": {"brand": "Toyota", "model": "Corolla", "year": 2018}, "id": "call_2"},
+        ]),
+        AIMessage(content="El catalizador del Corolla está fallando."),
+    ]), tools=True, fast_path=FastPathPlanner(enabled=False))
+    
+    result = agent.chat("Corolla 2018 con P0420, ¿qué reviso?")
+    assert result["success"] and result["agent_mode"] == "tools"
+    assert result["response"] == "El catalizador del Corolla está fallando."
+    assert [s["tool"] for s in result["steps"]] == ["search_diagnostic_code", "query_known_issues"]
+    assert result["steps"][1]["tool_input"] == {"brand": "Toyota", "model": "Corolla", "year": 2018}
+    assert '"code": "P0420"' in result["steps"][0]["observation"]
+    assert result["llm_calls"] == 2 and result["parse_errors"] == 0
+
+
+def test_budgeted_memory_summarizes_old_turns():
+    """Test that memory stays within its token budget by folding old turns into a summary."""
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from src.agent.memory import BudgetedSummaryMemory, estimate_tokens
+    
+    import threading
+    
+    class _SlowSummarizer(FakeListChatModel):
+        release: threading.Event = threading.Event()
+        
+        def _call(self, *args, **kwargs):
+            self.release.wait(5)
+            return super()._call(*args, **kwargs)
+    
+    summarizer = _SlowSummarizer(responses=["Toyota Corolla 2018 with P0420, catalytic converter suspected."] * 10)
+    memory = BudgetedSummaryMemory(llm=summarizer, max_token_limit=200, min_recent_turns=1,
+                                   input_key="input", output_key="output")
+    for turn in range(6):
+        memory.save_context(
+            {"input": f"Turn {turn}: Corolla P0420 question " + "detail " * 20},
+            {"output": f"Answer {turn} " + "explanation " * 20}
+        )
+    
+    # Saving did not wait for the LLM summary; meanwhile the folded turns are summarized
+    # extractively rather than sent verbatim past the budget
+    lagging = memory.load_memory_variables({})["chat_history"]
+    assert memory.pending and "Turn 5" in lagging and "- Assistant: Answer" in lagging
+    assert memory.last_token_count <= 200
+    summarizer.release.set()
+    memory.wait_for_summary(timeout=5)
+    assert memory.pending == []
+    
+    history = memory.load_memory_variables({})["chat_history"]
+    assert "catalytic converter suspected" in history and "Turn 5" in history
+    assert "Turn 0" not in history
+    assert memory.summarized_turns >= 4
+    assert memory.last_token_count == estimate_tokens(history) <= 200
+    
+    # Without an LLM the summary is extractive
+    memory.llm = None
+    memory.save_context({"input": "Turn 6: what about O2 sensor " + "x " * 100}, {"output": "Check it"})
+    assert memory.summary.startswith("- ") and "Answer 5" in memory.summary
+    
+    memory.clear()
+    assert memory.load_memory_variables({})["chat_history"] == "" and memory.summary == ""
+    
+    # A long LLM summary is capped like the extractive one
+    memory.llm = FakeListChatModel(responses=["The mechanic asked about the catalytic converter. " * 50] * 10)
+    for turn in range(6):
+        memory.save_context({"input": f"Turn {turn}: " + "detail " * 60}, {"output": "ok"})
+    memory.wait_for_summary(timeout=5)
+    assert memory.summary and estimate_tokens(memory.summary) <= 200 // 3
+    assert estimate_tokens(memory.load_memory_variables({})["chat_history"]) <= 200
+
+
+def test_memory_stores_only_the_raw_message(make_agent):
+    """Test that KB context and instructions reach the prompt but only the mechanic's message is remembered."""
+    import asyncio
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from src.agent.prefetch import KB_CONTEXT_HEADER
+    
+    class _RecordingModel(FakeListChatModel):
+        prompts: list = []
+        
+        def _call(self, messages, *args, **kwargs):
+            self.prompts.append(messages[-1].content)
+            return super()._call(messages, *args, **kwargs)
+    
+    class _Retriever:
+        def retrieve_with_sources(self, query, doc_types=None):
+            return "Brake pads worn below 3mm squeal", [{"title": "Symptom: Squealing brakes"}]
+        
+        async def aretrieve_with_sources(self, query, doc_types=None):
+            return self.retrieve_with_sources(query, doc_types)
+    
+    agent = make_agent(_RecordingModel(responses=["Thought: lo sé\nFinal Answer: Revisa las pastillas."] * 2),
+                       retriever=_Retriever())
+    # A message that happens to contain the instruction marker is kept whole
+    messages = ["El auto hace un ruido chirriante al frenar", "Sigue el ruido al frenar\n\n[SISTEMA: nota del taller]"]
+    agent.chat(messages[0])
+    asyncio.run(agent.achat(messages[1]))
+    
+    for prompt in agent.llm.prompts:
+        assert KB_CONTEXT_HEADER in prompt and "Brake pads worn below 3mm squeal" in prompt
+        assert "CRITICO: NO TRADUZCAS" in prompt
+    stored = [m.content for m in agent.memory.chat_memory.messages]
+    assert stored == [messages[0], "Revisa las pastillas.", messages[1], "Revisa las pastillas."]
+
+
+def test_fast_path_answers_code_and_vehicle_with_one_llm_call(make_agent):
+    """Test that code + vehicle messages run the tool chain directly and make a single LLM call."""
+    from concurrent.futures import Future
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from src.agent.prefetch import Prefetch
+    from src.agent.fast_path import FastPathPlanner
+    
+    agent = make_agent(FakeListChatModel(responses=["El P0420 indica un catalizador ineficiente."]),
+                       fast_path=FastPathPlanner(min_confidence=0.8))
+    
+    route = agent.intent_router.route
+    assert agent.fast_path.plan("Tengo el código P0420", route("Tengo el código P0420")) is None
+    assert agent.fast_path.plan("Corolla con P0420 y P0300", route("Corolla con P0420 y P0300")) is None
+    # Follow-ups and how-to questions need the full agent, not the canned code/causes/part/cost answer
+    for follow_up in [
+        "Ya cambié el catalizador de mi Toyota Corolla 2018 y sigue el P0420, ¿qué más reviso?",
+        "¿Cómo borro el código P0420 de un Honda Civic 2016 con el escáner?",
+        "How do I replace the catalytic converter on a 2018 Toyota Corolla with P0420?",
+        "P0420 on my 2018 Toyota Corolla came back after I fixed the exhaust leak",
+    ]:
+        assert agent.fast_path.plan(follow_up, route(follow_up)) is None, follow_up
+    assert agent.fast_path.plan("What does P0420 mean on my 2018 Toyota Corolla?", route("P0420")).confidence == 1.0
+    
+    result = agent.chat("Tengo un Toyota Corolla 2018 con el código P0420")
+    assert result["fast_path"] and result["success"]
+    assert result["response"] == "El P0420 indica un catalizador ineficiente."
+    assert [s["tool"] for s in result["steps"]] == [
+        "search_diagnostic_code", "query_known_issues", "find_replacement_parts", "calculate_repair_cost"
+    ]
+    assert result["steps"][2]["tool_input"] == "Catalytic Converter for Toyota Corolla 2018"
+    assert result["llm_calls"] == 1 and result["llm_calls_saved"] == 4
+    assert agent.memory.chat_memory.messages[0].content == "Tengo un Toyota Corolla 2018 con el código P0420"
+    
+    # Unknown codes go through the full agent
+    unknown = Future()
+    unknown.set_result({"found": False, "code": "P1999"})
+    plan = agent.fast_path.plan("Corolla 2018 con código P1999", route("Corolla 2018 con código P1999"))
+    assert plan is not None and agent.fast_path.run_chain(plan, Prefetch(codes={"P1999": unknown})) is None
+    assert agent.fast_path.stats()["answered"] == 1
+
+
+def test_fast_path_runs_its_chain_without_waiting_for_retrieval(make_agent, monkeypatch):
+    """Test that a fast path turn skips the pre-prompt retrieval wait and still gets the late context."""
+    import threading
+    import time
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from src.agent import mechanic_agent
+    from src.agent.fast_path import FastPathPlanner
+    
+    chain_started = threading.Event()
+    
+    class _Retriever:
+        def retrieve_with_sources(self, query, doc_types=None):
+            chain_started.wait(5)  # Finishes only once the tool chain is underway
+            return "Catalyst efficiency below threshold", [{"title": "OBD Code P0420"}]
+    
+    class _RecordingModel(FakeListChatModel):
+        prompts: list = []
+        
+        def _call(self, messages, *args, **kwargs):
+            self.prompts.append(messages[-1].content)
+            return super()._call(messages, *args, **kwargs)
+    
+    monkeypatch.setattr(mechanic_agent, "KB_PREFETCH_WAIT_MS", 3000)
+    agent = make_agent(_RecordingModel(responses=["El catalizador está por debajo del umbral."]),
+                       fast_path=FastPathPlanner(min_confidence=0.8), retriever=_Retriever())
+    run_chain = agent.fast_path.run_chain
+    monkeypatch.setattr(agent.fast_path, "run_chain", lambda *args: chain_started.set() or run_chain(*args))
+    
+    start = time.perf_counter()
+    result = agent.chat("Tengo un Toyota Corolla 2018 con el código P0420")
+    assert result["fast_path"] and time.perf_counter() - start < 2
+    assert "Catalyst efficiency below threshold" in agent.llm.prompts[0]
+    assert result["sources"] == [{"title": "OBD Code P0420"}]
+
+
 @pytest.mark.skip(reason="Requires API keys - run manually")
 def test_agent_initialization():
     """Test agent can be initialized (requires API keys)."""
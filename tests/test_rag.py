@@ -33,6 +33,539 @@ def test_document_loading():
     assert hasattr(docs[0], 'metadata'), "Document missing metadata"
 
 
+def test_mmr_prefers_diverse_results():
+    """Test that MMR skips near-duplicates of an already selected result."""
+    from src.rag.mmr import maximal_marginal_relevance
+    
+    query = [1.0, 0.0, 0.0]
+    candidates = [
+        [0.96, 0.28, 0.0],   # Most relevant
+        [0.94, 0.34, 0.0],   # Near-duplicate of the first
+        [0.80, 0.0, 0.60],   # Less relevant but complementary
+    ]
+    
+    assert maximal_marginal_relevance(query, candidates, k=2, lambda_mult=1.0) == [0, 1]
+    assert maximal_marginal_relevance(query, candidates, k=2, lambda_mult=0.5) == [0, 2]
+
+
+def test_mmr_handles_small_candidate_sets():
+    """Test MMR with fewer candidates than requested."""
+    from src.rag.mmr import maximal_marginal_relevance
+    
+    assert maximal_marginal_relevance([1.0, 0.0], [], k=3) == []
+    assert sorted(maximal_marginal_relevance([1.0, 0.0], [[1.0, 0.0], [0.0, 1.0]], k=5)) == [0, 1]
+
+
+class _FakeCrossEncoder:
+    """Scores a pair by how many query words appear in the chunk."""
+    
+    def __init__(self):
+        self.pairs_scored = 0
+    
+    def predict(self, pairs, batch_size=16):
+        self.pairs_scored += len(pairs)
+        return [sum(word in text for word in query.split()) for query, text in pairs]
+
+
+def test_reranker_orders_and_caches_scores():
+    """Test cross-encoder reranking and (query, chunk) score caching."""
+    from langchain_core.documents import Document
+    from src.rag.reranker import CrossEncoderReranker
+    
+    reranker = CrossEncoderReranker(latency_budget_ms=10_000)
+    reranker._model = _FakeCrossEncoder()
+    docs = [
+        Document(page_content="brake fluid", metadata={"chunk_id": 1}),
+        Document(page_content="brake pads squeal", metadata={"chunk_id": 2}),
+        Document(page_content="oil leak", metadata={"chunk_id": 3}),
+    ]
+    
+    top = reranker.rerank("brake squeal", docs, top_k=2)
+    assert [d.metadata["chunk_id"] for d in top] == [2, 1]
+    
+    reranker.rerank("brake squeal", docs, top_k=2)
+    assert reranker._model.pairs_scored == 3
+    assert reranker.stats["cache_hits"] == 3
+    
+    # After a rebuild the same point id holds other content: it must be scored again
+    rebuilt = [Document(page_content="squeal when braking on brake pads", metadata={"chunk_id": 3})]
+    reranker.rerank("brake squeal", docs[:1] + rebuilt, top_k=2)
+    assert reranker._model.pairs_scored == 4
+
+
+def test_reranker_skips_when_over_budget():
+    """Test that reranking is skipped when the latency budget is exceeded."""
+    from langchain_core.documents import Document
+    from src.rag.reranker import CrossEncoderReranker
+    
+    reranker = CrossEncoderReranker(latency_budget_ms=50)
+    reranker._model = _FakeCrossEncoder()
+    reranker._ms_per_pair = 20.0
+    docs = [Document(page_content=f"doc {i}", metadata={"chunk_id": i}) for i in range(5)]
+    
+    assert reranker.rerank("doc 4", docs, top_k=2) == docs[:2]
+    assert reranker.stats["skipped"] == 1
+
+
+def test_async_retrieve_with_sources():
+    """Test the async retrieval path against a stub knowledge base."""
+    import asyncio
+    from langchain_core.documents import Document
+    from src.rag.retriever import KnowledgeRetriever
+    
+    class StubKnowledgeBase:
+        async def asearch(self, query, k=3, search_type=None):
+            await asyncio.sleep(0.01)
+            return [Document(
+                page_content=f"OBD-II Code: P0420 ({query})",
+                metadata={"source": "obd_codes", "type": "diagnostic_code", "code": "P0420", "score": 0.91}
+            )]
+    
+    retriever = KnowledgeRetriever(StubKnowledgeBase(), k=1)
+    
+    async def run_sessions():
+        return await asyncio.gather(*(retriever.aretrieve_with_sources(f"query {i}") for i in range(20)))
+    
+    results = asyncio.run(run_sessions())
+    assert len(results) == 20
+    context, sources = results[0]
+    assert "P0420" in context
+    assert sources[0]["title"] == "OBD Code P0420"
+
+
+def test_qdrant_client_is_shared_and_timed(tmp_path):
+    """Test that the client factory reuses one client per store and records latency."""
+    from src.rag.client_factory import get_qdrant_client, get_client_metrics, close_qdrant_clients
+    
+    try:
+        client = get_qdrant_client(str(tmp_path))
+        assert get_qdrant_client(str(tmp_path)) is client
+        
+        client.get_collections()
+        metrics = get_client_metrics()[f"local:{tmp_path.resolve()}"]
+        assert metrics["get_collections"]["calls"] == 1
+        assert metrics["get_collections"]["errors"] == 0
+    finally:
+        close_qdrant_clients()
+
+
+def test_close_qdrant_clients_closes_async_clients(monkeypatch):
+    """Test that closing the shared clients also closes the async client and its pool."""
+    import asyncio
+    from src.rag import client_factory
+    
+    monkeypatch.setattr(client_factory, "QDRANT_HOST", "localhost")
+    closed = []
+    
+    for close in (client_factory.close_qdrant_clients, lambda: asyncio.run(client_factory.aclose_qdrant_clients())):
+        client = client_factory.get_async_qdrant_client()
+        original_close = client.close
+        
+        async def tracked_close(**kwargs):
+            closed.append(client)
+            await original_close(**kwargs)
+        
+        client.close = tracked_close
+        close()
+        assert closed[-1] is client
+        assert client_factory.get_async_qdrant_client() is not client
+        client_factory.close_qdrant_clients()
+    assert len(closed) == 2
+
+
+def _memory_collection(vectors, name="kb"):
+    """Create an in-memory Qdrant collection with one point per vector."""
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import Distance, VectorParams, PointStruct
+    
+    client = QdrantClient(":memory:")
+    client.create_collection(name, vectors_config=VectorParams(size=len(vectors[0]), distance=Distance.COSINE))
+    client.upsert(name, [
+        PointStruct(id=i, vector=v, payload={"page_content": f"doc {i}", "source": "test"})
+        for i, v in enumerate(vectors)
+    ])
+    return client
+
+
+def test_frozen_index_matches_qdrant(tmp_path):
+    """Test that the frozen export returns the same ranking as Qdrant."""
+    import numpy as np
+    from src.rag.frozen_index import FrozenIndex, export_collection
+    
+    vectors = np.random.default_rng(0).normal(size=(50, 8)).tolist()
+    client = _memory_collection(vectors)
+    export_collection(client, "kb", base_dir=tmp_path)
+    
+    index = FrozenIndex(tmp_path)
+    query = vectors[7]
+    expected = [p.id for p in client.query_points("kb", query=query, limit=5).points]
+    result = index.query_points("kb", query=query, limit=5).points
+    
+    assert [p.id for p in result] == expected
+    assert result[0].payload["page_content"] == "doc 7"
+
+
+def test_frozen_index_single_writer_and_generation_swap(tmp_path):
+    """Test writer election and that readers pick up new generations."""
+    from src.rag.frozen_index import FrozenIndex, WriterLock, write_generation
+    
+    with WriterLock(tmp_path):
+        write_generation([1], [[1.0, 0.0]], [{"page_content": "old"}], base_dir=tmp_path)
+        with pytest.raises(RuntimeError):
+            with WriterLock(tmp_path):
+                pass
+    
+    index = FrozenIndex(tmp_path)
+    assert index.query_points(query=[1.0, 0.0], limit=1).points[0].payload["page_content"] == "old"
+    
+    with WriterLock(tmp_path):
+        write_generation([1], [[1.0, 0.0]], [{"page_content": "new"}], base_dir=tmp_path)
+    index.refresh(force=True)
+    assert index.query_points(query=[1.0, 0.0], limit=1).points[0].payload["page_content"] == "new"
+
+
+class _HashEmbeddings:
+    """Deterministic bag-of-words embeddings (no model download)."""
+    
+    dim = 64
+    
+    def embed_query(self, text):
+        import zlib
+        vector = [0.0] * self.dim
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode()) % self.dim] += 1.0
+        return vector
+    
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+@pytest.fixture
+def hash_embeddings(monkeypatch):
+    """Make KnowledgeBase use the hash embeddings instead of a real model."""
+    from src.rag.knowledge_base import KnowledgeBase
+    
+    embeddings = _HashEmbeddings()
+    monkeypatch.setattr(KnowledgeBase, "embeddings", property(lambda self: embeddings))
+    return embeddings
+
+
+def test_blue_green_rebuild_swaps_alias(tmp_path, hash_embeddings):
+    """Test that rebuilds go live via an alias swap and drop the old generation."""
+    from src.rag.knowledge_base import KnowledgeBase
+    from src.rag.client_factory import close_qdrant_clients
+    from src.rag.generations import get_alias_target, list_generations
+    
+    try:
+        kb = KnowledgeBase(persist_directory=str(tmp_path), read_only=False)
+        alias = kb.collection_name
+        assert get_alias_target(kb.client, alias) == f"{alias}_g0001"
+        
+        thread = kb.rebuild(background=True)
+        # The live generation keeps serving while the new one is built
+        assert len(kb.search("catalytic converter P0420", k=2)) == 2
+        thread.join(timeout=60)
+        
+        assert get_alias_target(kb.client, alias) == f"{alias}_g0002"
+        assert list_generations(kb.client, alias) == [2]
+        assert len(kb.search("catalytic converter P0420", k=2)) == 2
+    finally:
+        close_qdrant_clients()
+
+
+def test_interrupted_build_resumes_from_checkpoint(tmp_path, hash_embeddings, monkeypatch):
+    """Test that a build resumes at the last checkpointed batch."""
+    import src.rag.knowledge_base as kb_module
+    from src.rag.client_factory import close_qdrant_clients
+    
+    monkeypatch.setattr(kb_module, "KB_BUILD_BATCH_SIZE", 8)
+    original = hash_embeddings.embed_documents
+    calls = {"count": 0}
+    
+    def flaky_embed(texts):
+        calls["count"] += 1
+        if calls["count"] == 3:
+            raise RuntimeError("simulated crash")
+        return original(texts)
+    
+    monkeypatch.setattr(hash_embeddings, "embed_documents", flaky_embed)
+    
+    try:
+        with pytest.raises(RuntimeError):
+            kb_module.KnowledgeBase(persist_directory=str(tmp_path), read_only=False)
+        
+        kb = kb_module.KnowledgeBase(persist_directory=str(tmp_path), read_only=False)
+        status = kb.progress.snapshot()
+        assert status["stage"] == "ready"
+        assert status["resumed_from"] == 16
+        assert status["points_upserted"] == status["chunks_total"]
+        assert kb.client.count(kb.collection_name, exact=True).count == status["chunks_total"]
+        assert kb.checkpoint.load() is None
+    finally:
+        close_qdrant_clients()
+
+
+def test_entity_lookup_answers_code_queries_without_embedding(tmp_path, hash_embeddings, monkeypatch):
+    """Test that chunks are tagged with entities and code queries use a filtered lookup."""
+    from src.rag.knowledge_base import KnowledgeBase
+    from src.rag.retriever import KnowledgeRetriever
+    from src.rag.client_factory import close_qdrant_clients
+    from src.rag.frozen_index import FrozenIndex, export_collection
+    from src.rag.entity_extractor import get_entity_extractor, lookup_filter
+    
+    entities = get_entity_extractor().extract("P0171 on a 2018 Honda Civic, new O2 sensor OXY-001?")
+    assert entities["dtc_codes"] == ["P0171"]
+    assert entities["vehicle_makes"] == ["Honda"] and entities["vehicle_models"] == ["Civic"]
+    assert entities["years"] == [2018]
+    assert entities["part_ids"] == ["OXY-001"]
+    
+    try:
+        kb = KnowledgeBase(persist_directory=str(tmp_path), read_only=False)
+        monkeypatch.setattr(hash_embeddings, "embed_query", lambda text: pytest.fail("query was embedded"))
+        
+        docs = KnowledgeRetriever(kb, k=1).retrieve("P0171 on Honda Civic")
+        assert "P0171" in docs[0].metadata["dtc_codes"]
+        assert docs[0].metadata["lookup_score"] >= 4
+        
+        frozen_dir = tmp_path / "frozen"
+        export_collection(kb.client, kb.collection_name, base_dir=frozen_dir)
+        frozen_hits, _ = FrozenIndex(frozen_dir).scroll(scroll_filter=lookup_filter(entities), limit=100)
+        qdrant_hits, _ = kb.client.scroll(kb.collection_name, scroll_filter=lookup_filter(entities), limit=100)
+        assert sorted(p.id for p in frozen_hits) == sorted(p.id for p in qdrant_hits)
+        
+        # Every tagged chunk is ranked, not just the first scroll page
+        monkeypatch.setattr("src.rag.knowledge_base.LOOKUP_PAGE_SIZE", 1)
+        assert len(kb.lookup("P0171 on Honda Civic", k=100, entities=entities)) == len(qdrant_hits) > 1
+    finally:
+        close_qdrant_clients()
+
+
+def test_search_restricted_to_doc_types(tmp_path, hash_embeddings):
+    """Test that routed searches only return the requested document types (Qdrant and frozen index)."""
+    from src.rag.knowledge_base import KnowledgeBase
+    from src.rag.retriever import KnowledgeRetriever
+    from src.rag.client_factory import close_qdrant_clients
+    from src.rag.frozen_index import FrozenIndex, export_collection
+    from src.rag.entity_extractor import type_filter
+    
+    try:
+        kb = KnowledgeBase(persist_directory=str(tmp_path), read_only=False)
+        docs = kb.search("brake noise", k=5, doc_types=["symptom_diagnosis"])
+        assert docs and {d.metadata["type"] for d in docs} == {"symptom_diagnosis"}
+        
+        retriever = KnowledgeRetriever(kb, k=2, entity_lookup=False)
+        assert {d.metadata["type"] for d in retriever.retrieve("brakes", ["repair_procedure"])} == {"repair_procedure"}
+        # No documents of that type: falls back to an unrestricted search
+        assert len(retriever.retrieve("brakes", ["no_such_type"])) == 2
+        
+        frozen_dir = tmp_path / "frozen"
+        export_collection(kb.client, kb.collection_name, base_dir=frozen_dir)
+        query = hash_embeddings.embed_query("brake noise")
+        frozen = FrozenIndex(frozen_dir).query_points(query=query, limit=5, query_filter=type_filter(["diagnostic_code"]))
+        assert frozen.points and {p.payload["type"] for p in frozen.points} == {"diagnostic_code"}
+    finally:
+        close_qdrant_clients()
+
+
+def test_sharded_build_fans_out_and_merges_with_quotas(tmp_path, hash_embeddings):
+    """Test per-type shard collections, parallel search and per-shard quotas."""
+    from types import SimpleNamespace
+    from src.rag.knowledge_base import KnowledgeBase
+    from src.rag.client_factory import close_qdrant_clients
+    from src.rag.generations import get_alias_target
+    from src.rag.shards import merge_by_score, shard_aliases
+    
+    hits = {
+        "manuals": [SimpleNamespace(id=i, score=0.9 - i / 100) for i in range(3)],
+        "obd_codes": [SimpleNamespace(id=10, score=0.5)],
+    }
+    assert [p.id for p in merge_by_score(hits, limit=3, quotas={"manuals": 2})] == [0, 1, 10]
+    # Unused slots go back to the capped shard (manual-routed queries, manuals-only KB)
+    assert [p.id for p in merge_by_score({"manuals": hits["manuals"]}, limit=3, quotas={"manuals": 2})] == [0, 1, 2]
+    assert [p.id for p in merge_by_score(hits, limit=4, quotas={"manuals": 2})] == [0, 1, 2, 10]
+    
+    try:
+        kb = KnowledgeBase(persist_directory=str(tmp_path), read_only=False, sharded=True)
+        aliases = shard_aliases(kb.collection_name)
+        counts = {shard: kb.client.count(alias, exact=True).count for shard, alias in aliases.items()}
+        assert get_alias_target(kb.client, aliases["obd_codes"]) == f"{aliases['obd_codes']}_g0001"
+        assert counts["obd_codes"] > 0 and counts["symptoms"] > 0 and counts["repair_guides"] > 0
+        assert sum(counts.values()) == kb.progress.snapshot()["chunks_total"]
+        assert not kb.client.collection_exists(kb.collection_name)
+        
+        docs = kb.search("catalytic converter P0420 rattling noise", k=4)
+        assert len(docs) == 4
+        assert [d.metadata["score"] for d in docs] == sorted((d.metadata["score"] for d in docs), reverse=True)
+        assert kb.lookup("P0420", k=1)[0].metadata["dtc_codes"] == ["P0420"]
+    finally:
+        close_qdrant_clients()
+
+
+def test_projection_is_fitted_stored_and_applied_to_queries(tmp_path, hash_embeddings, monkeypatch):
+    """Test a PCA projection fitted at build time, stored with the collection and reused on load."""
+    import src.rag.knowledge_base as kb_module
+    from src.rag.client_factory import close_qdrant_clients
+    from src.rag.projection import EmbeddingProjection
+    
+    monkeypatch.setattr(kb_module, "KB_PROJECTION", "pca")
+    monkeypatch.setattr(kb_module, "KB_PROJECTION_DIM", 16)
+    
+    try:
+        kb = kb_module.KnowledgeBase(persist_directory=str(tmp_path), read_only=False)
+        info = kb.client.get_collection(kb.collection_name)
+        assert info.config.params.vectors.size == 16
+        assert info.config.metadata["projection"]["report"]["recall_at_k"] > 0
+        
+        reopened = kb_module.KnowledgeBase(persist_directory=str(tmp_path), read_only=False)
+        assert reopened.projection.target_dim == 16
+        assert len(reopened._embed_query("catalytic converter")) == 16
+        assert len(reopened.search("catalytic converter efficiency below threshold", k=3)) == 3
+    finally:
+        close_qdrant_clients()
+    
+    stored = EmbeddingProjection.from_metadata(kb.projection.to_metadata())
+    sample = hash_embeddings.embed_query("oxygen sensor")
+    assert stored.transform(sample).tolist() == kb.projection.transform(sample).tolist()
+
+
+def test_bilingual_eval_set_and_harness():
+    """Test that every eval case targets a real entry and the harness scores each language."""
+    from langchain_core.documents import Document
+    from src.rag.document_loader import load_all_knowledge_base
+    from src.rag.evaluation import load_eval_cases, doc_matches, evaluate_retrieval
+    from src.utils.config import OBD_CODES_PATH, SYMPTOMS_PATH, REPAIR_GUIDES_PATH
+    
+    docs = load_all_knowledge_base(OBD_CODES_PATH, SYMPTOMS_PATH, REPAIR_GUIDES_PATH)
+    cases = load_eval_cases()
+    assert len(cases) >= 20
+    for case in cases:
+        assert case["en"] and case["es"]
+        assert any(doc_matches(doc, case["expect"]) for doc in docs), case["expect"]
+    
+    class EnglishOnlyKnowledgeBase:
+        def search(self, query, k=3, search_type=None):
+            case = next((c for c in cases if c["en"] == query), None)
+            return [Document(page_content="", metadata=dict(case["expect"]))] if case else []
+    
+    report = evaluate_retrieval(EnglishOnlyKnowledgeBase(), cases[:4], k=3)
+    assert report["en"] == {"hit_rate": 1.0, "mrr": 1.0}
+    assert report["es"]["hit_rate"] == 0.0
+    assert report["cross_lingual_gap"] == 1.0
+    assert len(report["misses"]) == 4
+
+
+def test_embedding_model_change_migrates_collection(tmp_path, hash_embeddings, monkeypatch):
+    """Test that a collection embedded with another model is rebuilt into a new generation."""
+    import src.rag.knowledge_base as kb_module
+    from src.rag.client_factory import close_qdrant_clients
+    from src.rag.generations import get_alias_target, collection_metadata
+    
+    try:
+        kb = kb_module.KnowledgeBase(persist_directory=str(tmp_path), read_only=False)
+        alias = kb.collection_name
+        stored = collection_metadata(kb.client, alias)["embedding_identity"]
+        
+        monkeypatch.setattr(kb_module.KnowledgeBase, "embedding_identity", property(lambda self: "test:multilingual"))
+        migrated = kb_module.KnowledgeBase(persist_directory=str(tmp_path), read_only=False)
+        assert stored != "test:multilingual"
+        assert get_alias_target(migrated.client, alias) == f"{alias}_g0002"
+        assert collection_metadata(migrated.client, alias)["embedding_identity"] == "test:multilingual"
+        assert migrated.progress.snapshot()["stage"] == "ready"
+        
+        # With auto-migration off a stale collection fails loudly and is left alone
+        monkeypatch.setattr(kb_module, "KB_AUTO_MIGRATE_EMBEDDINGS", False)
+        monkeypatch.setattr(kb_module.KnowledgeBase, "embedding_identity", property(lambda self: "test:other"))
+        monkeypatch.setattr(kb_module.KnowledgeBase, "_build_database", lambda self: pytest.fail("rebuilt"))
+        with pytest.raises(ValueError, match="Embedding model changed"):
+            kb_module.KnowledgeBase(persist_directory=str(tmp_path), read_only=False)
+        assert get_alias_target(migrated.client, alias) == f"{alias}_g0002"
+    finally:
+        close_qdrant_clients()
+
+
+def test_snapshot_roundtrip_without_embedding(tmp_path):
+    """Test snapshot export, verification and restore into Qdrant and the frozen index."""
+    import json
+    from src.rag.snapshot import export_snapshot, import_snapshot, verify_snapshot
+    from src.rag.frozen_index import FrozenIndex
+    from src.rag.generations import get_alias_target
+    from qdrant_client import QdrantClient
+    
+    source = _memory_collection([[1.0, 0.0], [0.0, 1.0], [0.7, 0.7]])
+    source.set_payload("kb", {"page_content": "OBD-II Code: P0420", "code": "P0420"}, points=[0])
+    snapshot = export_snapshot(source, tmp_path / "snap", collection_name="kb", embedding_identity="test:model")
+    
+    manifest = verify_snapshot(snapshot, expected_identity="test:model")
+    assert manifest["count"] == 3
+    assert json.loads((snapshot / "dtc_index.json").read_text()) == {"P0420": [0]}
+    with pytest.raises(ValueError):
+        verify_snapshot(snapshot, expected_identity="other:model")
+    
+    target = QdrantClient(":memory:")
+    restored = import_snapshot(snapshot, target="qdrant", client=target, collection_name="kb", force=True)
+    assert get_alias_target(target, "kb") == restored
+    assert target.count("kb", exact=True).count == 3
+    
+    import_snapshot(snapshot, target="frozen", frozen_dir=tmp_path / "frozen", force=True)
+    hit = FrozenIndex(tmp_path / "frozen").query_points(query=[1.0, 0.0], limit=1).points[0]
+    assert hit.payload["code"] == "P0420"
+    
+    (snapshot / "payloads.jsonl").write_text("tampered")
+    with pytest.raises(ValueError):
+        verify_snapshot(snapshot, expected_identity="test:model")
+
+
+def test_legacy_collection_is_migrated_to_alias():
+    """Test that a pre-generation collection is replaced by an alias."""
+    from src.rag.generations import swap_alias, get_alias_target, is_legacy_collection
+    from qdrant_client.models import Distance, VectorParams
+    
+    client = _memory_collection([[1.0, 0.0]], name="kb")
+    client.create_collection("kb_g0001", vectors_config=VectorParams(size=2, distance=Distance.COSINE))
+    assert is_legacy_collection(client, "kb")
+    
+    calls = []
+    for name in ("get_collections", "get_aliases", "delete_collection", "update_collection_aliases"):
+        method = getattr(client, name)
+        setattr(client, name, lambda *a, _method=method, _name=name, **kw: calls.append(_name) or _method(*a, **kw))
+    
+    swap_alias(client, "kb", "kb_g0001")
+    assert get_alias_target(client, "kb") == "kb_g0001"
+    assert not is_legacy_collection(client, "kb")
+    # The name is missing only between the drop and the alias update, which follows it directly
+    assert calls[calls.index("delete_collection") + 1] == "update_collection_aliases"
+    assert calls.count("delete_collection") == 1
+
+
+def test_minhash_dedup_merges_near_duplicates():
+    """Test that repeated pages collapse into one chunk with merged provenance."""
+    from langchain_core.documents import Document
+    from src.rag.dedup import MinHashDeduplicator
+    
+    page = (
+        "Remove the upper intake manifold bolts in sequence, disconnect the throttle body "
+        "harness and vacuum lines, then lift the manifold and inspect the gaskets for cracks "
+        "or oil contamination before installing the new gasket set"
+    )
+    chunks = [
+        Document(page_content=page, metadata={"source": "pdf_manual", "filename": "civic_2018.pdf", "page": 41}),
+        Document(page_content="Check the brake fluid level and bleed the calipers", metadata={"source": "repair_guides"}),
+        Document(page_content=page + " carefully", metadata={"source": "pdf_manual", "filename": "civic_2019.pdf", "page": 43}),
+        Document(page_content="P0301 cylinder misfire detected: " + page, metadata={"code": "P0301"}),
+        Document(page_content="P0302 cylinder misfire detected: " + page, metadata={"code": "P0302"}),
+    ]
+    
+    kept = MinHashDeduplicator(threshold=0.8).deduplicate(chunks)
+    
+    assert [doc.page_content for doc in kept] == [chunks[0].page_content, chunks[1].page_content,
+                                                  chunks[3].page_content, chunks[4].page_content]
+    assert kept[0].metadata["duplicate_count"] == 1
+    assert kept[0].metadata["duplicate_sources"] == [
+        {"source": "pdf_manual", "filename": "civic_2019.pdf", "page": 43}
+    ]
+    assert "duplicate_count" not in kept[1].metadata
+
+
 @pytest.mark.skip(reason="Requires API keys and time - run manually")
 def test_knowledge_base_search():
     """Test knowledge base search (requires API keys)."""